@@ -0,0 +1,65 @@
+import os
+import threading
+import numpy as np
+import geopandas as gpd
+from django.conf import settings
+
+catchment_path = os.path.join(settings.MEDIA_ROOT, 'Drain_shp', 'Catchments', 'Catchment.shp')
+village_path = os.path.join(settings.MEDIA_ROOT, 'Drain_shp', 'Final_Village', 'Village.shp')
+
+_layers = {}
+_layers_lock = threading.Lock()
+
+
+def cached_layer(path, crs="EPSG:4326"):
+    """Shapefile projected to ``crs`` with its spatial index built, shared per process.
+
+    The frame is reloaded when the file changes; callers must not modify it in place.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    with _layers_lock:
+        cached = _layers.get((path, crs))
+        if cached is None or cached[0] != mtime:
+            gdf = gpd.read_file(path).to_crs(crs)
+            gdf.sindex
+            cached = (mtime, gdf)
+            _layers[(path, crs)] = cached
+        return cached[1]
+
+
+def villages_for_drains(drain_nos, catchment_gdf=None, village_gdf=None):
+    """Catchments of ``drain_nos`` and every (catchment, village) pair that intersects.
+
+    Pairs come from one bulk STRtree query and are ordered catchment by
+    catchment, then village by village, like the old nested loop.
+    """
+    catchment_gdf = catchment_gdf if catchment_gdf is not None else cached_layer(catchment_path)
+    village_gdf = village_gdf if village_gdf is not None else cached_layer(village_path)
+
+    filtered_catchment = catchment_gdf[catchment_gdf['Drain_No'].isin(drain_nos)]
+    catchment_pos, village_pos = village_gdf.sindex.query(filtered_catchment.geometry, predicate='intersects')
+    order = np.lexsort((village_pos, catchment_pos))
+    catchment_pos, village_pos = catchment_pos[order], village_pos[order]
+
+    villages = village_gdf.iloc[village_pos]
+
+    def column(name):
+        if name in villages.columns:
+            return villages[name].tolist()
+        return ['Unknown'] * len(villages)
+
+    intersected_villages = [
+        {
+            'shapeID': shape_id,
+            'shapeName': shape_name,
+            'subDistrictName': sub_district,
+            'districtName': district,
+            'drainNo': drain_no
+        }
+        for shape_id, shape_name, sub_district, district, drain_no in zip(
+            column('shapeID'), column('shapeName'), column('SUB_DISTRI'), column('DISTRICT'),
+            filtered_catchment['Drain_No'].iloc[catchment_pos].tolist()
+        )
+    ]
+    intersected_village_gdf = villages.reset_index(drop=True)
+    return filtered_catchment, intersected_villages, intersected_village_gdf
@@ -0,0 +1,63 @@
+import time
+import geopandas as gpd
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from Basic.catchment import catchment_path, village_path, cached_layer, villages_for_drains
+
+
+def legacy_intersection(filtered_catchment, village_gdf):
+    """The nested iterrows loop VillagesCatchmentIntersection used before the spatial join."""
+    intersected_villages = []
+    intersected_village_gdf = gpd.GeoDataFrame()
+    for idx, catchment in filtered_catchment.iterrows():
+        for vidx, village in village_gdf.iterrows():
+            if catchment.geometry.intersects(village.geometry):
+                intersected_villages.append({
+                    'shapeID': village.get('shapeID', 'Unknown'),
+                    'shapeName': village.get('shapeName', 'Unknown'),
+                    'subDistrictName': village.get('SUB_DISTRI', 'Unknown'),
+                    'districtName': village.get('DISTRICT', 'Unknown'),
+                    'drainNo': catchment['Drain_No']
+                })
+                intersected_village_gdf = pd.concat(
+                    [intersected_village_gdf, village_gdf.loc[[vidx]]],
+                    ignore_index=True
+                )
+    return intersected_villages, intersected_village_gdf
+
+
+class Command(BaseCommand):
+    help = "Time the catchment/village intersection: legacy nested loop vs. spatial join on the full village layer"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drains', nargs='*', type=int, help="Drain_No values (default: every drain)")
+        parser.add_argument('--repeat', type=int, default=3, help="Timed runs of the spatial join")
+        parser.add_argument('--skip-legacy', action='store_true', help="Only time the spatial join")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        catchment_gdf = cached_layer(catchment_path)
+        village_gdf = cached_layer(village_path)
+        load_time = time.perf_counter() - start
+        drain_nos = options['drains'] or sorted(catchment_gdf['Drain_No'].unique().tolist())
+        self.stdout.write(f"{len(village_gdf)} villages, {len(drain_nos)} drains, layer load {load_time:.2f}s (once per process)")
+
+        timings = []
+        for _ in range(max(1, options['repeat'])):
+            start = time.perf_counter()
+            filtered_catchment, intersected_villages, _ = villages_for_drains(drain_nos, catchment_gdf, village_gdf)
+            timings.append(time.perf_counter() - start)
+        join_time = min(timings)
+        self.stdout.write(f"spatial join: {join_time * 1000:.1f} ms, {len(intersected_villages)} pairs")
+
+        if options['skip_legacy']:
+            return
+        start = time.perf_counter()
+        legacy_villages, _ = legacy_intersection(filtered_catchment, village_gdf)
+        legacy_time = time.perf_counter() - start
+        self.stdout.write(f"legacy loop:  {legacy_time * 1000:.1f} ms, {len(legacy_villages)} pairs")
+
+        normalize = lambda rows: [{k: (v.item() if hasattr(v, 'item') else v) for k, v in row.items()} for row in rows]
+        if normalize(legacy_villages) != normalize(intersected_villages):
+            raise CommandError("Spatial join result differs from the legacy loop")
+        self.stdout.write(self.style.SUCCESS(f"identical payload, speedup x{legacy_time / max(join_time, 1e-9):.1f}"))
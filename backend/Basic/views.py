@@ -8,6 +8,7 @@ import math
 from .service import *
 from django.db.models import Sum, Q
 from .models import PopulationCohort
+from .catchment import villages_for_drains, catchment_path, village_path
 from django.http import JsonResponse
 import os
 import json
@@ -1497,26 +1498,14 @@ class VillagesCatchmentIntersection(APIView):
             if not isinstance(drain_nos, list):
                 drain_nos = [drain_nos]
             
-            # Construct paths to shapefiles
-            catchment_path = os.path.join(settings.MEDIA_ROOT, 'Drain_shp', 'Catchments', 'Catchment.shp')
-            village_path = os.path.join(settings.MEDIA_ROOT, 'Drain_shp', 'Final_Village', 'Village.shp')
-            
             if not os.path.exists(catchment_path) or not os.path.exists(village_path):
                 return Response(
                     {'error': 'One or more required shapefiles not found'}, 
                     status=status.HTTP_404_NOT_FOUND
                 )
             
-            # Read shapefiles
-            catchment_gdf = gpd.read_file(catchment_path)
-            village_gdf = gpd.read_file(village_path)
-            
-            # Ensure both are in the same CRS
-            catchment_gdf = catchment_gdf.to_crs("EPSG:4326")
-            village_gdf = village_gdf.to_crs("EPSG:4326")
-            
-            # Filter catchments for selected drains
-            filtered_catchment = catchment_gdf[catchment_gdf['Drain_No'].isin(drain_nos)]
+            # Spatial join of the selected catchments against the cached, pre-projected villages
+            filtered_catchment, intersected_villages, intersected_village_gdf = villages_for_drains(drain_nos)
             
             if filtered_catchment.empty:
                 return Response(
@@ -1524,30 +1513,6 @@ class VillagesCatchmentIntersection(APIView):
                     status=status.HTTP_404_NOT_FOUND
                 )
             
-            # Find intersections between catchments and villages
-            intersected_villages = []
-            intersected_village_gdf = gpd.GeoDataFrame()
-            
-            for idx, catchment in filtered_catchment.iterrows():
-                catchment_geom = catchment.geometry
-                drain_no = catchment['Drain_No']
-                
-                for vidx, village in village_gdf.iterrows():
-                    if catchment_geom.intersects(village.geometry):
-                        village_data = {
-                            'shapeID': village.get('shapeID', 'Unknown'),
-                            'shapeName': village.get('shapeName', 'Unknown'),
-                            'subDistrictName': village.get('SUB_DISTRI', 'Unknown'),
-                           
-                            'districtName': village.get('DISTRICT', 'Unknown'),
-                            'drainNo': drain_no
-                        }
-                        intersected_villages.append(village_data)
-                        intersected_village_gdf = pd.concat(
-                            [intersected_village_gdf, village_gdf.loc[[vidx]]],
-                            ignore_index=True
-                        )
-            
             # Remove duplicates based on shapeID
             intersected_village_gdf = intersected_village_gdf.drop_duplicates(subset=['shapeID'])
             
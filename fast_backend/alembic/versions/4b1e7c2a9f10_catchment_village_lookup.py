@@ -0,0 +1,44 @@
+"""catchment village lookup
+
+Revision ID: 4b1e7c2a9f10
+Revises: 9d327adc1a23
+Create Date: 2026-10-17 10:12:41.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b1e7c2a9f10'
+down_revision: Union[str, None] = '9d327adc1a23'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stp_catchment_village',
+    sa.Column('Drain_No', sa.Integer(), nullable=False),
+    sa.Column('village_id', sa.Integer(), nullable=False),
+    sa.Column('village_name', sa.String(), nullable=False),
+    sa.Column('intersect_area', sa.Float(), nullable=False),
+    sa.Column('area_fraction', sa.Float(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('modified_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['Drain_No'], ['stp_drain.Drain_No'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_stp_catchment_village_id'), 'stp_catchment_village', ['id'], unique=True)
+    op.create_index('ix_stp_catchment_village_version_drain', 'stp_catchment_village', ['version', 'Drain_No'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_stp_catchment_village_version_drain', table_name='stp_catchment_village')
+    op.drop_index(op.f('ix_stp_catchment_village_id'), table_name='stp_catchment_village')
+    op.drop_table('stp_catchment_village')
@@ -0,0 +1,44 @@
+"""geoserver artifact registry
+
+Revision ID: c3f8a1d5e2b7
+Revises: 4b1e7c2a9f10
+Create Date: 2026-10-17 14:05:18.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f8a1d5e2b7'
+down_revision: Union[str, None] = '4b1e7c2a9f10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('geoserver_artifact',
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('workspace', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('store', sa.String(), nullable=True),
+    sa.Column('local_path', sa.String(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=True),
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('modified_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_geoserver_artifact_id'), 'geoserver_artifact', ['id'], unique=True)
+    op.create_index('ix_geoserver_artifact_live_expiry', 'geoserver_artifact', ['deleted_at', 'expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_geoserver_artifact_live_expiry', table_name='geoserver_artifact')
+    op.drop_index(op.f('ix_geoserver_artifact_id'), table_name='geoserver_artifact')
+    op.drop_table('geoserver_artifact')
@@ -0,0 +1,28 @@
+"""geoserver artifact attempts
+
+Revision ID: d9b4e6f1a3c8
+Revises: c3f8a1d5e2b7
+Create Date: 2026-10-17 18:20:41.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9b4e6f1a3c8'
+down_revision: Union[str, None] = 'c3f8a1d5e2b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('geoserver_artifact', sa.Column('attempts', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('geoserver_artifact', 'attempts')
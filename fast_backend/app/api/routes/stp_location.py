@@ -2,7 +2,7 @@ from fastapi import APIRouter
 from app.database.config.dependency import db_dependency
 from app.api.service.spt_service import Stp_service
 from fastapi import HTTPException,status
-from app.api.schema.stp_schema import Stp_response,Stp_town_respons,District_request,Sub_district_request,STPRiverOutput,STPCatchmentOutput,STPDrainOutput,STPStretchesOutput,STPStretchesInput,STPDrainInput,STPCatchmentInput,Town_request
+from app.api.schema.stp_schema import Stp_response,Stp_town_respons,District_request,Sub_district_request,STPRiverOutput,STPCatchmentOutput,STPDrainOutput,STPStretchesOutput,STPStretchesInput,STPDrainInput,STPCatchmentInput,Town_request,STPCatchmentVillageOutput
 from app.api.service.stp_operation import STPPriorityMapper
 
 router=APIRouter()
@@ -96,5 +96,16 @@ async def get_stretch(db:db_dependency,payload:STPCatchmentInput):
         )
 
 
+@router.post("/get_cachement_villages_bulk",response_model=list[STPCatchmentVillageOutput])
+async def get_cachement_villages_bulk(db:db_dependency,payload:STPCatchmentInput):
+    try:
+        return Stp_service.get_catchment_villages(db,payload.drain_nos)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
 # drain
 # catchment villages
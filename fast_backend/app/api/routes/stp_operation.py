@@ -2,8 +2,12 @@ from fastapi import APIRouter
 from app.database.config.dependency import db_dependency
 from app.api.service.spt_service import Stp_service
 from fastapi import HTTPException,status
-from app.api.schema.stp_schema import  STPCategory,STPSutabilityInput,category_raster
+from app.api.schema.stp_schema import  STPCategory,STPSutabilityInput,category_raster,STPWeightUpdate,STPPriorityInput,STPScenarioBatch
 from app.api.service.stp_operation import STPPriorityMapper,STPSutabilityMapper
+from app.api.service.overlay_engine import OverlayEngine,OverlayBudgetError,overlay_sessions
+from app.api.service.network.network_conf import GeoConfig
+from app.api.service.artifact_reaper import artifact_reaper
+import time
 router=APIRouter()
 
 @router.post("/stp_priority")
@@ -15,12 +19,158 @@ def stp_raster(db:db_dependency,payload: STPCategory):
             detail="No data found"
         )
         raster_path,raster_weights=Stp_service.get_raster(db,payload)
-        return STPPriorityMapper().create_priority_map(raster_path,raster_weights,payload.clip,payload.place)
+        return STPPriorityMapper().create_priority_map(raster_path,raster_weights,payload.clip,payload.place,payload.class_scheme)
 
     except Exception as e:
         print("exception is ",e)
     
 
+
+@router.post("/stp_priority_session")
+def stp_priority_session(db:db_dependency,payload: STPCategory):
+    try:
+        if not payload.data:
+            raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No data found"
+        )
+        raster_path,raster_weights=Stp_service.get_raster(db,payload)
+        file_names=[i.file_name for i in payload.data]
+        engine=OverlayEngine(GeoConfig(),raster_path,file_names,raster_weights,payload.clip,payload.place,payload.class_scheme)
+        session_id=overlay_sessions.create(engine)
+        with engine.lock:
+            result=engine.publish()
+        return {"session_id":session_id,"weights":engine.current_weights(),"result":result}
+    except HTTPException:
+        raise
+    except OverlayBudgetError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        print("exception is ",e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
+@router.post("/stp_priority_session/weights")
+def stp_priority_session_weights(payload: STPWeightUpdate):
+    try:
+        engine=overlay_sessions.get(payload.session_id)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Session {payload.session_id} not found or expired"
+        )
+    file_names=[i.file_name for i in payload.data]
+    if len(set(file_names))!=len(file_names):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A raster is listed more than once"
+        )
+    try:
+        with engine.lock:
+            start=time.perf_counter()
+            engine.update_weights({i.file_name: float(i.weight) for i in payload.data})
+            compute_ms=(time.perf_counter()-start)*1000
+            result=engine.publish()
+        return {"session_id":payload.session_id,"weights":engine.current_weights(),"compute_ms":round(compute_ms,2),"result":result}
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        print("exception is ",e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
+@router.post("/stp_priority_scenarios")
+def stp_priority_scenarios(db:db_dependency,payload: STPScenarioBatch):
+    config=GeoConfig()
+    if not payload.scenarios or len(payload.scenarios)>config.scenario_batch_max:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Between 1 and {config.scenario_batch_max} scenarios are required"
+        )
+    # Every raster named by any scenario is aligned once; a scenario that leaves one out weights it 0
+    file_names=list(dict.fromkeys(i.file_name for scenario in payload.scenarios for i in scenario.data))
+    if not file_names:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No data found"
+        )
+    names=[scenario.name or f"scenario_{index+1}" for index,scenario in enumerate(payload.scenarios)]
+    # Names label the CSV's Scenario column, so they must tell scenarios apart
+    if len(set(names))!=len(names):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Scenario names must be unique"
+        )
+    weight_matrix=[[0.0]*len(file_names) for _ in payload.scenarios]
+    for name,row,scenario in zip(names,weight_matrix,payload.scenarios):
+        scenario_files=[i.file_name for i in scenario.data]
+        if len(set(scenario_files))!=len(scenario_files):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Scenario {name} lists a raster more than once"
+            )
+        for i in scenario.data:
+            row[file_names.index(i.file_name)]=float(i.weight)
+    try:
+        raster_path,_=Stp_service.get_raster(db,STPCategory(data=[STPPriorityInput(file_name=i,weight=0) for i in file_names]))
+        # No weights: the engine skips the full-basin layer a session would need
+        engine=OverlayEngine(config,raster_path,file_names,None,payload.clip,payload.place,payload.class_scheme)
+        return engine.evaluate_scenarios(names,weight_matrix,class_scheme=payload.class_scheme,publish=payload.publish)
+    except OverlayBudgetError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        print("exception is ",e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
+@router.delete("/stp_priority_session/{session_id}")
+def stp_priority_session_close(session_id: str):
+    return {"closed": overlay_sessions.drop(session_id)}
+
+
+@router.get("/geoserver_artifacts/metrics")
+def geoserver_artifact_metrics():
+    return artifact_reaper.snapshot()
+
+
+@router.post("/geoserver_artifacts/reap")
+def geoserver_artifact_reap(dry_run: bool = True):
+    summary=artifact_reaper.run_once(dry_run=dry_run)
+    if "error" in summary:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=summary["error"]
+        )
+    return summary
+
     
 @router.post("/stp_sutability")
 def stp_classify(db:db_dependency,payload:STPSutabilityInput):
@@ -33,9 +183,9 @@ def stp_classify(db:db_dependency,payload:STPSutabilityInput):
             detail=str(e)
         )
 @router.post("/stp_visual_display")
-def stp_priority_raster_dislay(db:db_dependency,payload:category_raster):
+async def stp_priority_raster_dislay(db:db_dependency,payload:category_raster):
     try:
-        return STPPriorityMapper().category_priority_map(db,payload.clip,payload.place)
+        return await STPPriorityMapper().category_priority_map(db,payload.clip,payload.place)
     except Exception as e:
         print("exception",e)
         raise HTTPException(
@@ -44,9 +194,9 @@ def stp_priority_raster_dislay(db:db_dependency,payload:category_raster):
         )
 
 @router.post("/stp_sutability_visual_display")
-def stp_priority_raster_dislay(db:db_dependency,payload:category_raster):
+async def stp_priority_raster_dislay(db:db_dependency,payload:category_raster):
     try:
-        return STPPriorityMapper().category_priority_map_villages(db,payload.clip)
+        return await STPPriorityMapper().category_priority_map_villages(db,payload.clip)
     except Exception as e:
         print("exception",e)
         raise HTTPException(
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Annotated,List
+from typing import Annotated,List,Literal
 
 
 class Stp_response(BaseModel):
@@ -39,9 +39,28 @@ class STPCategory(BaseModel):
     clip: List[int] = None
     all_data: bool = True
     place: str = None
+    class_scheme: Literal["equal", "quantile", "jenks"] = "equal"
     class Config:
         from_attributes = True
 
+
+class STPWeightUpdate(BaseModel):
+    session_id: str
+    data: List[STPPriorityInput]
+
+
+class STPScenario(BaseModel):
+    name: str = None
+    data: List[STPPriorityInput]
+
+
+class STPScenarioBatch(BaseModel):
+    scenarios: List[STPScenario]
+    clip: List[int] = None
+    place: str = None
+    class_scheme: Literal["equal", "quantile", "jenks"] = "equal"
+    publish: bool = False
+
     
 class STPRasterInputt(BaseModel):
     id: int
@@ -68,6 +87,7 @@ class STPSutabilityInput(BaseModel):
     data: List[STP_sutability] = None
     clip: List[int] = None
     all_data: bool = True
+    class_scheme: Literal["equal", "quantile", "jenks"] = "equal"
     class Config:
         from_attributes = True
 
@@ -115,6 +135,26 @@ class STPCatchmentOutput(BaseModel):
 
 
 
+class STPCatchmentVillageDrain(BaseModel):
+    Drain_No:int
+    area:float
+    area_fraction:float
+
+
+class STPCatchmentVillageOutput(BaseModel):
+    id:int
+    village_name:str
+    # Sums over the selected drains: a village part inside two selected catchments
+    # counts twice, so these are not the village area covered; see drains for each share
+    area_sum:float
+    area_fraction_sum:float
+    drain_nos:list[int]
+    drains:list[STPCatchmentVillageDrain]
+
+    class Config:
+        from_attributes = True
+
+
 class STPStretchesInput(BaseModel):
     river_code: int=None
     all_data: bool = False
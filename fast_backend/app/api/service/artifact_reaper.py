@@ -0,0 +1,144 @@
+import os
+import time
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import groupby
+from typing import Dict, List
+from app.api.service.geoserver import Geoserver
+from app.api.service.network.network_conf import GeoConfig
+from app.database.config.session import SessionLocal
+from app.database.crud.geoserver_crud import Geoserver_artifact_crud
+
+
+class ArtifactReaper:
+    """Deletes GeoServer stores, layers, granules and styles once their TTL runs out.
+
+    Publishers ``record`` what they are about to create in the
+    ``geoserver_artifact`` table before publishing, so a reused name is
+    extended under a row lock rather than reaped mid-publish. ``run_once``
+    claims a batch of expired rows with SKIP LOCKED, so several workers
+    never reap the same item. It deletes them through the
+    REST API, and a kind is only processed after the kinds that depend on
+    it (layers go before their styles). A row that fails
+    ``artifact_reaper_max_attempts`` times is no longer claimed and shows
+    up as ``abandoned``. In dry-run mode it only reports what it would
+    delete. Counters for every run are kept in ``metrics``.
+    """
+
+    kind_order = {"granule": 0, "coverage_store": 1, "feature_type": 2, "style": 3}
+
+    def __init__(self, config: GeoConfig = None, geo: Geoserver = None):
+        self.config = config or GeoConfig()
+        self._geo = geo
+        self._lock = threading.Lock()
+        self.metrics = {
+            "runs": 0,
+            "dry_runs": 0,
+            "errors": 0,
+            "deleted": Counter(),
+            "failed": Counter(),
+            "last_run": None,
+        }
+
+    @property
+    def geo(self) -> Geoserver:
+        if self._geo is None:
+            self._geo = Geoserver(self.config)
+        return self._geo
+
+    def record(self, artifacts: List[Dict]) -> None:
+        """Register artifacts about to be published: dicts with kind, workspace, name and optional store/local_path."""
+        if not artifacts:
+            return
+        db = SessionLocal()
+        try:
+            Geoserver_artifact_crud(db).record(artifacts, self.config.artifact_ttl)
+        except Exception as e:
+            # Publishing goes ahead anyway; a missed row only means a leftover layer
+            db.rollback()
+            print(f"Could not record GeoServer artifacts: {e}")
+        finally:
+            db.close()
+
+    def _delete(self, artifact) -> bool:
+        try:
+            if not self.geo.delete_artifact(artifact.kind, artifact.workspace, artifact.name, artifact.store):
+                return False
+            if artifact.local_path and os.path.exists(artifact.local_path):
+                os.remove(artifact.local_path)
+            return True
+        except Exception as e:
+            print(f"Error deleting {artifact.kind} '{artifact.name}': {e}")
+            return False
+
+    def run_once(self, dry_run: bool = None) -> Dict:
+        dry_run = self.config.artifact_reaper_dry_run if dry_run is None else dry_run
+        start = time.perf_counter()
+        summary = {"at": datetime.now().isoformat(), "dry_run": dry_run, "claimed": 0,
+                   "deleted": {}, "failed": {}, "pending": None, "abandoned": None}
+        db = SessionLocal()
+        try:
+            crud = Geoserver_artifact_crud(db)
+            max_attempts = self.config.artifact_reaper_max_attempts
+            batch = crud.claim_expired(self.config.artifact_reaper_batch_size, max_attempts)
+            # Re-checked on the locked rows: a publisher may have extended one since the query's snapshot
+            now = datetime.now()
+            batch = [a for a in batch if a.expires_at <= now]
+            batch.sort(key=lambda a: self.kind_order.get(a.kind, len(self.kind_order)))
+            summary["claimed"] = len(batch)
+            if dry_run:
+                summary["would_delete"] = [
+                    {"kind": a.kind, "workspace": a.workspace, "name": a.name, "store": a.store}
+                    for a in batch
+                ]
+                db.rollback()
+            else:
+                deleted, failed = [], []
+                with ThreadPoolExecutor(max_workers=self.config.geoserver_max_in_flight) as pool:
+                    for kind, group in groupby(batch, key=lambda a: a.kind):
+                        group = list(group)
+                        for artifact, ok in zip(group, pool.map(self._delete, group)):
+                            (deleted if ok else failed).append(artifact)
+                # Failed rows stay live and are retried on the next run, up to max_attempts
+                crud.mark_deleted(deleted)
+                crud.mark_failed(failed)
+                db.commit()
+                summary["deleted"] = dict(Counter(a.kind for a in deleted))
+                summary["failed"] = dict(Counter(a.kind for a in failed))
+            summary["pending"] = crud.pending_count(max_attempts)
+            summary["abandoned"] = crud.abandoned_count(max_attempts)
+        except Exception as e:
+            db.rollback()
+            summary["error"] = str(e)
+            print(f"GeoServer artifact reaper failed: {e}")
+        finally:
+            db.close()
+        summary["duration_s"] = round(time.perf_counter() - start, 3)
+
+        with self._lock:
+            self.metrics["runs"] += 1
+            self.metrics["dry_runs"] += int(dry_run)
+            self.metrics["errors"] += int("error" in summary)
+            self.metrics["deleted"].update(summary["deleted"])
+            self.metrics["failed"].update(summary["failed"])
+            self.metrics["last_run"] = summary
+        return summary
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                **self.metrics,
+                "deleted": dict(self.metrics["deleted"]),
+                "failed": dict(self.metrics["failed"]),
+            }
+
+    async def run_forever(self) -> None:
+        while True:
+            await asyncio.to_thread(self.run_once)
+            await asyncio.sleep(self.config.artifact_reaper_interval)
+
+
+artifact_reaper = ArtifactReaper()
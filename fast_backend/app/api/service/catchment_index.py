@@ -0,0 +1,74 @@
+import threading
+from typing import Dict, List
+import numpy as np
+import pandas as pd
+from app.api.service.network.network_conf import GeoConfig
+from app.api.service.layer_registry import layer_registry
+
+
+class CatchmentVillageIndex:
+    """Drain_No -> intersecting village rows, built with one bulk STRtree query.
+
+    A village intersects the union of several catchments exactly when it
+    intersects one of them, so a multi-drain request is a set union of the
+    cached lists. Positions refer to the shared villages layer in
+    ``projected_crs``, and the table is rebuilt whenever the layer registry
+    reloads either shapefile.
+    """
+
+    projected_crs = "EPSG:32643"
+
+    def __init__(self, config: GeoConfig):
+        self.config = config
+        self._lock = threading.Lock()
+        self._sources = None
+        self.villages = None
+        self.adjacency: Dict[int, np.ndarray] = {}
+
+    def _layers(self):
+        catchments = layer_registry.get(self.config.cachement_shapefile, self.projected_crs)
+        villages = layer_registry.get(self.config.villages_shapefile, self.projected_crs)
+        return catchments, villages
+
+    def _build(self, catchments, villages) -> None:
+        catchment_pos, village_pos = villages.sindex.query(catchments.geometry, predicate="intersects")
+        pairs = pd.DataFrame({
+            "drain": catchments["Drain_No"].to_numpy()[catchment_pos],
+            "village": village_pos,
+        }).drop_duplicates()
+        self.adjacency = {
+            int(drain): np.sort(group.to_numpy())
+            for drain, group in pairs.groupby("drain")["village"]
+        }
+        self.villages = villages
+        # The frames themselves, not their ids: a reloaded frame could reuse a freed id
+        self._sources = (catchments, villages)
+        print(f"Catchment index built for {len(self.adjacency)} drains")
+
+    def refresh(self):
+        """The villages frame and the adjacency built from it, as one consistent snapshot."""
+        catchments, villages = self._layers()
+        with self._lock:
+            if self._sources is None or self._sources[0] is not catchments or self._sources[1] is not villages:
+                self._build(catchments, villages)
+            return self.villages, self.adjacency
+
+    def villages_for(self, drain_nos: List[int]):
+        """Rows of the villages layer that intersect any catchment of ``drain_nos``, in layer order."""
+        # A rebuild replaces both attributes, so only the snapshot's pair may be combined
+        villages, adjacency = self.refresh()
+        lists = [adjacency[int(d)] for d in drain_nos or [] if int(d) in adjacency]
+        positions = np.unique(np.concatenate(lists)) if lists else np.empty(0, dtype=np.int64)
+        return villages.iloc[positions]
+
+
+_catchment_index = None
+_catchment_index_lock = threading.Lock()
+
+
+def get_catchment_index(config: GeoConfig = None) -> CatchmentVillageIndex:
+    global _catchment_index
+    with _catchment_index_lock:
+        if _catchment_index is None:
+            _catchment_index = CatchmentVillageIndex(config or GeoConfig())
+        return _catchment_index
@@ -1,5 +1,3 @@
-import requests
-from requests.auth import HTTPBasicAuth
 import os
 from app.conf.settings import Settings
 import rasterio
@@ -9,7 +7,16 @@ from xml.dom import minidom
 from xml.etree import ElementTree as ET
 from datetime import datetime
 from app.api.service.network.network_conf import GeoConfig
+from app.api.service.network.geoserver_client import get_geoserver_session, get_catalog_cache, UploadStream
 import time
+import uuid
+import shutil
+import zipfile
+import tempfile
+import threading
+import posixpath
+import asyncio
+from pathlib import Path
 
 input_path=f"{Settings().BASE_DIR}"+"/temp/input"
 output_path=f"{Settings().BASE_DIR}"+"/temp/output"
@@ -397,6 +404,13 @@ class Geoserver:
         self.wms_url = f"{self.geoserver_url}/wms"
         self.wfs_url = f"{self.geoserver_url}/wfs"
         self.temp_dir = config.output_path
+        self.session = get_geoserver_session(config)
+        self.catalog = get_catalog_cache(config)
+        self.publish_mode = config.publish_mode
+        self.shared_dir = Path(config.shared_publish_path)
+        self.remote_shared_dir = config.geoserver_shared_publish_path
+        self._mosaic_locks = {}
+        self._mosaic_locks_guard = threading.Lock()
 
     def raster_download(self,workspace_name,store_name,layer_name,legends=5):
         geoserver_wcs_url = (f"{self.wcs_url}"
@@ -407,8 +421,7 @@ class Geoserver:
                     f"&format=image/geotiff"
                 )
 
-        r = requests.get(geoserver_wcs_url
-                    , auth=HTTPBasicAuth(self.username, self.password),cookies={})
+        r = self.session.get(geoserver_wcs_url)
         print(r.status_code)
         if r.status_code == 200:
             filename = layer_name.split(":")[-1] + ".tif"
@@ -418,15 +431,16 @@ class Geoserver:
             return file_path
         
         
-    def apply_sld_to_layer(self,workspace_name, layer_name, sld_content, sld_name=None):
-        if sld_name is None:
-            sld_name = layer_name+datetime.now().strftime("%Y%m%d%H%M%S")
-        
+    def new_store_name(self, workspace_name, prefix):
+        """Unique coverage store name, remembered as absent so its first publish skips the cleanup call."""
+        store_name = f"{prefix}_{uuid.uuid4().hex}"
+        self.catalog.remember(("store", workspace_name, store_name), "absent")
+        return store_name
 
-        new_sld_content=""
-        with open(sld_content, "r") as f:
-            new_sld_content = f.read()
-        
+    def _ensure_style(self, workspace_name, sld_name):
+        style_key = ("style", workspace_name, sld_name)
+        if self.catalog.get(style_key) == "present":
+            return True
         styles_url = f"{self.geoserver_url}/rest/workspaces/{workspace_name}/styles"
         style_data = {
             "style": {
@@ -434,43 +448,71 @@ class Geoserver:
                 "filename": f"{sld_name}.sld"
             }
         }
-        
-        style_url = f"{styles_url}/{sld_name}"
-        check_response = requests.get(
-            style_url,
-            auth=HTTPBasicAuth(self.username, self.password)
+        # Style names are almost always new, so create first and only look it up if that fails
+        print(f"Creating new style metadata: {sld_name}")
+        create_response = self.session.post(
+            styles_url,
+            json=style_data,
+            headers={"Content-Type": "application/json"}
         )
-        
-        if check_response.status_code != 200:
-            # Style doesn't exist, create it
-            print(f"Creating new style metadata: {sld_name}")
-            create_response = requests.post(
-                styles_url,
-                json=style_data,
-                auth=HTTPBasicAuth(self.username, self.password),
-                headers={"Content-Type": "application/json"}
-            )
-            
-            if create_response.status_code not in [200, 201]:
+        if create_response.status_code not in [200, 201]:
+            check_response = self.session.get(f"{styles_url}/{sld_name}")
+            if check_response.status_code != 200:
                 print(f"Failed to create style metadata: {create_response.status_code}, {create_response.text}")
                 return False
+        self.catalog.remember(style_key)
+        return True
+
+    def upload_style(self, workspace_name, sld_content, sld_name):
+        """Create or overwrite workspace style ``sld_name`` from the SLD file ``sld_content``."""
+        new_sld_content=""
+        with open(sld_content, "r") as f:
+            new_sld_content = f.read()
         
-        # Now upload the SLD content 
-        print(f"Uploading SLD content for style: {sld_name}")
-        upload_response = requests.put(
-            style_url,
-            data=new_sld_content,
-            auth=HTTPBasicAuth(self.username, self.password),
-            headers={"Content-Type": "application/vnd.ogc.sld+xml"}
-        )
+        style_key = ("style", workspace_name, sld_name)
+        style_url = f"{self.geoserver_url}/rest/workspaces/{workspace_name}/styles/{sld_name}"
+        for attempt in range(2):
+            if not self._ensure_style(workspace_name, sld_name):
+                return False
+
+            # Now upload the SLD content 
+            print(f"Uploading SLD content for style: {sld_name}")
+            upload_response = self.session.put(
+                style_url,
+                data=new_sld_content,
+                headers={"Content-Type": "application/vnd.ogc.sld+xml"}
+            )
+            if upload_response.status_code == 404 and attempt == 0:
+                # Style was removed behind the cache; recreate it once
+                self.catalog.forget(style_key)
+                continue
+            break
         
         if upload_response.status_code not in [200, 201]:
+            self.catalog.forget(style_key)
             print(f"Failed to upload SLD content: {upload_response.status_code}, {upload_response.text}")
             return False
         
         print(f"Successfully uploaded SLD content")
-        
-        # Now apply the style to the layer
+        return True
+
+    def ensure_style(self, workspace_name, sld_content, sld_name):
+        """Like ``upload_style`` for content-addressed styles: an existing ``sld_name`` is reused as is."""
+        style_key = ("style", workspace_name, sld_name)
+        if self.catalog.get(style_key) == "present":
+            return True
+        check_response = self.session.get(f"{self.geoserver_url}/rest/workspaces/{workspace_name}/styles/{sld_name}")
+        if check_response.status_code == 200:
+            print(f"Reusing existing style: {sld_name}")
+            self.catalog.remember(style_key)
+            return True
+        return self.upload_style(workspace_name, sld_content, sld_name)
+
+    def apply_sld_to_layer(self,workspace_name, layer_name, sld_content, sld_name=None, reuse_style=False):
+        if sld_name is None:
+            sld_name = layer_name+datetime.now().strftime("%Y%m%d%H%M%S")
+
+        store_style = self.ensure_style if reuse_style else self.upload_style
         layer_url = f"{self.geoserver_url}/rest/workspaces/{workspace_name}/layers/{layer_name}"
         payload = {
         "layer": {
@@ -479,147 +521,176 @@ class Geoserver:
             }
         }
         }
+        for attempt in range(2):
+            if not store_style(workspace_name, sld_content, sld_name):
+                return False
+
+            # Now apply the style to the layer
+            apply_response = self.session.put(
+                layer_url,
+                json=payload,  # This will serialize the payload as JSON
+                headers={"Content-Type": "application/json"}
+            )
+            if apply_response.status_code not in [200, 201] and reuse_style and attempt == 0:
+                # Another worker may have reaped the reused style while our cache still
+                # lists it; forget it so ensure_style checks and uploads it again
+                print(f"Applying reused style {sld_name} failed ({apply_response.status_code}); re-uploading it")
+                self.catalog.forget(("style", workspace_name, sld_name))
+                continue
+            break
 
-        apply_response = requests.put(
-            layer_url,
-            json=payload,  # This will serialize the payload as JSON
-            auth=HTTPBasicAuth(self.username, self.password),
-            headers={"Content-Type": "application/json"}
-        )
-            
         if apply_response.status_code not in [200, 201]:
             print(f"Failed to apply style to layer: {apply_response.status_code}, {apply_response.text}")
             return False
         print(f"Successfully applied style to layer")
         return True
-  
-    
-    def publish_raster(self, workspace_name, store_name, raster_path):
-        try:
-            layer_name = os.path.splitext(os.path.basename(raster_path))[0]
-            file_extension = os.path.splitext(raster_path)[1].lower()
-            content_type = "image/tiff"
-            store_type = "GeoTIFF"
-            api_extension = "file.geotiff"
-            
-            # Check if workspace exists, create if not
-            check_workspace_url = f"{self.geoserver_url}/rest/workspaces/{workspace_name}"
-            check_workspace_response = requests.get(
-                check_workspace_url,
-                auth=HTTPBasicAuth(self.username, self.password)
-            )
-            
-            if check_workspace_response.status_code != 200:
-                print(f"Workspace '{workspace_name}' does not exist. Creating it...")
-                create_workspace_url = f"{self.geoserver_url}/rest/workspaces"
-                create_workspace_data = {
-                    "workspace": {
-                        "name": workspace_name
-                    }
-                }
-                
-                create_workspace_response = requests.post(
-                    create_workspace_url,
-                    auth=HTTPBasicAuth(self.username, self.password),
-                    json=create_workspace_data,
-                    headers={"Content-type": "application/json"}
-                )
-                
-                if create_workspace_response.status_code not in (200, 201):
-                    print(f"Failed to create workspace. Status code: {create_workspace_response.status_code}")
-                    print(f"Response: {create_workspace_response.text}")
-                    return False
-                
-                print(f"Workspace '{workspace_name}' created successfully")
 
-                # Ensure WMS service is enabled for the workspace
-                wms_settings_url = f"{self.geoserver_url}/rest/services/wms/workspaces/{workspace_name}/settings"
-                wms_settings_data = {
-                    "wms": {
-                        "enabled": True,
-                        "name": f"{workspace_name}_wms"
-                    }
+    def _in_shared_dir(self, path) -> bool:
+        return self.shared_dir.resolve() in Path(path).resolve().parents
+
+    def _external_url(self, raster_path):
+        """Move ``raster_path`` into the shared directory if needed and return it as GeoServer sees it."""
+        path = Path(raster_path).resolve()
+        if not self._in_shared_dir(path):
+            target = self.shared_dir / path.name
+            shutil.move(str(path), target)
+            path = target
+        return self._remote_url(path)
+
+    def _remote_url(self, local_path):
+        relative = Path(local_path).resolve().relative_to(self.shared_dir.resolve()).as_posix()
+        return f"file://{posixpath.join(self.remote_shared_dir, relative)}"
+
+    def discard_local(self, raster_path):
+        """Remove a published raster's local file unless GeoServer now reads it by reference."""
+        if self.publish_mode == "external" and self._in_shared_dir(raster_path):
+            return
+        if os.path.exists(raster_path):
+            os.remove(raster_path)
+
+    def _ensure_workspace(self, workspace_name):
+        workspace_key = ("workspace", workspace_name)
+        if self.catalog.get(workspace_key) == "present":
+            return True
+
+        # Check if workspace exists, create if not
+        check_workspace_url = f"{self.geoserver_url}/rest/workspaces/{workspace_name}"
+        check_workspace_response = self.session.get(check_workspace_url)
+        
+        if check_workspace_response.status_code != 200:
+            print(f"Workspace '{workspace_name}' does not exist. Creating it...")
+            create_workspace_url = f"{self.geoserver_url}/rest/workspaces"
+            create_workspace_data = {
+                "workspace": {
+                    "name": workspace_name
                 }
-                
-                wms_settings_response = requests.put(
-                    wms_settings_url,
-                    auth=HTTPBasicAuth(self.username, self.password),
-                    json=wms_settings_data,
-                    headers={"Content-type": "application/json"}
-                )
-                
-                if wms_settings_response.status_code not in (200, 201):
-                    print(f"Warning: Failed to enable WMS for workspace. Status code: {wms_settings_response.status_code}")
-                    print(f"Response: {wms_settings_response.text}")
-
-            # Check if coverage store exists
-            check_store_url = f"{self.geoserver_url}/rest/workspaces/{workspace_name}/coveragestores/{store_name}"    
-            check_store_response = requests.get(
-                check_store_url,
-                auth=HTTPBasicAuth(self.username, self.password)
+            }
+            
+            create_workspace_response = self.session.post(
+                create_workspace_url,
+                json=create_workspace_data,
+                headers={"Content-type": "application/json"}
             )
             
-            # If store exists, delete it completely to avoid duplicates
-            if check_store_response.status_code == 200:
-                print(f"Coverage store '{store_name}' exists. Deleting it to avoid duplicates...")
-                delete_store_url = f"{self.geoserver_url}/rest/workspaces/{workspace_name}/coveragestores/{store_name}?recurse=true"
-                delete_store_response = requests.delete(
-                    delete_store_url,
-                    auth=HTTPBasicAuth(self.username, self.password)
-                )
-                
-                if delete_store_response.status_code == 200:
-                    print(f"Existing coverage store '{store_name}' deleted successfully")
-                else:
-                    print(f"Warning: Failed to delete existing store. Status code: {delete_store_response.status_code}")
-
-            # Create new coverage store
-            print(f"Creating new coverage store '{store_name}' in workspace '{workspace_name}'...")
-            create_store_url = f"{self.geoserver_url}/rest/workspaces/{workspace_name}/coveragestores"
-            create_store_data = {
-                "coverageStore": {
-                    "name": store_name,
-                    "type": store_type,
+            if create_workspace_response.status_code not in (200, 201):
+                print(f"Failed to create workspace. Status code: {create_workspace_response.status_code}")
+                print(f"Response: {create_workspace_response.text}")
+                return False
+            
+            print(f"Workspace '{workspace_name}' created successfully")
+
+            # Ensure WMS service is enabled for the workspace
+            wms_settings_url = f"{self.geoserver_url}/rest/services/wms/workspaces/{workspace_name}/settings"
+            wms_settings_data = {
+                "wms": {
                     "enabled": True,
-                    "workspace": {
-                        "name": workspace_name
-                    }
+                    "name": f"{workspace_name}_wms"
                 }
             }
             
-            create_response = requests.post(
-                create_store_url,
-                auth=HTTPBasicAuth(self.username, self.password),
-                json=create_store_data,
+            wms_settings_response = self.session.put(
+                wms_settings_url,
+                json=wms_settings_data,
                 headers={"Content-type": "application/json"}
             )
             
-            if create_response.status_code not in (200, 201):
-                print(f"Failed to create coverage store. Status code: {create_response.status_code}")
-                print(f"Response: {create_response.text}")
-                return False
-                
-            print(f"Coverage store '{store_name}' created successfully")
+            if wms_settings_response.status_code not in (200, 201):
+                print(f"Warning: Failed to enable WMS for workspace. Status code: {wms_settings_response.status_code}")
+                print(f"Response: {wms_settings_response.text}")
 
-            # Upload raster file with configure=first to avoid auto-creation of duplicate coverages
+        self.catalog.remember(workspace_key)
+        return True
+
+    def _clear_store(self, workspace_name, store_name):
+        # Delete any previous store of this name completely to avoid duplicates.
+        # A DELETE answers 404 for a missing store, so no existence check is needed,
+        # and names minted by new_store_name skip the call entirely.
+        store_key = ("store", workspace_name, store_name)
+        if self.catalog.get(store_key) == "absent":
+            return
+        delete_store_url = f"{self.geoserver_url}/rest/workspaces/{workspace_name}/coveragestores/{store_name}?recurse=true"
+        if self.publish_mode == "external":
+            # The store owns its file in the shared directory, so remove that too
+            delete_store_url += "&purge=all"
+        delete_store_response = self.session.delete(delete_store_url)
+        
+        if delete_store_response.status_code == 200:
+            print(f"Existing coverage store '{store_name}' deleted successfully")
+        elif delete_store_response.status_code != 404:
+            print(f"Warning: Failed to delete existing store. Status code: {delete_store_response.status_code}")
+        self.catalog.forget(store_key)
+
+    def publish_raster(self, workspace_name, store_name, raster_path):
+        workspace_key = ("workspace", workspace_name)
+        store_key = ("store", workspace_name, store_name)
+        try:
+            layer_name = os.path.splitext(os.path.basename(raster_path))[0]
+            file_extension = os.path.splitext(raster_path)[1].lower()
+            content_type = "image/tiff"
+            api_extension = "file.geotiff"
+            external_url = None
+            if self.publish_mode == "external":
+                # Register the file GeoServer already sees instead of sending its bytes
+                content_type = "text/plain"
+                api_extension = "external.geotiff"
+                external_url = self._external_url(raster_path)
+
+            # The PUT below creates the coverage store when it does not exist, so
+            # the only calls left in steady state are delete (for reused names),
+            # upload and coverage configuration.
             upload_url = f"{self.geoserver_url}/rest/workspaces/{workspace_name}/coveragestores/{store_name}/{api_extension}?configure=first"
             
             headers = {"Content-type": content_type}
-            with open(raster_path, 'rb') as f:
-                data = f.read()
-            
-            print("Data size:", len(data))
-            print(f"Uploading raster to store '{store_name}'...")
-            
-            response = requests.put(
-                upload_url,
-                auth=HTTPBasicAuth(self.username, self.password),
-                data=data,
-                headers=headers
-            )
+            if external_url is None:
+                print("Data size:", os.path.getsize(raster_path))
+            else:
+                print("External raster:", external_url)
+            for attempt in range(2):
+                if not self._ensure_workspace(workspace_name):
+                    return False
+                self._clear_store(workspace_name, store_name)
+
+                # Upload raster file with configure=first to avoid auto-creation of duplicate coverages
+                if external_url is not None:
+                    print(f"Registering raster in store '{store_name}'...")
+                    response = self.session.put(upload_url, data=external_url, headers=headers)
+                else:
+                    print(f"Uploading raster to store '{store_name}'...")
+                    with UploadStream(raster_path) as data:
+                        response = self.session.put(
+                            upload_url,
+                            data=data,
+                            headers=headers
+                        )
+                if response.status_code == 404 and attempt == 0:
+                    # Workspace vanished behind the cache; check it again and retry once
+                    self.catalog.forget(workspace_key, store_key)
+                    continue
+                break
             
             if response.status_code in (200, 201):
                 print(f"Raster file uploaded successfully to store '{store_name}'")
+                self.catalog.remember(store_key)
                 
                 # Now create the coverage/layer explicitly
                 configure_url = f"{self.geoserver_url}/rest/workspaces/{workspace_name}/coveragestores/{store_name}/coverages"
@@ -640,9 +711,8 @@ class Geoserver:
                     }
                 }
                 
-                configure_response = requests.post(
+                configure_response = self.session.post(
                     configure_url,
-                    auth=HTTPBasicAuth(self.username, self.password),
                     json=coverage_data,
                     headers={"Content-type": "application/json"}
                 )
@@ -654,41 +724,265 @@ class Geoserver:
                     print(f"Response: {configure_response.text}")
                     
                     # Try to get automatically created coverage if manual creation failed
-                    auto_coverage_url = f"{self.geoserver_url}/rest/workspaces/{workspace_name}/coveragestores/{store_name}/coverages"
-                    auto_coverage_response = requests.get(
-                        auto_coverage_url,
-                        auth=HTTPBasicAuth(self.username, self.password)
-                    )
+                    auto_coverage_response = self.session.get(configure_url)
                     
                     if auto_coverage_response.status_code == 200:
                         coverages = auto_coverage_response.json()
                         if 'coverage' in coverages or 'coverages' in coverages:
                             print(f"Found automatically created coverage in store '{store_name}'")
                 
-                # Verify the layer exists and is accessible
-                verify_url = f"{self.geoserver_url}/rest/layers/{workspace_name}:{layer_name}"
-                verify_response = requests.get(
-                    verify_url,
-                    auth=HTTPBasicAuth(self.username, self.password)
-                )
+                # Output WMS endpoint info
+                wms_url = f"{self.geoserver_url}/wms?service=WMS&version=1.1.0&request=GetMap&layers={workspace_name}:{layer_name}"
+                print(f"WMS endpoint: {wms_url}")
                 
-                if verify_response.status_code == 200:
-                    print(f"Layer '{layer_name}' has been published and is available via WMS")
-                    
-                    # Output WMS endpoint info
-                    wms_url = f"{self.geoserver_url}/wms?service=WMS&version=1.1.0&request=GetMap&layers={workspace_name}:{layer_name}"
-                    print(f"WMS endpoint: {wms_url}")
-                    
-                    return True, layer_name
-                else:
-                    print(f"Warning: Could not verify layer configuration: {verify_response.status_code}")
-                    return True, layer_name  # Upload was successful even if verification failed
+                return True, layer_name
                     
             else:
+                self.catalog.forget(workspace_key, store_key)
                 print(f"Failed to upload raster file. Status code: {response.status_code}")
                 print(f"Response: {response.text}")
                 return False
                 
         except Exception as e:
+            self.catalog.forget(workspace_key, store_key)
             print(f"Error uploading raster file: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+
+    # ImageMosaic publishing: one store per result family, one granule per request.
+    # Granules are named "<request_id>.tif" and the id is exposed as the custom
+    # WMS dimension REQUEST, so clients select a result with DIM_REQUEST=<id>.
+    mosaic_dimension = "REQUEST"
+
+    def _mosaic_properties(self, coverage_name):
+        return {
+            "indexer.properties": "\n".join([
+                f"Name={coverage_name}",
+                "Schema=*the_geom:Polygon,location:String,request:String",
+                "PropertyCollectors=StringFileNameExtractorSPI[requestregex](request)",
+                "AdditionalDomainAttributes=request",
+                "AbsolutePath=true",
+                "Caching=false",
+                "",
+            ]),
+            "requestregex.properties": "regex=[0-9a-f]{32}\n",
+        }
+
+    def _mosaic_lock(self, workspace_name, store_name):
+        with self._mosaic_locks_guard:
+            return self._mosaic_locks.setdefault((workspace_name, store_name), threading.Lock())
+
+    def _zip_upload(self, url, files, method):
+        """Send ``files`` ({arcname: path or text}) as a stored zip, streamed from a temp file."""
+        fd, zip_path = tempfile.mkstemp(suffix=".zip", dir=self.temp_dir)
+        os.close(fd)
+        try:
+            with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_STORED) as zipf:
+                for arcname, content in files.items():
+                    if isinstance(content, Path):
+                        zipf.write(content, arcname)
+                    else:
+                        zipf.writestr(arcname, content)
+            with UploadStream(zip_path) as data:
+                return self.session.request(method, url, data=data, headers={"Content-type": "application/zip"})
+        finally:
+            os.remove(zip_path)
+
+    def _mosaic_dir(self, store_name):
+        path = self.shared_dir / "mosaic" / store_name
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _create_mosaic(self, workspace_name, store_name, raster_path, granule_name):
+        store_url = f"{self.geoserver_url}/rest/workspaces/{workspace_name}/coveragestores/{store_name}"
+        properties = self._mosaic_properties(store_name)
+        print(f"Creating mosaic store '{store_name}'...")
+        if self.publish_mode == "external":
+            mosaic_dir = self._mosaic_dir(store_name)
+            for name, content in properties.items():
+                with open(mosaic_dir / name, "w") as f:
+                    f.write(content)
+            shutil.move(str(raster_path), mosaic_dir / granule_name)
+            response = self.session.put(
+                f"{store_url}/external.imagemosaic?configure=all",
+                data=self._remote_url(mosaic_dir),
+                headers={"Content-type": "text/plain"}
+            )
+        else:
+            files = dict(properties)
+            files[granule_name] = Path(raster_path)
+            response = self._zip_upload(f"{store_url}/file.imagemosaic?configure=all", files, "PUT")
+        if response.status_code not in (200, 201):
+            print(f"Failed to create mosaic store. Status code: {response.status_code}")
+            print(f"Response: {response.text}")
+            return False
+
+        coverage_data = {
+            "coverage": {
+                "enabled": True,
+                "metadata": {
+                    "entry": [
+                        {"@key": "wms.published", "$": "true"},
+                        {
+                            "@key": f"custom_dimension_{self.mosaic_dimension}",
+                            "dimensionInfo": {"enabled": True, "presentation": "LIST"}
+                        }
+                    ]
+                }
+            }
+        }
+        dimension_response = self.session.put(
+            f"{store_url}/coverages/{store_name}",
+            json=coverage_data,
+            headers={"Content-type": "application/json"}
+        )
+        if dimension_response.status_code not in (200, 201):
+            print(f"Warning: Failed to enable {self.mosaic_dimension} dimension. Status code: {dimension_response.status_code}")
+        return True
+
+    def _harvest_granule(self, workspace_name, store_name, raster_path, granule_name):
+        store_url = f"{self.geoserver_url}/rest/workspaces/{workspace_name}/coveragestores/{store_name}"
+        if self.publish_mode == "external":
+            granule_path = self._mosaic_dir(store_name) / granule_name
+            shutil.move(str(raster_path), granule_path)
+            response = self.session.post(
+                f"{store_url}/external.imagemosaic",
+                data=self._remote_url(granule_path),
+                headers={"Content-type": "text/plain"}
+            )
+        else:
+            response = self._zip_upload(f"{store_url}/file.imagemosaic", {granule_name: Path(raster_path)}, "POST")
+        if response.status_code not in (200, 201, 202):
+            print(f"Failed to harvest granule. Status code: {response.status_code}")
+            print(f"Response: {response.text}")
+            return False
+        # Grow the advertised extent to cover granules outside the first one
+        self.session.put(
+            f"{store_url}/coverages/{store_name}?recalculate=nativebbox,latlonbbox",
+            json={"coverage": {"enabled": True}},
+            headers={"Content-type": "application/json"}
+        )
+        return True
+
+    def publish_granule(self, workspace_name, store_name, raster_path, request_id, sld_content=None, sld_name=None):
+        """Add ``raster_path`` to mosaic ``store_name`` as the granule for ``request_id``.
+
+        The mosaic (and its layer, named after the store) is created on first
+        use, with ``sld_content`` as its default style. Returns
+        ``(True, layer_name)`` like ``publish_raster``, or False.
+        """
+        store_key = ("mosaic", workspace_name, store_name)
+        granule_name = f"{request_id}.tif"
+        try:
+            if not self._ensure_workspace(workspace_name):
+                return False
+            with self._mosaic_lock(workspace_name, store_name):
+                if self.catalog.get(store_key) != "present":
+                    check_response = self.session.get(
+                        f"{self.geoserver_url}/rest/workspaces/{workspace_name}/coveragestores/{store_name}"
+                    )
+                    if check_response.status_code != 200:
+                        if not self._create_mosaic(workspace_name, store_name, raster_path, granule_name):
+                            return False
+                        if sld_content and not self.apply_sld_to_layer(workspace_name, store_name, sld_content, sld_name):
+                            print(f"Warning: Failed to set default style on mosaic '{store_name}'")
+                        self.catalog.remember(store_key)
+                        return True, store_name
+                    self.catalog.remember(store_key)
+
+            if not self._harvest_granule(workspace_name, store_name, raster_path, granule_name):
+                self.catalog.forget(store_key)
+                return False
+            return True, store_name
+        except Exception as e:
+            self.catalog.forget(store_key)
+            print(f"Error publishing granule: {str(e)}")
+            return False
+
+
+    def delete_artifact(self, kind, workspace_name, name, store=None):
+        """Remove one catalog object this app published; a 404 counts as already gone."""
+        workspace_url = f"{self.geoserver_url}/rest/workspaces/{workspace_name}"
+        # Rasters are either uploaded into GeoServer's data dir or referenced from the
+        # shared directory; either way nothing else uses the files, so purge them too
+        purge = "all"
+        if kind == "coverage_store":
+            url = f"{workspace_url}/coveragestores/{name}"
+            params = {"recurse": "true", "purge": purge}
+            self.catalog.forget(("store", workspace_name, name))
+        elif kind == "feature_type":
+            url = f"{workspace_url}/datastores/{store}/featuretypes/{name}"
+            params = {"recurse": "true"}
+        elif kind == "granule":
+            url = f"{workspace_url}/coveragestores/{store}/coverages/{store}/index/granules"
+            params = {"filter": f"request='{name}'", "purge": purge}
+        elif kind == "style":
+            url = f"{workspace_url}/styles/{name}"
+            # A style outlives every layer recorded with it, but one whose layer delete failed
+            # would still reference it and GeoServer refuses the delete without recurse
+            params = {"purge": "true", "recurse": "true"}
+            self.catalog.forget(("style", workspace_name, name))
+        else:
+            raise ValueError(f"Unknown GeoServer artifact kind '{kind}'")
+        response = self.session.delete(url, params=params)
+        if response.status_code in (200, 202, 204, 404):
+            return True
+        print(f"Failed to delete {kind} '{workspace_name}:{name}'. Status code: {response.status_code}")
+        return False
+
+class AsyncGeoserver:
+    """asyncio front end for ``Geoserver`` so routes can publish without holding a worker.
+
+    Each call runs the blocking REST sequence in a thread on the shared
+    pooled session, and a semaphore caps how many sequences (and so REST
+    requests) are in flight against GeoServer at once. Independent layers
+    published with ``asyncio.gather`` overlap their round trips.
+    """
+
+    def __init__(self, geo: Geoserver = None, max_in_flight: int = None):
+        self.geo = geo or Geoserver()
+        self.max_in_flight = max_in_flight or GeoConfig().geoserver_max_in_flight
+        self._semaphore = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it belongs to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphore
+
+    async def _call(self, func, *args, **kwargs):
+        async with self.semaphore:
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+    async def publish_raster(self, workspace_name, store_name, raster_path):
+        return await self._call(self.geo.publish_raster, workspace_name, store_name, raster_path)
+
+    async def apply_sld_to_layer(self, workspace_name, layer_name, sld_content, sld_name=None, reuse_style=False):
+        return await self._call(self.geo.apply_sld_to_layer, workspace_name, layer_name, sld_content, sld_name,
+                                reuse_style=reuse_style)
+
+    async def publish_styled_raster(self, workspace_name, store_name, raster_path, sld_content, sld_name=None,
+                                    reuse_style=False):
+        """Publish ``raster_path`` and set its default style; returns the layer name."""
+        published = await self.publish_raster(workspace_name, store_name, raster_path)
+        if not published:
+            raise RuntimeError(f"Failed to publish raster {raster_path}")
+        _, layer_name = published
+        if not await self.apply_sld_to_layer(workspace_name, layer_name, sld_content, sld_name, reuse_style):
+            raise RuntimeError(f"Failed to apply style {sld_name} to layer {layer_name}")
+        return layer_name
+
+    async def upload_style(self, workspace_name, sld_content, sld_name, reuse_style=False):
+        store_style = self.geo.ensure_style if reuse_style else self.geo.upload_style
+        if not await self._call(store_style, workspace_name, sld_content, sld_name):
+            raise RuntimeError(f"Failed to upload style {sld_name}")
+        return sld_name
+
+    async def publish_granule(self, workspace_name, store_name, raster_path, request_id, sld_content=None, sld_name=None):
+        """Add ``raster_path`` to mosaic ``store_name`` for ``request_id``; returns the layer name."""
+        published = await self._call(self.geo.publish_granule, workspace_name, store_name, raster_path,
+                                     request_id, sld_content, sld_name)
+        if not published:
+            raise RuntimeError(f"Failed to publish granule {raster_path} to {store_name}")
+        return published[1]
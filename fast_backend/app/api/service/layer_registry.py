@@ -0,0 +1,56 @@
+import os
+import threading
+from typing import Dict, Iterable, Tuple
+import geopandas as gpd
+
+
+class VectorLayerRegistry:
+    """Process-wide cache of shapefiles, loaded once per worker in the CRS callers ask for.
+
+    Every ``get`` returns the same shared GeoDataFrame with its spatial index
+    already built, so treat it as read only: filter it (which copies) or call
+    ``.copy()`` before modifying. A layer is reloaded when its file mtime changes.
+    """
+
+    def __init__(self, default_crs: str = "EPSG:32644"):
+        self.default_crs = default_crs
+        self._layers: Dict[Tuple[str, str], Tuple[int, gpd.GeoDataFrame]] = {}
+        self._lock = threading.Lock()
+
+    def _read(self, path: str, crs: str) -> gpd.GeoDataFrame:
+        layer = gpd.read_file(path)
+        if layer.crs is None:
+            layer.set_crs(self.default_crs, inplace=True)
+        if crs is not None:
+            layer = layer.to_crs(crs)
+        layer.sindex
+        return layer
+
+    def get(self, path, crs: str = None) -> gpd.GeoDataFrame:
+        path = os.path.abspath(str(path))
+        key = (path, str(crs))
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._layers.get(key)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+            layer = self._read(path, crs)
+            # Drop every projection of the old file, not just this one
+            for stale in [k for k, v in self._layers.items() if k[0] == path and v[0] != mtime]:
+                del self._layers[stale]
+            self._layers[key] = (mtime, layer)
+            return layer
+
+    def preload(self, layers: Iterable[Tuple[str, str]]) -> None:
+        for path, crs in layers:
+            try:
+                self.get(path, crs)
+            except Exception as e:
+                print(f"Could not preload layer {path}: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._layers.clear()
+
+
+layer_registry = VectorLayerRegistry()
@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+from typing import Dict, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
+from app.api.service.network.network_conf import GeoConfig
+
+
+class GeoserverSession(requests.Session):
+    """Keep-alive session for the GeoServer REST API.
+
+    Authentication, the connection pool and retry/backoff live on the
+    session, and every request gets ``timeout`` unless the caller passes
+    its own. Retries cover connection failures and 502/503/504 on
+    idempotent methods only, so a POST that reached GeoServer is never
+    replayed.
+    """
+
+    def __init__(self, config: GeoConfig):
+        super().__init__()
+        self.auth = HTTPBasicAuth(config.username, config.password)
+        self.timeout = config.geoserver_timeout
+        retry = Retry(
+            total=config.geoserver_retries,
+            connect=config.geoserver_retries,
+            read=config.geoserver_retries,
+            status=config.geoserver_retries,
+            backoff_factor=config.geoserver_backoff,
+            status_forcelist=(502, 503, 504),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=config.geoserver_pool_connections,
+            pool_maxsize=config.geoserver_pool_size,
+            max_retries=retry,
+        )
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+class UploadStream:
+    """Read-only file body for streamed uploads with byte accounting.
+
+    requests sends it chunk by chunk (length from ``__len__``), so memory per
+    upload stays constant whatever the file size. ``seek``/``tell`` let
+    urllib3 rewind the body before a retry, and progress is printed every
+    ``report_every`` fraction of the file.
+    """
+
+    def __init__(self, path, label: str = None, report_every: float = 0.25):
+        self.path = str(path)
+        self.label = label or os.path.basename(self.path)
+        self.size = os.path.getsize(self.path)
+        self.bytes_sent = 0
+        self._file = open(self.path, "rb")
+        self._report_step = max(1, int(self.size * report_every))
+        self._next_report = min(self._report_step, self.size)
+
+    def __len__(self):
+        return self.size
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._file.read(size)
+        self.bytes_sent += len(chunk)
+        if chunk and self.bytes_sent >= self._next_report:
+            print(f"Uploading {self.label}: {self.bytes_sent}/{self.size} bytes")
+            self._next_report = min(self.bytes_sent + self._report_step, self.size)
+        return chunk
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        position = self._file.seek(offset, whence)
+        self.bytes_sent = position
+        self._next_report = min(position + self._report_step, self.size)
+        return position
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_sessions: Dict[Tuple[str, str], GeoserverSession] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_geoserver_session(config: GeoConfig = None) -> GeoserverSession:
+    """Process-wide GeoServer session, one per server URL and user."""
+    config = config or GeoConfig()
+    key = (config.geoserver_url, config.username)
+    with _sessions_lock:
+        if key not in _sessions:
+            _sessions[key] = GeoserverSession(config)
+        return _sessions[key]
+
+
+def close_geoserver_sessions() -> None:
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+class CatalogCache:
+    """Short-lived memory of GeoServer catalog objects this process has seen.
+
+    Keys are tuples such as ``("workspace", ws)`` or ``("store", ws, store)``
+    mapped to a state (``"present"`` or ``"absent"``). Entries expire after
+    ``ttl`` seconds and callers ``forget`` them on a 404 or error, so a
+    catalog changed behind our back costs one failed call, not a wrong result.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[tuple, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._entries[key]
+                return None
+            return entry[0]
+
+    def remember(self, key: tuple, state: str = "present") -> None:
+        with self._lock:
+            self._entries[key] = (state, time.monotonic() + self.ttl)
+
+    def forget(self, *keys: tuple) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_catalogs: Dict[Tuple[str, str], CatalogCache] = {}
+
+
+def get_catalog_cache(config: GeoConfig = None) -> CatalogCache:
+    """Catalog cache shared by every Geoserver client talking to the same server."""
+    config = config or GeoConfig()
+    key = (config.geoserver_url, config.username)
+    with _sessions_lock:
+        if key not in _catalogs:
+            _catalogs[key] = CatalogCache(config.geoserver_catalog_ttl)
+        return _catalogs[key]
@@ -9,6 +9,16 @@ class GeoConfig:
         self.username = self.settings.GEOSERVER_USERNAME
         self.password = self.settings.GEOSERVER_PASSWORD
         self.geoserver_external_url = self.settings.GEOSERVER_EX_URL
+        # Shared REST session: (connect, read) timeout in seconds, pool and retry/backoff
+        self.geoserver_timeout = (5, 300)
+        self.geoserver_pool_connections = 4
+        self.geoserver_pool_size = 16
+        self.geoserver_retries = 3
+        self.geoserver_backoff = 0.5
+        # Concurrent publish sequences from AsyncGeoserver; keep below geoserver_pool_size
+        self.geoserver_max_in_flight = 8
+        # Seconds a workspace/store/style seen by Geoserver is trusted without a GET
+        self.geoserver_catalog_ttl = 300
         self.raster_workspace="raster_work"
         self.raster_store="stp_raster_store"
         self.base_dir = Path(self.settings.BASE_DIR )
@@ -18,7 +28,63 @@ class GeoConfig:
         self.basin_shapefile = self.input_path /"media" / "Rajat_data"/ "shape_stp" / "STP_pripority_raster" / "Basin.shp"
         self.villages_shapefile = self.input_path /"media" / "Rajat_data"/ "shape_stp" / "villages" / "STP_Village.shp"
         self.cachement_shapefile=self.input_path /"media" / "Rajat_data"/ "shape_stp" / "Drain_stp" / "Catchment"/"Catchment.shp"
+        self.town_shapefile=self.input_path /"media" / "Rajat_data"/ "shape_stp" / "Drain_stp" / "Town"/"Town.shp"
+        self.aligned_cache_path = self.output_path / "aligned_cache"
+        self.use_aligned_cache = True
+        # LRU bounds of aligned_cache_path; each distinct common extent adds a band per source
+        self.aligned_cache_max_bytes = 20 * 1024 ** 3
+        self.aligned_cache_max_entries = 256
+        self.zone_index_path = self.output_path / "zone_index"
+        self.overlay_session_ttl = 30 * 60
+        self.overlay_max_sessions = 8
+        # Bytes of band stacks all overlay sessions of one worker may keep resident (LRU evicted)
+        self.overlay_session_budget_bytes = 4 * 1024 ** 3
+        # Weight scenarios accepted by one /stp_priority_scenarios request
+        self.scenario_batch_max = 64
+        # "memory", "tiled" or "auto" (tiled once the band stack would exceed in_memory_limit_bytes)
+        self.processing_mode = "auto"
+        self.in_memory_limit_bytes = 2 * 1024 ** 3
+        self.tile_size = 512
+        self.tile_workers = min(4, os.cpu_count() or 1)
+        self.align_workers = os.cpu_count() or 1
         os.makedirs(self.output_path, exist_ok=True)
+        # In "external" mode published rasters are written to shared_publish_path, which
+        # GeoServer mounts at geoserver_shared_publish_path, and registered by reference
+        self.publish_mode = self.settings.GEOSERVER_PUBLISH_MODE
+        self.shared_publish_path = Path(self.settings.GEOSERVER_SHARED_DIR)
+        self.geoserver_shared_publish_path = self.settings.GEOSERVER_SHARED_DIR_REMOTE
+        self.publish_output_path = self.shared_publish_path if self.publish_mode == "external" else self.output_path
+        os.makedirs(self.publish_output_path, exist_ok=True)
+        # Publish category results as granules of one ImageMosaic per category (selected
+        # with the REQUEST dimension) instead of a coverage store, layer and style each
+        self.use_mosaic_publish = False
+        self.mosaic_store_prefix = "stp_mosaic"
+        # Style priority/suitability layers with one shared SLD per colour ramp whose
+        # class breaks come from WMS env parameters, instead of uploading an SLD per layer
+        self.use_env_styles = False
+        # Seconds each kind of published GeoServer artifact lives before the reaper deletes it
+        self.artifact_ttl = {
+            "coverage_store": 6 * 3600,
+            "feature_type": 6 * 3600,
+            "style": 6 * 3600,
+            "granule": 24 * 3600,
+        }
+        self.artifact_reaper_enabled = True
+        self.artifact_reaper_interval = 15 * 60
+        self.artifact_reaper_batch_size = 200
+        self.artifact_reaper_dry_run = False
+        # Failed deletes of one row before the reaper leaves it for manual cleanup
+        self.artifact_reaper_max_attempts = 5
+        # Published rasters are written as Cloud-Optimized GeoTIFFs: internal tiles,
+        # compression with a predictor and overviews. ZSTD needs a GDAL built with it.
+        self.publish_cog = True
+        self.cog_compress = "DEFLATE"
+        self.cog_blocksize = 512
+        self.cog_overview_resampling = "AVERAGE"
+        # "continuous" publishes the float score styled with an SLD, "classified" a uint8
+        # 5-class map (0 = nodata) with an embedded colour table, "both" publishes both
+        self.stp_output_mode = "continuous"
+        self.classified_store = "stp_classified_store"
 
         self.target_crs = "EPSG:32644"
         self.target_resolution = (30, 30)
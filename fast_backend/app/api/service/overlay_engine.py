@@ -0,0 +1,244 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Dict, List
+import numpy as np
+import pandas as pd
+from rasterio.windows import Window
+from app.api.service.network.network_conf import GeoConfig
+from app.api.service.stp_operation import STPProcessor, STPPriorityMapper, geo
+
+
+class OverlayBudgetError(ValueError):
+    """The band stack of a session would not fit in memory; the request should use /stp_priority."""
+
+
+class OverlayEngine:
+    """Keeps the aligned band stack and combined mask of one STP priority session.
+
+    The stack is cropped to the basin window and pre-multiplied by the
+    constraint/basin mask once, so a weight change only costs a single
+    ``tensordot`` (or one axpy per changed band for small deltas).
+    With ``weights=None`` no current layer is computed; such an engine
+    only serves ``evaluate_scenarios``.
+
+    Each ``publish`` replaces the previous layer in the session's own
+    coverage stores and is styled with the shared env style, so a weight
+    tweak uploads one COG and no SLD, and never touches the shared
+    ``raster_store`` other requests publish into.
+    """
+
+    def __init__(self, config: GeoConfig, raster_paths: List[str], file_names: List[str],
+                 weights: List[float] = None, clip: List[int] = None, place: str = None, class_scheme: str = "equal"):
+        if len(raster_paths) != len(file_names) or (weights is not None and len(weights) != len(file_names)):
+            raise ValueError(f"Number of rasters ({len(raster_paths)}) must match number of weights "
+                             f"({len(file_names) if weights is None else len(weights)})")
+        duplicates = sorted({name for name in file_names if file_names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"Rasters {duplicates} are listed more than once")
+        processor = STPProcessor(config)
+        if processor.use_tiled_mode(raster_paths):
+            # The whole stack stays resident for the session, which tiled mode exists to avoid
+            raise OverlayBudgetError("These rasters are too large for an in-memory overlay session")
+        self.config = config
+        self.clip = clip
+        self.place = place
+        self.class_scheme = class_scheme
+        self.file_names = list(file_names)
+        self.weights = np.asarray(weights, dtype=np.float32) if weights is not None else None
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+        self.store_name = None
+        self.classified_store = None
+
+        processor.align_rasters(raster_paths)
+        outside_basin, out_transform, window = processor.basin_window(config.basin_shapefile)
+        rows, cols = window.toslices()
+
+        combined_mask = processor.load_constraint_mask([config.constraint_raster_path])[rows, cols]
+        combined_mask[outside_basin] = 0
+        self.band_stack = np.stack([array[rows, cols] for array in processor.aligned_arrays])
+        # The old pipeline zeroed any pixel whose weighted sum was NaN
+        combined_mask[np.isnan(self.band_stack).any(axis=0)] = 0
+        np.nan_to_num(self.band_stack, copy=False)
+        self.band_stack *= combined_mask
+
+        self.outside_basin = outside_basin
+        self.profile = processor.reference_profile.copy()
+        self.profile.update({
+            "height": self.band_stack.shape[1],
+            "width": self.band_stack.shape[2],
+            "transform": out_transform
+        })
+        self.layer = None
+        if self.weights is not None:
+            self._compute_full()
+
+    def _compute_full(self) -> None:
+        self.layer = np.tensordot(self.weights, self.band_stack, axes=1).astype(np.float32, copy=False)
+        self._apply_nodata()
+
+    def _apply_nodata(self) -> None:
+        # Matches rasterio.mask, which fills outside the shapes with the source nodata (or 0)
+        nodata = self.profile.get("nodata")
+        self.layer[self.outside_basin] = nodata if nodata is not None else 0
+
+    def update_weights(self, delta: Dict[str, float]) -> np.ndarray:
+        if self.weights is None:
+            raise ValueError("This overlay was built for scenarios only and has no current weights")
+        unknown = set(delta) - set(self.file_names)
+        if unknown:
+            raise ValueError(f"Rasters {sorted(unknown)} are not part of this session")
+        self.last_used = time.monotonic()
+
+        changed = []
+        for name, weight in delta.items():
+            index = self.file_names.index(name)
+            diff = np.float32(weight) - self.weights[index]
+            if diff != 0:
+                changed.append((index, diff))
+                self.weights[index] = weight
+        if not changed:
+            return self.layer
+
+        if 2 * len(changed) >= len(self.file_names):
+            self._compute_full()
+        else:
+            for index, diff in changed:
+                self.layer += diff * self.band_stack[index]
+            self._apply_nodata()
+        return self.layer
+
+    def scenario_layers(self, weight_matrix: np.ndarray, window: Window = None) -> np.ndarray:
+        """Overlays of every row of ``weight_matrix`` (K x bands) as one K-band array, optionally only in ``window``."""
+        rows, cols = window.toslices() if window is not None else (slice(None), slice(None))
+        layers = np.tensordot(np.asarray(weight_matrix, dtype=np.float32), self.band_stack[:, rows, cols], axes=1)
+        layers = layers.astype(np.float32, copy=False)
+        nodata = self.profile.get("nodata")
+        layers[:, self.outside_basin[rows, cols]] = nodata if nodata is not None else 0
+        return layers
+
+    def evaluate_scenarios(self, names: List[str], weight_matrix: np.ndarray, class_scheme: str = "equal",
+                           publish: bool = False) -> dict:
+        """Village class statistics of K weight scenarios over the aligned stack, publishing them only on request.
+
+        Only the user window of each overlay is needed for the statistics, so all K come from
+        tensordot products over that window, batched to stay within ``in_memory_limit_bytes``.
+        """
+        weight_matrix = np.asarray(weight_matrix, dtype=np.float32)
+        if weight_matrix.ndim != 2 or weight_matrix.shape[1] != len(self.file_names):
+            raise ValueError(f"Each scenario needs {len(self.file_names)} weights")
+        self.last_used = time.monotonic()
+        processor = STPProcessor(self.config)
+        window, inside = processor.user_window(self.profile, clip=self.clip, place=self.place)
+        per_batch = max(1, self.config.in_memory_limit_bytes // (4 * int(window.width) * int(window.height)))
+
+        scenarios = []
+        for start in range(0, len(names), per_batch):
+            layers = self.scenario_layers(weight_matrix[start:start + per_batch], window)
+            details = processor.scenario_details(layers, self.profile, window, inside, clip=self.clip,
+                                                 place=self.place, class_scheme=class_scheme)
+            del layers
+            for offset, villages in enumerate(details):
+                index = start + offset
+                scenarios.append({
+                    "name": names[index],
+                    "weights": {name: float(w) for name, w in zip(self.file_names, weight_matrix[index])},
+                    "csv_details": villages,
+                })
+
+        rows = [{"Scenario": scenario["name"], **village} for scenario in scenarios for village in scenario["csv_details"]]
+        csv_path = os.path.join(self.config.output_path, f"scenario_details_{uuid.uuid4().hex}.csv")
+        pd.DataFrame(rows).to_csv(csv_path, index=False)
+
+        if publish:
+            mapper = STPPriorityMapper(self.config)
+            for index, scenario in enumerate(scenarios):
+                layer = self.scenario_layers(weight_matrix[index:index + 1])
+                output_name = f"stp_priority_{uuid.uuid4().hex}_map.tif"
+                # Own stores per scenario: publishing into the shared ones would replace the previous scenario
+                result = mapper.publish_priority_array(
+                    layer, self.profile, output_name, clip=self.clip, place=self.place, class_scheme=class_scheme,
+                    store_name=geo.new_store_name(self.config.raster_workspace, self.config.raster_store),
+                    classified_store=geo.new_store_name(self.config.raster_workspace, self.config.classified_store)
+                )
+                # publish_priority_array prints its error and returns False
+                scenario["result"] = result or {"status": "failed", "error": f"Publishing {scenario['name']} failed"}
+        failed = sum(1 for scenario in scenarios if scenario.get("result", {}).get("status") == "failed")
+        status = "success" if not failed else "failed" if failed == len(scenarios) else "partial"
+        return {"status": status, "csv_path": csv_path, "scenarios": scenarios}
+
+    @property
+    def nbytes(self) -> int:
+        """Memory the session keeps resident: band stack, current layer and basin mask."""
+        layer_bytes = self.layer.nbytes if self.layer is not None else 0
+        return self.band_stack.nbytes + layer_bytes + self.outside_basin.nbytes
+
+    def current_weights(self) -> Dict[str, float]:
+        if self.weights is None:
+            return {}
+        return {name: float(weight) for name, weight in zip(self.file_names, self.weights)}
+
+    def publish(self) -> dict:
+        if self.layer is None:
+            raise ValueError("This overlay was built for scenarios only and has no current layer")
+        if self.store_name is None:
+            # Minted once; later publishes of this session replace the layer in the same stores
+            self.store_name = geo.new_store_name(self.config.raster_workspace, self.config.raster_store)
+            self.classified_store = geo.new_store_name(self.config.raster_workspace, self.config.classified_store)
+        output_name = f"stp_priority_{uuid.uuid4().hex}_map.tif"
+        return STPPriorityMapper(self.config).publish_priority_array(
+            self.layer[np.newaxis], self.profile, output_name, clip=self.clip, place=self.place,
+            class_scheme=self.class_scheme, store_name=self.store_name, classified_store=self.classified_store,
+            env_style=True
+        )
+
+
+class OverlaySessionStore:
+    """Process-wide registry of overlay engines with LRU eviction, an idle TTL and a byte budget."""
+
+    def __init__(self, config: GeoConfig = None):
+        config = config or GeoConfig()
+        self.ttl = config.overlay_session_ttl
+        self.max_sessions = config.overlay_max_sessions
+        self.budget_bytes = config.overlay_session_budget_bytes
+        self._sessions: "OrderedDict[str, OverlayEngine]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for session_id in [k for k, v in self._sessions.items() if now - v.last_used > self.ttl]:
+            del self._sessions[session_id]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        while len(self._sessions) > 1 and sum(e.nbytes for e in self._sessions.values()) > self.budget_bytes:
+            self._sessions.popitem(last=False)
+
+    def create(self, engine: OverlayEngine) -> str:
+        if engine.nbytes > self.budget_bytes:
+            raise OverlayBudgetError(
+                f"Session needs {engine.nbytes} bytes, more than the {self.budget_bytes} byte session budget"
+            )
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._sessions[session_id] = engine
+            self._evict()
+        return session_id
+
+    def get(self, session_id: str) -> OverlayEngine:
+        with self._lock:
+            self._evict()
+            engine = self._sessions.get(session_id)
+            if engine is None:
+                raise KeyError(session_id)
+            self._sessions.move_to_end(session_id)
+            return engine
+
+    def drop(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+
+overlay_sessions = OverlaySessionStore()
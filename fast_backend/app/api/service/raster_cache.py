@@ -0,0 +1,127 @@
+import os
+import json
+import uuid
+import hashlib
+from pathlib import Path
+from typing import Optional, Tuple
+import numpy as np
+from app.api.service.network.network_conf import GeoConfig
+
+
+class AlignedRasterCache:
+    """Content addressed store of aligned, normalized float32 bands.
+
+    Each entry is keyed by the source path, its mtime, the target CRS,
+    resolution and the common extent of the request, and is saved as a
+    ``.npy`` file so repeat requests can memory map it instead of reprojecting.
+    The band's min/max on the aligned grid is kept in a ``.json`` sidecar so
+    the streaming normalizer can skip its statistics pass.
+
+    Every extent gives new entries, so the directory is kept under
+    ``aligned_cache_max_bytes`` and ``aligned_cache_max_entries``: a hit
+    touches the band's mtime and ``store`` evicts the least recently used.
+    """
+
+    def __init__(self, config: GeoConfig):
+        self.cache_dir = Path(config.aligned_cache_path)
+        self.max_bytes = config.aligned_cache_max_bytes
+        self.max_entries = config.aligned_cache_max_entries
+        self.target_crs = str(config.target_crs)
+        self.target_resolution = tuple(config.target_resolution)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _source_prefix(self, path: str) -> str:
+        source_hash = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:16]
+        return f"{source_hash}_{os.stat(path).st_mtime_ns}"
+
+    def key(self, path: str, extent: Tuple[float, float, float, float, int, int]) -> str:
+        minx, miny, maxx, maxy, width, height = extent
+        payload = json.dumps({
+            "path": os.path.abspath(path),
+            "mtime": os.stat(path).st_mtime_ns,
+            "crs": self.target_crs,
+            "resolution": list(self.target_resolution),
+            "extent": [round(float(v), 6) for v in (minx, miny, maxx, maxy)],
+            "shape": [int(height), int(width)],
+        }, sort_keys=True)
+        digest = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+        return f"{self._source_prefix(path)}_{digest}"
+
+    def _band_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.npy"
+
+    def _stats_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def load(self, key: str) -> Optional[np.ndarray]:
+        band_path = self._band_path(key)
+        if not band_path.exists():
+            return None
+        try:
+            band = np.load(band_path, mmap_mode="r")
+            # mtime doubles as the LRU clock; atime is unreliable on relatime/noatime mounts
+            os.utime(band_path)
+            return band
+        except (ValueError, OSError) as e:
+            print(f"Discarding unreadable cache entry {band_path.name}: {e}")
+            band_path.unlink(missing_ok=True)
+            return None
+
+    def _prune_stale(self, key: str) -> None:
+        # Entries of the same source with an older mtime can never be hit again
+        source_hash, mtime, _ = key.split("_", 2)
+        for entry in self.cache_dir.glob(f"{source_hash}_*"):
+            if entry.suffix in (".npy", ".json") and entry.stem.split("_", 2)[1] != mtime:
+                entry.unlink(missing_ok=True)
+
+    def _evict(self, keep: str) -> None:
+        entries = []
+        for band_path in self.cache_dir.glob("*.npy"):
+            try:
+                stat = band_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, band_path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        count = len(entries)
+        for _, size, band_path in entries:
+            if total <= self.max_bytes and count <= self.max_entries:
+                break
+            if band_path.stem == keep:
+                continue
+            # Readers that already memory mapped the band keep their mapping after the unlink
+            band_path.unlink(missing_ok=True)
+            self._stats_path(band_path.stem).unlink(missing_ok=True)
+            total -= size
+            count -= 1
+
+    def store(self, key: str, array: np.ndarray) -> np.ndarray:
+        self._prune_stale(key)
+        band_path = self._band_path(key)
+        tmp_path = self.cache_dir / f".{key}_{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(array, dtype=np.float32))
+        os.replace(tmp_path, band_path)
+        self._evict(keep=key)
+        return np.load(band_path, mmap_mode="r")
+
+    def load_stats(self, key: str) -> Optional[Tuple[float, float]]:
+        stats_path = self._stats_path(key)
+        if not stats_path.exists():
+            return None
+        try:
+            with open(stats_path, "r", encoding="utf-8") as f:
+                stats = json.load(f)
+            return float(stats["min"]), float(stats["max"])
+        except (ValueError, KeyError, OSError) as e:
+            print(f"Discarding unreadable stats entry {stats_path.name}: {e}")
+            stats_path.unlink(missing_ok=True)
+            return None
+
+    def store_stats(self, key: str, stats: Tuple[float, float]) -> None:
+        self._prune_stale(key)
+        tmp_path = self.cache_dir / f".{key}_{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"min": float(stats[0]), "max": float(stats[1])}, f)
+        os.replace(tmp_path, self._stats_path(key))
@@ -0,0 +1,152 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Union
+import numpy as np
+import rasterio
+
+class_schemes = ("equal", "quantile", "jenks")
+
+
+class RasterHistogram:
+    """Fixed-bin histogram of a band's valid pixels, with exact min, max and count.
+
+    One read of the band is enough for every class scheme: equal interval
+    from min/max, quantiles from the cumulative counts and natural breaks
+    (Fisher-Jenks) over the bin centres weighted by their counts. Quantile
+    and Jenks breaks are therefore exact to one bin width.
+    """
+
+    def __init__(self, counts: np.ndarray, edges: np.ndarray, min_val: float, max_val: float):
+        self.counts = counts
+        self.edges = edges
+        self.min = min_val
+        self.max = max_val
+        self.count = int(counts.sum())
+
+    @classmethod
+    def from_array(cls, data: np.ma.MaskedArray, bins: int = 1024) -> "RasterHistogram":
+        valid = np.ma.asarray(data).compressed()
+        valid = valid[np.isfinite(valid)]
+        if valid.size == 0:
+            raise ValueError("Raster contains no valid data")
+        min_val, max_val = float(valid.min()), float(valid.max())
+        if min_val == max_val:
+            return cls(np.array([valid.size]), np.array([min_val, max_val]), min_val, max_val)
+        counts, edges = np.histogram(valid, bins=bins, range=(min_val, max_val))
+        return cls(counts, edges, min_val, max_val)
+
+    def breaks(self, scheme: str = "equal", num_classes: int = 5, min_upper: float = None) -> List[float]:
+        """``num_classes + 1`` class edges from min to max.
+
+        ``min_upper`` raises the top of the equal-interval range to at least that value;
+        quantile and Jenks edges always follow the data. A flat band gives equal edges.
+        """
+        if scheme not in class_schemes:
+            raise ValueError(f"Unknown class scheme '{scheme}', expected one of {', '.join(class_schemes)}")
+        upper = max(self.max, min_upper) if scheme == "equal" and min_upper is not None else self.max
+        if self.min == upper:
+            return [self.min] * (num_classes + 1)
+        if scheme == "equal":
+            return [float(v) for v in np.linspace(self.min, upper, num_classes + 1)]
+        if scheme == "quantile":
+            edges = self._quantile_breaks(num_classes)
+        else:
+            edges = self._jenks_breaks(num_classes)
+        edges[0], edges[-1] = self.min, self.max
+        return [float(v) for v in edges]
+
+    def _quantile_breaks(self, num_classes: int) -> np.ndarray:
+        cumulative = np.cumsum(self.counts)
+        targets = np.linspace(0, self.count, num_classes + 1)[1:-1]
+        # First bin reaching each target, with its pixels taken as uniform across the bin
+        index = np.searchsorted(cumulative, targets, side="left")
+        fraction = (targets - (cumulative[index] - self.counts[index])) / self.counts[index]
+        inner = self.edges[index] + fraction * (self.edges[index + 1] - self.edges[index])
+        return np.concatenate([[self.min], inner, [self.max]])
+
+    def _jenks_breaks(self, num_classes: int) -> np.ndarray:
+        nonzero = np.flatnonzero(self.counts)
+        if nonzero.size <= num_classes:
+            # Fewer occupied bins than classes: every occupied bin starts a class
+            starts = list(self.edges[nonzero[1:]])
+            starts += [self.max] * (num_classes - 1 - len(starts))
+            return np.array([self.min] + starts + [self.max])
+        weights = self.counts[nonzero].astype(np.float64)
+        centers = ((self.edges[:-1] + self.edges[1:]) / 2)[nonzero]
+        # Centred so the sums of squares below do not cancel catastrophically
+        centers = centers - np.average(centers, weights=weights)
+        n = weights.size
+        # Prefix sums give the within-class sum of squares of any bin run in O(1)
+        w = np.concatenate([[0], np.cumsum(weights)])
+        wx = np.concatenate([[0], np.cumsum(weights * centers)])
+        wxx = np.concatenate([[0], np.cumsum(weights * centers ** 2)])
+        i = np.arange(n)[:, None]
+        j = np.arange(n)[None, :]
+        run_w = w[j + 1] - w[i]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cost = wxx[j + 1] - wxx[i] - (wx[j + 1] - wx[i]) ** 2 / run_w
+        cost = np.where(j >= i, np.nan_to_num(cost), np.inf)
+
+        # best[k, j]: least total cost of bins 0..j in k+1 classes; start[k, j]: first bin of the last class
+        best = np.empty((num_classes, n))
+        start = np.zeros((num_classes, n), dtype=np.int64)
+        best[0] = cost[0]
+        for k in range(1, num_classes):
+            candidates = np.full((n, n), np.inf)
+            candidates[1:] = best[k - 1][:-1, None] + cost[1:]
+            start[k] = np.argmin(candidates, axis=0)
+            best[k] = candidates[start[k], np.arange(n)]
+
+        edges = [self.max]
+        last = n - 1
+        for k in range(num_classes - 1, 0, -1):
+            first = start[k, last]
+            edges.append(self.edges[nonzero[first]])
+            last = first - 1
+        edges.append(self.min)
+        return np.array(edges[::-1])
+
+
+class HistogramCache:
+    """Process-wide LRU of histograms for raster files, keyed by path, mtime and size."""
+
+    def __init__(self, max_entries: int = 64, bins: int = 1024):
+        self.max_entries = max_entries
+        self.bins = bins
+        self._entries: "OrderedDict[tuple, RasterHistogram]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, path: str) -> tuple:
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+    def get(self, path: str, data: np.ma.MaskedArray = None) -> RasterHistogram:
+        """Histogram of band 1 of ``path``; ``data`` is that band when the caller already read it."""
+        key = self._key(path)
+        with self._lock:
+            histogram = self._entries.get(key)
+            if histogram is not None:
+                self._entries.move_to_end(key)
+                return histogram
+        if data is None:
+            with rasterio.open(path) as src:
+                data = src.read(1, masked=True)
+        histogram = RasterHistogram.from_array(data, self.bins)
+        with self._lock:
+            self._entries[key] = histogram
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return histogram
+
+
+histogram_cache = HistogramCache()
+
+
+def raster_histogram(raster: Union[str, np.ma.MaskedArray, RasterHistogram]) -> RasterHistogram:
+    """Histogram of a raster path (cached), an already read masked band, or a histogram as is."""
+    if isinstance(raster, RasterHistogram):
+        return raster
+    if isinstance(raster, np.ndarray):
+        return RasterHistogram.from_array(raster, histogram_cache.bins)
+    return histogram_cache.get(str(raster))
@@ -0,0 +1,81 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Iterable, Iterator, List
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.vrt import WarpedVRT
+from rasterio.windows import Window
+
+
+class WarpedSources:
+    """Per-thread WarpedVRT handles of a set of rasters on a common grid.
+
+    GDAL dataset handles must not be shared between threads, so every worker
+    lazily opens its own set and ``close`` releases all of them at the end.
+    """
+
+    def __init__(self, paths: List[str], crs, transform, width: int, height: int,
+                 resampling: Resampling = Resampling.bilinear):
+        self.paths = list(paths)
+        self.vrt_options = {
+            "crs": crs,
+            "transform": transform,
+            "width": width,
+            "height": height,
+            "resampling": resampling,
+        }
+        self._local = threading.local()
+        self._opened = []
+        self._lock = threading.Lock()
+
+    def get(self) -> List[WarpedVRT]:
+        vrts = getattr(self._local, "vrts", None)
+        if vrts is None:
+            vrts = []
+            for path in self.paths:
+                src = rasterio.open(path)
+                vrt = WarpedVRT(src, **self.vrt_options)
+                with self._lock:
+                    self._opened.extend([vrt, src])
+                vrts.append(vrt)
+            self._local.vrts = vrts
+        return vrts
+
+    def close(self) -> None:
+        with self._lock:
+            for handle in self._opened:
+                handle.close()
+            self._opened = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def block_windows(width: int, height: int, tile_size: int) -> Iterator[Window]:
+    for row_off in range(0, height, tile_size):
+        for col_off in range(0, width, tile_size):
+            yield Window(col_off, row_off, min(tile_size, width - col_off), min(tile_size, height - row_off))
+
+
+def map_windows(worker: Callable, windows: Iterable[Window], max_workers: int) -> Iterator:
+    """Run ``worker`` over windows on a bounded pool and yield results as they finish.
+
+    At most ``2 * max_workers`` tiles are in flight, which keeps peak memory
+    at O(tile x bands) no matter how large the grid is.
+    """
+    max_workers = max(1, int(max_workers))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for window in windows:
+            pending.add(executor.submit(worker, window))
+            if len(pending) >= 2 * max_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
@@ -1,6 +1,5 @@
-import requests
-from requests.auth import HTTPBasicAuth
 from app.conf.settings import Settings
+from app.api.service.network.geoserver_client import get_geoserver_session, UploadStream
 import os
 
 
@@ -10,6 +9,7 @@ geoserver_url = setting.GEOSERVER_URL
 username = setting.GEOSERVER_USERNAME
 password = setting.GEOSERVER_PASSWORD  
 geoserver_extenal_url=setting.GEOSERVER_EX_URL
+session = get_geoserver_session()
 # wcs_url=f"{geoserver_extenal_url}+/wcs"
 # input_path=f"{settings.BASE_DIR}"+"/temp/input"
 # output_path=f"{settings.BASE_DIR}"+"/temp/output"
@@ -17,10 +17,7 @@ geoserver_extenal_url=setting.GEOSERVER_EX_URL
 def create_workspace(workspace_name):
     try:
         check_url = f"{geoserver_url}/rest/workspaces/{workspace_name}"
-        check_response = requests.get(
-            check_url,
-            auth=HTTPBasicAuth(username, password)
-        )
+        check_response = session.get(check_url)
         if check_response.status_code == 200:
             print(f"Workspace '{workspace_name}' already exists")
             return True
@@ -29,9 +26,8 @@ def create_workspace(workspace_name):
         headers = {"Content-type": "application/json"}
         data = {"workspace": {"name": workspace_name}}
 
-        response = requests.post(
+        response = session.post(
             workspace_url,
-            auth=HTTPBasicAuth(username, password),
             json=data,
             headers=headers
         )
@@ -47,9 +43,8 @@ def create_workspace(workspace_name):
                 }
             }
                 
-            wfs_response = requests.put(
+            wfs_response = session.put(
                 wfs_url,
-                auth=HTTPBasicAuth(username, password),
                 json=wfs_data,
                 headers=headers
             )
@@ -70,9 +65,8 @@ def create_workspace(workspace_name):
                 }
             }
                 
-            wms_response = requests.put(
+            wms_response = session.put(
                 wms_url,
-                auth=HTTPBasicAuth(username, password),
                 json=wms_data,
                 headers=headers
             )
@@ -94,10 +88,7 @@ def create_workspace(workspace_name):
 def create_vector_stores(workspace_name, store_name):
     check_url = f"{geoserver_url}/rest/workspaces/{workspace_name}/datastores/{store_name}"
     
-    check_response = requests.get(
-        check_url,
-        auth=HTTPBasicAuth(username, password)
-    )
+    check_response = session.get(check_url)
     
     if check_response.status_code == 200:
         print(f"Store '{store_name}' already exists in workspace '{workspace_name}'")
@@ -120,9 +111,8 @@ def create_shapefile_store(workspace_name, store_name, geoserver_url):
         }
     }
     
-    response = requests.post(
+    response = session.post(
         store_url,
-        auth=HTTPBasicAuth(username, password),
         json=data,
         headers=headers
     )
@@ -140,20 +130,14 @@ def upload_shapefile(workspace_name, store_name, shapefile_path, layer_name):
     try:
         # Check if store exists
         check_url = f"{geoserver_url}/rest/workspaces/{workspace_name}/datastores/{store_name}"    
-        check_response = requests.get(
-            check_url,
-            auth=HTTPBasicAuth(username, password)
-        )
+        check_response = session.get(check_url)
         if check_response.status_code != 200:
             print(f"Store '{store_name}' does not exist in workspace '{workspace_name}'")
             return False
         
         
         delete_url = f"{geoserver_url}/rest/workspaces/{workspace_name}/datastores/{store_name}/featuretypes/{layer_name}?recurse=true"
-        delete_response = requests.delete(
-            delete_url,
-            auth=HTTPBasicAuth(username, password)
-        )
+        delete_response = session.delete(delete_url)
         if delete_response.status_code == 200:
             print(f"Existing layer '{layer_name}' deleted for overwrite")
 
@@ -163,14 +147,12 @@ def upload_shapefile(workspace_name, store_name, shapefile_path, layer_name):
             upload_url += f"&name={layer_name}"
         headers = {"Content-type": "application/zip"}
         print("uploading shapefile",upload_url)
-        with open(shapefile_path, 'rb') as f:
-            data = f.read() 
-        response = requests.put(
-            upload_url,
-            auth=HTTPBasicAuth(username, password),
-            data=data,
-            headers=headers
-        )
+        with UploadStream(shapefile_path) as data:
+            response = session.put(
+                upload_url,
+                data=data,
+                headers=headers
+            )
         
         if response.status_code in (200, 201):
             print(f"Shapefile uploaded and published as layer '{layer_name}'")
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Session
-from app.database.crud.stp_crud import Stp_State_crud,Stp_District_crud,Stp_SubDistrict_crud,STP_priority_crud,STP_sutability_crud,STP_visualization_crud,Stp_River_crud,Stp_stretches_crud,Stp_drain_crud,Stp_catchment_crud,Stp_towns_crud,STP_sutability_visualization_crud
+from app.database.crud.stp_crud import Stp_State_crud,Stp_District_crud,Stp_SubDistrict_crud,STP_priority_crud,STP_sutability_crud,STP_visualization_crud,Stp_River_crud,Stp_stretches_crud,Stp_drain_crud,Stp_catchment_crud,Stp_towns_crud,STP_sutability_visualization_crud,Stp_catchment_village_crud
 from app.conf.settings import Settings
 from app.api.service.stp_operation import STPPriorityMapper
 from app.api.schema.stp_schema import STPCategory
@@ -34,6 +34,21 @@ class Stp_service:
     
     def get_drain(db:Session,stretch_id:list=None):
         return Stp_drain_crud(db).get_drains(stretch_id)
+
+    def get_catchment_villages(db:Session,drain_nos:list=None):
+        # Per-drain shares plus their sums; the sums count a village part lying in several
+        # selected catchments once per catchment, so they are not the area covered
+        villages={}
+        for row in Stp_catchment_village_crud(db).get_villages(drain_nos or []):
+            village=villages.setdefault(row.village_id,{
+                "id":row.village_id,"village_name":row.village_name,
+                "area_sum":0.0,"area_fraction_sum":0.0,"drain_nos":[],"drains":[]
+            })
+            village["area_sum"]+=row.intersect_area
+            village["area_fraction_sum"]+=row.area_fraction
+            village["drain_nos"].append(row.Drain_No)
+            village["drains"].append({"Drain_No":row.Drain_No,"area":row.intersect_area,"area_fraction":row.area_fraction})
+        return list(villages.values())
     
 
 
@@ -6,14 +6,24 @@ import rasterio
 from rasterio.enums import Resampling
 from rasterio.warp import  reproject
 from rasterio.transform import from_origin
-from rasterio.mask import mask
+from rasterio.mask import mask, raster_geometry_mask
+from rasterio.io import MemoryFile
+from rasterio.shutil import copy as rio_copy
+from rasterio.features import geometry_mask
+from rasterio.windows import Window, from_bounds, transform as window_transform
 from shapely.geometry import mapping
 from tqdm import tqdm
-from app.api.service.geoserver import Geoserver
+from app.api.service.geoserver import Geoserver, AsyncGeoserver
 from xml.dom import minidom
 from xml.etree import ElementTree as ET
 from app.api.service.network.network_conf import GeoConfig
 import uuid
+import re
+import json
+import hashlib
+import threading
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from app.database.config.dependency import db_dependency
 from pathlib import Path
 from app.api.service import spt_service
@@ -26,10 +36,16 @@ import rasterio
 import geopandas as gpd
 import numpy as np
 import pandas as pd
-from rasterstats import zonal_stats
 from rasterio.enums import Resampling
 
 from app.api.service.script_svc.geoserver_svc import upload_shapefile
+from app.api.service.raster_cache import AlignedRasterCache
+from app.api.service.raster_tiles import WarpedSources, block_windows, map_windows
+from app.api.service.zone_index import get_zone_index
+from app.api.service.layer_registry import layer_registry
+from app.api.service.catchment_index import get_catchment_index
+from app.api.service.artifact_reaper import artifact_reaper
+from app.api.service.raster_stats import RasterHistogram, histogram_cache, raster_histogram
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 subdistrict_path = os.path.join(BASE_DIR, 'media', 'Rajat_data', 'shape_stp', 'subdistrict', 'STP_subdistrict.shp')
@@ -37,6 +53,164 @@ villages_path = os.path.join(BASE_DIR, 'media', 'Rajat_data', 'shape_stp', 'vill
 
 
 geo=Geoserver()
+async_geo=AsyncGeoserver(geo)
+
+
+def raster_artifacts(workspace: str, store: str, sld_name: str = None) -> List[dict]:
+    """Registry entries for a raster published with publish_raster and styled with sld_name.
+
+    Shared env styles are registered once and never expire, so they pass no sld_name.
+    """
+    artifacts = [{"kind": "coverage_store", "workspace": workspace, "name": store}]
+    if sld_name:
+        artifacts.append({"kind": "style", "workspace": workspace, "name": sld_name})
+    return artifacts
+
+
+def prepare_style(config: GeoConfig, raster, reverse: bool, class_scheme: str = "equal",
+                  env_style: bool = None) -> dict:
+    """Style for ``raster`` (a path or masked band) in the configured output mode.
+
+    Continuous output gets an SLD file or the shared env style (``sld_path``,
+    ``sld_name``); classified output gets the same breaks and colours as
+    ``class_breaks``/``class_colors``. "both" carries both sets of keys.
+    Breaks come from one histogram of ``raster`` in ``class_scheme``, and
+    ``breaks`` always holds them so village statistics use the same classes.
+    ``env_style`` overrides ``config.use_env_styles``.
+    """
+    raster_process = RasterProcess(config)
+    histogram = raster_histogram(raster)
+    class_breaks, class_colors = raster_process.class_table(histogram, reverse=reverse, class_scheme=class_scheme)
+    style = {"breaks": class_breaks}
+    if config.stp_output_mode != "classified":
+        if config.use_env_styles if env_style is None else env_style:
+            style.update(raster_process.env_style(histogram, reverse=reverse, class_scheme=class_scheme))
+        else:
+            sld_path, sld_name = raster_process.processRaster(histogram, reverse=reverse, class_scheme=class_scheme)
+            style.update(sld_path=sld_path, sld_name=sld_name)
+    if config.stp_output_mode != "continuous":
+        style.update(class_breaks=class_breaks, class_colors=class_colors)
+    return style
+
+
+def publish_classified(config: GeoConfig, processor: "STPProcessor", image: np.ndarray, meta: dict,
+                       output_name: str, style: dict, store_name: str = None):
+    """Publish the uint8 class map of ``image``; its colour table replaces an SLD."""
+    store_name = store_name or config.classified_store
+    class_image, class_meta, colormap = processor.classify(image, meta, style["class_breaks"], style["class_colors"])
+    class_path = processor.write_raster(class_image, class_meta, f"{os.path.splitext(output_name)[0]}_classes.tif",
+                                        colormap=colormap)
+    published = False
+    # Recorded first: the row lock keeps the reaper off a reused store while it is republished
+    artifact_reaper.record(raster_artifacts(config.raster_workspace, store_name))
+    try:
+        published = geo.publish_raster(workspace_name=config.raster_workspace, store_name=store_name,
+                                       raster_path=class_path)
+    finally:
+        if published:
+            geo.discard_local(class_path)
+        elif os.path.exists(class_path):
+            # Nothing references a COG that was never published
+            os.remove(class_path)
+    if not published:
+        print(f"Failed to publish classified raster {class_path}")
+        return False
+    breaks = style["class_breaks"]
+    return {
+        "status": "success",
+        "workspace": config.raster_workspace,
+        "store": store_name,
+        "layer_name": published[1],
+        "type": "raster",
+        "classes": [
+            {
+                "value": value,
+                "label": RasterProcess.level_class[value - 1].strip() if value <= len(RasterProcess.level_class) else f"class_{value}",
+                "color": color,
+                "min": breaks[value - 1] if value - 1 < len(breaks) else None,
+                "max": breaks[value] if value < len(breaks) else None,
+            }
+            for value, color in enumerate(style["class_colors"], start=1)
+        ],
+    }
+
+
+def publish_stp_raster(config: GeoConfig, processor: "STPProcessor", style: dict, final_path: str = None,
+                       image: np.ndarray = None, meta: dict = None, output_name: str = None,
+                       temp_paths: List[str] = None, store_name: str = None, classified_store: str = None):
+    """Publish a finished STP raster in the configured output mode(s) and clean up.
+
+    Pass ``final_path`` for a product already on disk, or ``image``/``meta``
+    and ``output_name`` for one still in memory. The layers replace whatever
+    ``store_name``/``classified_store`` held (by default the shared stores of
+    ``config``). Returns the API result or False.
+    """
+    output_name = output_name or os.path.basename(final_path)
+    store_name = store_name or config.raster_store
+    classified_store = classified_store or config.classified_store
+    # An env style is selected on GetMap, so nothing is uploaded or applied per layer
+    env_style = "wms_params" in style
+    classified = None
+    if "class_colors" in style:
+        if image is None:
+            image, meta = processor.read_raster(final_path)
+        classified = publish_classified(config, processor, image, meta, output_name, style, classified_store)
+    if "sld_name" not in style:
+        # Classified only: the float product was just the input
+        for path in (temp_paths or []) + ([final_path] if final_path else []):
+            os.remove(path)
+        return classified
+    if final_path is None:
+        final_path = processor.write_raster(image, meta, output_name)
+
+    published = False
+    status = False
+    # Recorded before publishing so a reaper pass cannot delete the reused store or style
+    # in between; a row for something that never got published is reaped as a 404
+    artifact_reaper.record(raster_artifacts(config.raster_workspace, store_name,
+                                            None if env_style else style["sld_name"]))
+    try:
+        published = geo.publish_raster(workspace_name=config.raster_workspace, store_name=store_name, raster_path=final_path)
+        if not published:
+            print(f"Failed to publish raster {final_path}")
+            return False
+        layer_name = published[1]
+        if env_style:
+            # The shared style is selected on GetMap, so the layer itself is left untouched
+            status=geo.ensure_style(config.raster_workspace, style["sld_path"], style["sld_name"])
+        else:
+            status=geo.apply_sld_to_layer(workspace_name=config.raster_workspace, layer_name = layer_name,sld_content=style["sld_path"], sld_name=style["sld_name"], reuse_style=True)
+        if not status:
+            return False
+    finally:
+        if published:
+            geo.discard_local(final_path)
+        elif os.path.exists(final_path):
+            os.remove(final_path)
+        for path in temp_paths or []:
+            if os.path.exists(path):
+                os.remove(path)
+    result = {
+        "status": "success",
+        "workspace": config.raster_workspace,
+        "store": store_name,
+        "layer_name": layer_name,
+        "type": "raster"
+    }
+    if env_style:
+        result.update(breaks=style["breaks"], wms_params=style["wms_params"])
+    if "class_colors" in style:
+        # "both": the continuous layer is usable on its own, but say when the classified one is missing
+        result["classified"] = classified or {"status": "failed", "store": classified_store,
+                                              "error": "Publishing the classified raster failed"}
+    return result
+
+
+def fixed_style_name(sld_path: str) -> str:
+    """Style name for a static SLD file, derived from its content so every publish reuses one style."""
+    with open(sld_path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:16]
+    return f"{os.path.basename(sld_path).split('.')[0]}_{digest}"
 class STPProcessor:
     
     def __init__(self, config: GeoConfig):
@@ -44,6 +218,7 @@ class STPProcessor:
         self.config = config
         self.aligned_arrays = []
         self.reference_profile = None
+        self.cache = AlignedRasterCache(config) if config.use_aligned_cache else None
     
     def _calculate_common_extent(self, raster_paths: List[str]) -> Tuple[float, float, float, float, int, int]:
         
@@ -68,55 +243,86 @@ class STPProcessor:
         
         return minx, miny, maxx, maxy, width, height
     
-    def _normalize_array(self, array: np.ndarray) -> np.ndarray:
-        
-        # Replace negative values with 0
-        array[array < 0] = 0
-        
-        # Get min and max values
-        min_val = np.nanmin(array)
-        max_val = np.nanmax(array)
-        
+    def _clamped_min_max(self, array: np.ndarray) -> Tuple[float, float]:
+        # min/max after negatives are replaced with 0, without touching the array
+        return max(float(np.nanmin(array)), 0.0), max(float(np.nanmax(array)), 0.0)
+
+    def _normalize_array(self, array: np.ndarray, stats: Tuple[float, float] = None) -> np.ndarray:
+        """Normalize to 0-1 in place; ``stats`` are the band's global (min, max) when
+        ``array`` is only one block of it."""
+        min_val, max_val = stats if stats is not None else self._clamped_min_max(array)
+
+        # Replace negative values with 0 (NaN is kept)
+        np.maximum(array, 0, out=array)
+
         # Normalize
-        norm_array = (array - min_val) / (max_val - min_val + 1e-6)
-        return norm_array
+        array -= min_val
+        array /= (max_val - min_val + 1e-6)
+        return array
     
+    def _reproject_band(self, src, transform, width: int, height: int) -> np.ndarray:
+        dst_array = np.zeros((height, width), dtype=np.float32)
+        reproject(
+            source=rasterio.band(src, 1),
+            destination=dst_array,
+            src_transform=src.transform,
+            src_crs=src.crs,
+            dst_transform=transform,
+            dst_crs=self.config.target_crs,
+            resampling=Resampling.bilinear
+        )
+        return dst_array
+
+    def _align_one(self, path: str, extent, transform) -> np.ndarray:
+        _, _, _, _, width, height = extent
+        with rasterio.open(path) as src:
+            if self.cache is None:
+                return self._normalize_array(self._reproject_band(src, transform, width, height))
+            cache_key = self.cache.key(path, extent)
+            norm_array = self.cache.load(cache_key)
+            if norm_array is None:
+                dst_array = self._reproject_band(src, transform, width, height)
+                stats = self.cache.load_stats(cache_key)
+                if stats is None:
+                    stats = self._clamped_min_max(dst_array)
+                    self.cache.store_stats(cache_key, stats)
+                norm_array = self.cache.store(cache_key, self._normalize_array(dst_array, stats))
+            return norm_array
+
     def align_rasters(self, raster_paths: List[str]) -> None:            
-        minx, _, maxx, maxy, width, height = self._calculate_common_extent(raster_paths)
+        extent = self._calculate_common_extent(raster_paths)
+        minx, _, maxx, maxy, width, height = extent
         transform = from_origin(minx, maxy, 
                                self.config.target_resolution[0], 
                                self.config.target_resolution[1])
         
-        # Process each raster
-        for path in tqdm(raster_paths, desc="Aligning rasters"):
-            with rasterio.open(path) as src:
-                dst_array = np.zeros((height, width), dtype=np.float32)
-                reproject(
-                    source=rasterio.band(src, 1),
-                    destination=dst_array,
-                    src_transform=src.transform,
-                    src_crs=src.crs,
-                    dst_transform=transform,
-                    dst_crs=self.config.target_crs,
-                    resampling=Resampling.bilinear
-                )
-                
-                # Normalize
-                norm_array = self._normalize_array(dst_array)
-                self.aligned_arrays.append(norm_array)
+        # Reproject in parallel; GDAL releases the GIL while warping, so threads
+        # write straight into this process's memory and nothing is pickled back.
+        # Slots are filled by index so the band order always matches raster_paths.
+        aligned = [None] * len(raster_paths)
+        workers = max(1, min(self.config.align_workers, len(raster_paths)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(self._align_one, path, extent, transform): i
+                for i, path in enumerate(raster_paths)
+            }
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Aligning rasters"):
+                aligned[futures[future]] = future.result()
+        self.aligned_arrays.extend(aligned)
                 
-                # Save reference profile from first raster
-                if self.reference_profile is None:
-                    self.reference_profile = src.meta.copy()
-                    self.reference_profile.update({
-                        "crs": self.config.target_crs,
-                        "transform": transform,
-                        "width": width,
-                        "height": height,
-                        "dtype": 'float32'
-                    })
+        # Save reference profile from first raster
+        if self.reference_profile is None:
+            with rasterio.open(raster_paths[0]) as src:
+                self.reference_profile = src.meta.copy()
+            self.reference_profile.update({
+                "crs": self.config.target_crs,
+                "transform": transform,
+                "width": width,
+                "height": height,
+                "dtype": 'float32'
+            })
         
-    def create_weighted_overlay(self, weights: List[float], output_name: str = "weighted_overlay.tif") -> str:
+    def weighted_sum(self, weights: List[float]) -> np.ndarray:
         
         if len(weights) != len(self.aligned_arrays):
             raise ValueError(f"Number of weights ({len(weights)}) must match number of rasters ({len(self.aligned_arrays)})")
@@ -130,40 +336,51 @@ class STPProcessor:
             weighted_sum += array * weights[i]
         
         # Replace NaN values with 0
-        weighted_sum = np.nan_to_num(weighted_sum)
-        
-        
+        return np.nan_to_num(weighted_sum)
+
+    def create_weighted_overlay(self, weights: List[float], output_name: str = "weighted_overlay.tif") -> str:
+        weighted_sum = self.weighted_sum(weights)
         output_path = os.path.join(self.config.output_path, output_name)
         with rasterio.open(output_path, 'w', **self.reference_profile) as dst:
             dst.write(weighted_sum, 1)
         
         return output_path, weighted_sum
     
+    def load_constraint_mask(self, constraint_paths: List[str]) -> np.ndarray:
+        height, width = self.reference_profile['height'], self.reference_profile['width']
+        combined_constraint_mask = np.ones((height, width), dtype=np.float32)
+
+        for path in constraint_paths:
+            constraint_aligned = np.zeros((height, width), dtype=np.float32)
+            with rasterio.open(path) as src:
+                reproject(
+                    source=rasterio.band(src, 1),
+                    destination=constraint_aligned,
+                    src_transform=src.transform,
+                    src_crs=src.crs,
+                    dst_transform=self.reference_profile['transform'],
+                    dst_crs=self.reference_profile['crs'],
+                    resampling=Resampling.nearest
+                )
+
+            # Generate binary mask (1 where constraint is met, 0 otherwise)
+            constraint_mask = np.where(constraint_aligned >= 1, 1, 0).astype("float32")
+
+            # Combine constraints (logical AND: multiply masks together)
+            combined_constraint_mask *= constraint_mask
+
+        return combined_constraint_mask
+
+    def constrain(self, weighted_sum: np.ndarray, constraint_paths: List[str]) -> np.ndarray:
+        if len(constraint_paths) == 0:
+            return weighted_sum
+        return self.load_constraint_mask(constraint_paths) * weighted_sum
+
     def apply_constraint(self, weighted_sum: np.ndarray, constraint_path: str = None, 
                         output_name: str = "constrained_overlay.tif") -> str:
        
         constraint_path = constraint_path or self.config.constraint_raster_path
-        
-        
-        # Initialize constraint array
-        constraint_aligned = np.zeros_like(weighted_sum, dtype=np.float32)
-        
-        with rasterio.open(constraint_path) as src:
-            reproject(
-                source=rasterio.band(src, 1),
-                destination=constraint_aligned,
-                src_transform=src.transform,
-                src_crs=src.crs,
-                dst_transform=self.reference_profile['transform'],
-                dst_crs=self.reference_profile['crs'],
-                resampling=Resampling.nearest
-            )
-        
-
-        constraint_mask = np.where(constraint_aligned >= 1, 1, 0).astype("float32")
-        
-        
-        final_priority = weighted_sum * constraint_mask
+        final_priority = self.constrain(weighted_sum, [constraint_path])
         
         # Save constrained overlay
         output_path = os.path.join(self.config.output_path, output_name)
@@ -177,32 +394,7 @@ class STPProcessor:
                         output_name: str = "constrained_overlay.tif") -> str:
        
        
-        if len(constraint_paths) == 0:
-            final_priority = weighted_sum
-        else:
-            combined_constraint_mask = np.ones_like(weighted_sum, dtype=np.float32)
-
-            for path in constraint_paths:
-                constraint_aligned = np.zeros_like(weighted_sum, dtype=np.float32)
-                with rasterio.open(path) as src:
-                    reproject(
-                        source=rasterio.band(src, 1),
-                        destination=constraint_aligned,
-                        src_transform=src.transform,
-                        src_crs=src.crs,
-                        dst_transform=self.reference_profile['transform'],
-                        dst_crs=self.reference_profile['crs'],
-                        resampling=Resampling.nearest
-                    )
-
-                # Generate binary mask (1 where constraint is met, 0 otherwise)
-                constraint_mask = np.where(constraint_aligned >= 1, 1, 0).astype("float32")
-
-                # Combine constraints (logical AND: multiply masks together)
-                combined_constraint_mask *= constraint_mask
-
-            print("apply constrtin")
-            final_priority = combined_constraint_mask*weighted_sum
+        final_priority = self.constrain(weighted_sum, constraint_paths)
 
         # Save constrained overlay
         output_path = os.path.join(self.config.output_path, output_name)
@@ -211,17 +403,104 @@ class STPProcessor:
 
         return output_path, final_priority
     
+    def _read_basin(self, shapefile_path: str) -> gpd.GeoDataFrame:
+        return layer_registry.get(shapefile_path, "EPSG:32644")
+
+    def basin_window(self, shapefile_path: str = None):
+        """Pixels outside the basin, plus the crop transform/window, on the aligned grid."""
+        basin = self._read_basin(shapefile_path or self.config.basin_shapefile)
+        with MemoryFile() as memfile:
+            with memfile.open(**self.reference_profile) as dataset:
+                outside_basin, out_transform, window = raster_geometry_mask(
+                    dataset, basin.geometry, crop=True
+                )
+        return outside_basin, out_transform, window
+
+    def clip_array_to_basin(self, array: np.ndarray, shapefile_path: str = None) -> Tuple[np.ndarray, dict]:
+        """In-memory clip_to_basin for a band on the aligned grid; returns (image, meta)."""
+        outside_basin, out_transform, window = self.basin_window(shapefile_path)
+        rows, cols = window.toslices()
+        out_image = array[rows, cols][np.newaxis].copy()
+        out_meta = self.reference_profile.copy()
+        # Same fill as rasterio.mask: source nodata, or 0 when unset
+        out_image[0][outside_basin] = out_meta["nodata"] if out_meta.get("nodata") is not None else 0
+        out_meta.update({
+            "height": out_image.shape[1],
+            "width": out_image.shape[2],
+            "transform": out_transform
+        })
+        return out_image, out_meta
+
+    def as_masked(self, image: np.ndarray, meta: dict) -> np.ma.MaskedArray:
+        """First band of ``image`` masked like ``src.read(1, masked=True)`` would be."""
+        nodata = meta.get("nodata")
+        if nodata is None:
+            return np.ma.masked_array(image[0], mask=np.zeros(image[0].shape, dtype=bool))
+        invalid = np.isnan(image[0]) if np.isnan(nodata) else image[0] == nodata
+        return np.ma.masked_array(image[0], mask=invalid)
+
+    def read_raster(self, raster_path: str) -> Tuple[np.ndarray, dict]:
+        with rasterio.open(raster_path) as src:
+            return src.read(), src.meta.copy()
+
+    def classify(self, image: np.ndarray, meta: dict, intervals: List[float],
+                 colors: List[str]) -> Tuple[np.ndarray, dict, dict]:
+        """Quantize band 1 into classes 1..n on the SLD breaks (0 = nodata), with a matching colour table."""
+        band = self.as_masked(image, meta)
+        if intervals[0] == intervals[-1]:
+            # A flat raster has no class edges; every valid pixel is the first class
+            classes = np.ones(band.shape, dtype=np.uint8)
+        else:
+            classes = (np.digitize(band.filled(intervals[0]), intervals[1:-1]) + 1).astype(np.uint8)
+        classes[np.ma.getmaskarray(band)] = 0
+        colormap = {0: (0, 0, 0, 0)}
+        for value, color in enumerate(colors, start=1):
+            colormap[value] = tuple(int(color[i:i + 2], 16) for i in (1, 3, 5)) + (255,)
+        out_meta = {**meta, "dtype": "uint8", "nodata": 0, "count": 1}
+        return classes[np.newaxis], out_meta, colormap
+
+    def write_raster(self, image: np.ndarray, meta: dict, output_name: str, colormap: dict = None) -> str:
+        """Write the finished product, the only raster file an in-memory request creates."""
+        output_path = os.path.join(self.config.publish_output_path, output_name)
+        self._write_published(image, meta, output_path, colormap)
+        return output_path
+
+    def _write_published(self, image: np.ndarray, meta: dict, output_path: str, colormap: dict = None) -> None:
+        """Write a raster GeoServer will serve, as a Cloud-Optimized GeoTIFF unless disabled.
+
+        The COG driver writes internal tiles, compresses them with a predictor
+        and builds overviews, so WMS requests only decode the tiles and
+        overview level they need.
+        """
+        profile = {**meta, "driver": "GTiff"}
+        if not self.config.publish_cog:
+            with rasterio.open(output_path, "w", **profile) as dest:
+                dest.write(image)
+                if colormap:
+                    dest.write_colormap(1, colormap)
+            return
+        # COG is a copy-only driver: stage the band in memory and let GDAL lay it out
+        with MemoryFile() as memfile:
+            with memfile.open(**profile) as staged:
+                staged.write(image)
+                if colormap:
+                    staged.write_colormap(1, colormap)
+                rio_copy(
+                    staged, output_path, driver="COG",
+                    compress=self.config.cog_compress,
+                    # Class values must not be predicted or averaged between classes
+                    predictor="NO" if colormap else "YES",
+                    blocksize=self.config.cog_blocksize,
+                    overviews="AUTO",
+                    resampling="NEAREST" if colormap else self.config.cog_overview_resampling,
+                    num_threads="ALL_CPUS",
+                )
+
     def clip_to_basin(self, raster_path: str, shapefile_path: str = None, 
                      output_name: str = "clipped_priority_map.tif") -> str:
         
-        basin = gpd.read_file(shapefile_path)
-        if basin.crs is None:
-            basin.set_crs("EPSG:32644", inplace=True) 
+        basin = self._read_basin(shapefile_path)
         print('raster path',raster_path)
-        try:
-            basin = basin.to_crs("EPSG:32644")
-        except Exception as e:
-            print(e)
 
         with rasterio.open(raster_path) as src:
             out_image, out_transform = mask(dataset=src, shapes=basin.geometry, crop=True)
@@ -242,41 +521,184 @@ class STPProcessor:
    
         return output_path
     
+    def use_tiled_mode(self, raster_paths: List[str]) -> bool:
+        mode = self.config.processing_mode
+        if mode != "auto":
+            return mode == "tiled"
+        _, _, _, _, width, height = self._calculate_common_extent(raster_paths)
+        # aligned bands + weighted sum + constraint mask, all float32
+        return width * height * 4 * (len(raster_paths) + 2) > self.config.in_memory_limit_bytes
+
+    def _band_min_max(self, raster_paths: List[str], extent, transform) -> List[Tuple[float, float]]:
+        """First pass of the streaming normalizer: global (min, max) of every band
+        on the aligned grid, read from the cache or collected from block stats."""
+        _, _, _, _, width, height = extent
+        keys = [self.cache.key(path, extent) if self.cache is not None else None for path in raster_paths]
+        band_stats = [self.cache.load_stats(key) if key else None for key in keys]
+        missing = [i for i, stats in enumerate(band_stats) if stats is None]
+        if not missing:
+            return band_stats
+
+        with WarpedSources([raster_paths[i] for i in missing], self.config.target_crs,
+                           transform, width, height) as sources:
+            def block_stats(window):
+                stats = []
+                for vrt in sources.get():
+                    block = vrt.read(1, window=window, out_dtype="float32")
+                    if np.isnan(block).all():
+                        stats.append((np.inf, -np.inf))
+                    else:
+                        stats.append((float(np.nanmin(block)), float(np.nanmax(block))))
+                return stats
+
+            band_min = [np.inf] * len(missing)
+            band_max = [-np.inf] * len(missing)
+            for stats in map_windows(block_stats, block_windows(width, height, self.config.tile_size),
+                                     self.config.tile_workers):
+                for i, (lo, hi) in enumerate(stats):
+                    band_min[i] = min(band_min[i], lo)
+                    band_max[i] = max(band_max[i], hi)
+
+        for i, lo, hi in zip(missing, band_min, band_max):
+            # same clamping as _clamped_min_max
+            band_stats[i] = (max(lo, 0.0), max(hi, 0.0))
+            if keys[i] is not None:
+                self.cache.store_stats(keys[i], band_stats[i])
+        return band_stats
+
+    def create_tiled_overlay(self, raster_paths: List[str], weights: List[float],
+                             constraint_paths: List[str] = None, shapefile_path: str = None,
+                             output_name: str = "tiled_priority_map.tif") -> str:
+        """Weighted overlay, constraint and basin clip computed one tile window at a time.
+
+        Produces the same product as align_rasters -> create_weighted_overlay ->
+        apply_constraint -> clip_to_basin, but never holds a full band in memory
+        and writes the result incrementally to a tiled GeoTIFF.
+        """
+        if len(weights) != len(raster_paths):
+            raise ValueError(f"Number of weights ({len(weights)}) must match number of rasters ({len(raster_paths)})")
+        extent = self._calculate_common_extent(raster_paths)
+        minx, _, _, maxy, width, height = extent
+        transform = from_origin(minx, maxy,
+                               self.config.target_resolution[0],
+                               self.config.target_resolution[1])
+        if constraint_paths is None:
+            constraint_paths = [self.config.constraint_raster_path]
+
+        basin = self._read_basin(shapefile_path or self.config.basin_shapefile)
+        basin_window = from_bounds(*basin.total_bounds, transform=transform)
+        col_off = max(int(np.floor(basin_window.col_off)), 0)
+        row_off = max(int(np.floor(basin_window.row_off)), 0)
+        out_width = min(int(np.ceil(basin_window.col_off + basin_window.width)), width) - col_off
+        out_height = min(int(np.ceil(basin_window.row_off + basin_window.height)), height) - row_off
+        out_transform = window_transform(Window(col_off, row_off, out_width, out_height), transform)
+
+        with rasterio.open(raster_paths[0]) as src:
+            profile = src.meta.copy()
+        tile_size = self.config.tile_size
+        profile.update({
+            "driver": "GTiff",
+            "count": 1,
+            "crs": self.config.target_crs,
+            "transform": out_transform,
+            "width": out_width,
+            "height": out_height,
+            "dtype": "float32",
+            "tiled": True,
+            "blockxsize": tile_size,
+            "blockysize": tile_size,
+        })
+        nodata = profile.get("nodata")
+        fill_value = nodata if nodata is not None else 0
+        weights = [float(w) for w in weights]
+
+        band_stats = self._band_min_max(raster_paths, extent, transform)
+        with WarpedSources(raster_paths, self.config.target_crs, transform, width, height) as sources, \
+                WarpedSources(constraint_paths, self.config.target_crs, transform, width, height,
+                              resampling=Resampling.nearest) as constraints:
+            def overlay_tile(window):
+                src_window = Window(window.col_off + col_off, window.row_off + row_off,
+                                    window.width, window.height)
+                weighted_sum = np.zeros((window.height, window.width), dtype=np.float32)
+                for vrt, weight, stats in zip(sources.get(), weights, band_stats):
+                    band = self._normalize_array(vrt.read(1, window=src_window, out_dtype="float32"), stats)
+                    band *= weight
+                    weighted_sum += band
+                np.nan_to_num(weighted_sum, copy=False)
+                for vrt in constraints.get():
+                    constraint_block = vrt.read(1, window=src_window, out_dtype="float32")
+                    weighted_sum[~(constraint_block >= 1)] = 0
+                outside_basin = geometry_mask(
+                    basin.geometry, out_shape=weighted_sum.shape,
+                    transform=window_transform(window, out_transform)
+                )
+                weighted_sum[outside_basin] = fill_value
+                return window, weighted_sum
+
+            output_path = os.path.join(self.config.output_path, output_name)
+            with rasterio.open(output_path, "w", **profile) as dst:
+                for window, block in map_windows(overlay_tile, block_windows(out_width, out_height, tile_size),
+                                                 self.config.tile_workers):
+                    dst.write(block, 1, window=window)
+
+        return output_path
+
+    def _user_window(self, crs, transform, width: int, height: int, clip: List[int], place: str):
+        """Bounding window of the selected villages/subdistricts and the in-selection pixel mask."""
+        zone_index = get_zone_index(self.config)
+        selected = zone_index.select(clip, place)
+        zones = zone_index.zones_for(crs, transform, width, height)
+        inside = np.isin(zones, selected)
+        rows = np.flatnonzero(inside.any(axis=1))
+        cols = np.flatnonzero(inside.any(axis=0))
+        if rows.size == 0:
+            raise ValueError("Input shapes do not overlap raster.")
+        window = Window(cols[0], rows[0], cols[-1] - cols[0] + 1, rows[-1] - rows[0] + 1)
+        return window, inside
+
+    def _fill_outside(self, out_image: np.ndarray, out_meta: dict, inside: np.ndarray, window: Window,
+                      out_transform) -> Tuple[np.ndarray, dict]:
+        row_slice, col_slice = window.toslices()
+        # Same fill as rasterio.mask: source nodata, or 0 when unset
+        out_image[:, ~inside[row_slice, col_slice]] = out_meta["nodata"] if out_meta.get("nodata") is not None else 0
+        out_meta.update({
+            "driver": "GTiff",
+            "height": out_image.shape[1],
+            "width": out_image.shape[2],
+            "transform": out_transform
+        })
+        return out_image, out_meta
+
+    def user_window(self, meta: dict, clip: List[int] = None, place: str = None) -> Tuple[Window, np.ndarray]:
+        """Window and in-selection mask clip_array_to_user uses for a raster on ``meta``'s grid."""
+        return self._user_window(meta["crs"], meta["transform"], meta["width"], meta["height"], clip, place)
+
+    def clip_array_to_user(self, image: np.ndarray, meta: dict, clip: List[int] = None,
+                           place: str = None) -> Tuple[np.ndarray, dict]:
+        """In-memory clip_to_user; ``image`` is left untouched."""
+        window, inside = self._user_window(meta["crs"], meta["transform"], meta["width"], meta["height"], clip, place)
+        rows, cols = window.toslices()
+        out_transform = window_transform(window, meta["transform"])
+        return self._fill_outside(image[:, rows, cols].copy(), meta.copy(), inside, window, out_transform)
+
     def clip_to_user(self, raster_path: str,clip:List[int]=None,place:str=None  ) -> str:
         try:
-            villages_path = os.path.join(self.config.base_dir, 'media', 'Rajat_data', 'shape_stp', 'villages', 'STP_Village.shp')
-            villages_vector = gpd.read_file(villages_path)
-            if villages_vector.crs is None:
-                villages_vector.set_crs("EPSG:32644", inplace=True) 
-            villages_vector=villages_vector.to_crs("EPSG:32644")
-            if place == "village":
-                villages_vector=villages_vector[villages_vector['ID'].isin(clip)]
-            else:
-                villages_vector=villages_vector[villages_vector['subdis_cod'].isin(clip)]
             with rasterio.open(raster_path) as src:
-                out_image, out_transform = mask(dataset=src, shapes=villages_vector.geometry, crop=True)
+                window, inside = self._user_window(src.crs, src.transform, src.width, src.height, clip, place)
+                out_image = src.read(window=window)
+                out_transform = src.window_transform(window)
                 out_meta = src.meta.copy()
-            out_meta.update({
-                "driver": "GTiff",
-                "height": out_image.shape[1],
-                "width": out_image.shape[2],
-                "transform": out_transform
-            })
+            out_image, out_meta = self._fill_outside(out_image, out_meta, inside, window, out_transform)
             output_name=f"{raster_path.split('/')[-1].rsplit('.', 1)[0]}_{uuid.uuid4().hex}.tif"
-            output_path = os.path.join(self.config.output_path, output_name)
-            with rasterio.open(output_path, "w", **out_meta) as dest:
-                dest.write(out_image)
+            output_path = os.path.join(self.config.publish_output_path, output_name)
+            self._write_published(out_image, out_meta, output_path)
             return output_path
         except Exception as e:
             print(e)
     
     def clip_to_town_buffer(self, raster_path: str,clip:List[int]=None  ) -> str:
         try:
-            town_path = os.path.join(self.config.base_dir, 'media', 'Rajat_data', 'shape_stp','Drain_stp','Town','Town.shp')
-            town_vector = gpd.read_file(town_path)
-            if town_vector.crs is None:
-                town_vector.set_crs("EPSG:32644", inplace=True) 
-            town_vector=town_vector.to_crs("EPSG:32644")
+            town_vector = layer_registry.get(self.config.town_shapefile, "EPSG:32644")
             town_vector=town_vector[town_vector['ID'].isin(clip)]
             class_buffer = 0 
             if int(town_vector['class'].iloc[0]) == 1:
@@ -304,10 +726,9 @@ class STPProcessor:
                 "transform": out_transform
             })
             output_name=f"{raster_path.split('/')[-1].rsplit('.', 1)[0]}_{uuid.uuid4().hex}.tif"
-            output_path = os.path.join(self.config.output_path, output_name)
+            output_path = os.path.join(self.config.publish_output_path, output_name)
             print("ouytput path",output_path)
-            with rasterio.open(output_path, "w", **out_meta) as dest:
-                dest.write(out_image)
+            self._write_published(out_image, out_meta, output_path)
             return output_path
         except Exception as e:
             print(e)
@@ -315,66 +736,113 @@ class STPProcessor:
 
 
 
-    def clip_details(self, raster_path: str,clip:List[int]=None,place:str=None  ) -> str:
-
+    def clip_details(self, raster_path: str,clip:List[int]=None,place:str=None,class_scheme:str="equal",
+                     breaks:List[float]=None) -> str:
         try:
-            villages_path = os.path.join(self.config.base_dir, 'media', 'Rajat_data', 'shape_stp', 'villages', 'STP_Village.shp')
-            villages_vector = gpd.read_file(villages_path)
-            if villages_vector.crs is None:
-                villages_vector.set_crs("EPSG:32644", inplace=True) 
-            villages_vector=villages_vector.to_crs("EPSG:32644")
-            if place == "village":
-                villages_vector=villages_vector[villages_vector['ID'].isin(clip)]
-            else:
-                villages_vector=villages_vector[villages_vector['subdis_cod'].isin(clip)]
             with rasterio.open(raster_path) as src:
                 raster = src.read(1, masked=True)
-                affine = src.transform
-
-                # Compute equal interval breaks
-                min_val = raster.min()
-                max_val = raster.max()
-                bins = np.linspace(min_val, max_val, 6)  # 5 classes = 6 edges
-
-                # Reclassify raster into 1–5 classes
-                reclass_raster = np.digitize(raster, bins[1:-1]) + 1  # bins[1:-1] excludes first & last edges
-                reclass_raster = np.where(raster.mask, 0, reclass_raster) 
-                class_labels = {
-                1: 'Very_Low',
-                2: 'Low',
-                3: 'Medium',
-                4: 'High',
-                5: 'Very_High'
-                }
-
-                stats = zonal_stats(
-                    vectors=villages_vector,
-                    raster=reclass_raster,
-                    affine=affine,
-                    nodata=0,
-                    categorical=True,
-                    geojson_out=False  # ✅ Fix here
-                )
-                results = []
-                for i, counts in enumerate(stats):
-                    shape_name = villages_vector.iloc[i]['Name']
-                    total_pixels = sum([v for k, v in counts.items() if k in class_labels])
-                    result = {'Village_Name': shape_name}
-                    for class_val, label in class_labels.items():
-                        pixel_count = counts.get(class_val, 0)
-                        percent = (pixel_count / total_pixels * 100) if total_pixels > 0 else 0
-                        result[label] = round(percent, 2)
-                    results.append(result)
-                    
-                df = pd.DataFrame(results)
-                output_csv_path = os.path.join(self.config.output_path, f"village_details_{uuid.uuid4().hex}.csv")
-                df.to_csv(output_csv_path, index=False)
-                return output_csv_path,results
+                crs, transform = src.crs, src.transform
+            # Built from the band just read and cached under the file for later schemes
+            histogram = histogram_cache.get(raster_path, data=raster) if breaks is None else None
+            return self._village_details(raster, crs, transform, clip, place, class_scheme, histogram, breaks)
         except Exception as e:
             print(e)
-        
+
+    def array_details(self, image: np.ndarray, meta: dict, clip: List[int] = None, place: str = None,
+                      class_scheme: str = "equal", breaks: List[float] = None):
+        """clip_details for an in-memory (image, meta) pair."""
+        return self._village_details(self.as_masked(image, meta), meta["crs"], meta["transform"], clip, place,
+                                     class_scheme, breaks=breaks)
+
+    def _village_details(self, raster: np.ma.MaskedArray, crs, transform, clip: List[int], place: str,
+                         class_scheme: str = "equal", histogram: RasterHistogram = None, breaks: List[float] = None):
+        zone_index = get_zone_index(self.config)
+        selected = zone_index.select(clip, place)
+        zones = zone_index.zones_for(crs, transform, raster.shape[1], raster.shape[0])
+        results = self.village_classes(raster, zones, selected, class_scheme, histogram, breaks)
+
+        df = pd.DataFrame(results)
+        output_csv_path = os.path.join(self.config.output_path, f"village_details_{uuid.uuid4().hex}.csv")
+        df.to_csv(output_csv_path, index=False)
+        return output_csv_path,results
+
+    def village_classes(self, raster: np.ma.MaskedArray, zones: np.ndarray, selected: np.ndarray,
+                        class_scheme: str = "equal", histogram: RasterHistogram = None,
+                        breaks: List[float] = None) -> List[dict]:
+        """Share of each selected village's pixels in the 5 classes of ``raster``; ``zones`` is on its grid.
+
+        Pass the published style's ``breaks`` so the shares match its legend; otherwise
+        they are derived from ``raster`` exactly as RasterProcess derives style breaks.
+        """
+        zone_index = get_zone_index(self.config)
+
+        # 5 classes = 6 edges, in the requested scheme
+        if breaks is None:
+            histogram = histogram or raster_histogram(raster)
+            breaks = histogram.breaks(class_scheme, 5, min_upper=RasterProcess.equal_min_upper)
+        bins = np.asarray(breaks)
+
+        # Reclassify raster into 1–5 classes
+        if bins[0] == bins[-1]:
+            # Flat raster: every valid pixel is the first class, as in the classified output
+            reclass_raster = np.ones(raster.shape, dtype=np.int64)
+        else:
+            reclass_raster = np.digitize(raster, bins[1:-1]) + 1  # bins[1:-1] excludes first & last edges
+        reclass_raster = np.where(np.ma.getmaskarray(raster), 0, reclass_raster)
+        class_labels = {
+        1: 'Very_Low',
+        2: 'Low',
+        3: 'Medium',
+        4: 'High',
+        5: 'Very_High'
+        }
+
+        # One bincount over (zone, class) pairs gives every village's class histogram
+        valid = (reclass_raster > 0) & (zones > 0)
+        num_classes = len(class_labels) + 1
+        counts = np.bincount(
+            zones[valid].astype(np.int64) * num_classes + reclass_raster[valid],
+            minlength=(len(zone_index.village_ids) + 1) * num_classes
+        ).reshape(-1, num_classes)
+
+        results = []
+        for zone in selected:
+            class_counts = counts[zone]
+            total_pixels = int(class_counts[1:].sum())
+            result = {'Village_Name': zone_index.village_names[zone - 1]}
+            for class_val, label in class_labels.items():
+                pixel_count = int(class_counts[class_val])
+                percent = (pixel_count / total_pixels * 100) if total_pixels > 0 else 0
+                result[label] = round(percent, 2)
+            results.append(result)
+        return results
+
+    def scenario_details(self, layers: np.ndarray, meta: dict, window: Window, inside: np.ndarray,
+                         clip: List[int] = None, place: str = None, class_scheme: str = "equal") -> List[List[dict]]:
+        """village_classes of every band of ``layers``, the overlays of several scenarios read inside ``window``.
+
+        ``meta`` describes the full grid and ``window``/``inside`` come from user_window; each band
+        is classified exactly like array_details on clip_array_to_user of that scenario's overlay.
+        """
+        out_transform = window_transform(window, meta["transform"])
+        layers, out_meta = self._fill_outside(layers, meta.copy(), inside, window, out_transform)
+        zone_index = get_zone_index(self.config)
+        selected = zone_index.select(clip, place)
+        zones = zone_index.zones_for(out_meta["crs"], out_transform, out_meta["width"], out_meta["height"])
+        return [
+            self.village_classes(self.as_masked(layers[band:band + 1], out_meta), zones, selected, class_scheme)
+            for band in range(layers.shape[0])
+        ]
+
 
 class RasterProcess:    
+    # Style fingerprint -> SLD file, shared by every RasterProcess in the process
+    _style_cache = {}
+    _style_cache_lock = threading.Lock()
+    level_class = ["  Very low", "  Low", "  Moderate", "  High", "  Very high"]
+    # Scores are normalised to 0..1, so equal-interval classes always reach at least 1.0
+    equal_min_upper = 1.0
+
     def __init__(self, config: GeoConfig = GeoConfig()):
         self.output_dir=Path(config.output_path) / "SLD" 
         self.geoserver_url = config.geoserver_url
@@ -541,20 +1009,12 @@ class RasterProcess:
         color_map = ET.SubElement(raster_symbolizer, "sld:ColorMap")
         color_map.set("type", "ramp")
         
-        # Define class labels
-        level_class = ["  Very low", "  Low", "  Moderate", "  High", "  Very high"]
-        
         # Add color map entries
-        for i in range(len(intervals)-1):
+        for i, label in enumerate(self._class_labels(len(intervals)-1)):
             entry = ET.SubElement(color_map, "sld:ColorMapEntry")
             entry.set("color", colors[i])
             entry.set("quantity", str(intervals[i]))
-            
-            # Use level class labels if available, otherwise use a default
-            if i < len(level_class):
-                entry.set("label", level_class[i])
-            else:
-                entry.set("label", f"class_{i+1}")
+            entry.set("label", label)
         
         # Convert to string with pretty printing
         rough_string = ET.tostring(root, 'utf-8')
@@ -569,42 +1029,96 @@ class RasterProcess:
         
         return pretty_xml
 
-    def _generate_dynamic_sld(self,raster_path:str,num_classes:int,color_ramp:str='blue_to_red',reverse:bool=False):
-        with rasterio.open(raster_path) as src:
-            data = src.read(1, masked=True)
-            valid_data = data[~data.mask]
-            if len(valid_data) == 0:
-                raise ValueError("Raster contains no valid data")
-            min_val = float(np.min(valid_data))
-            max_val = max(float(np.max(valid_data)), 1.0)
-            print("min valuye ",min_val)
-            print("max valuye ",max_val)
-    
-        print(f"Raster min value: {min_val}, max value: {max_val}")
-        if min_val == max_val:
-            intervals = [min_val] * num_classes
-        else:
-            intervals = np.linspace(min_val, max_val, num_classes+1)
-       
+    def _class_labels(self, num_entries: int) -> List[str]:
+        # Use level class labels if available, otherwise use a default
+        return [self.level_class[i] if i < len(self.level_class) else f"class_{i+1}" for i in range(num_entries)]
+
+    def style_fingerprint(self, intervals, colors) -> str:
+        """Hash of everything that ends up in the SLD, so equal breaks and ramps map to one style."""
+        labels = self._class_labels(len(intervals)-1)
+        key = json.dumps({
+            "quantities": [str(i) for i in intervals[:len(labels)]],
+            "colors": list(colors[:len(labels)]),
+            "labels": labels,
+        })
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def _cached_sld(self, intervals, colors) -> str:
+        """Path of the SLD for these breaks, written to the output dir only the first time it is seen."""
+        fingerprint = self.style_fingerprint(intervals, colors)
+        output_sld_path = os.path.join(self.output_dir, f"style_{fingerprint}.sld")
+        with self._style_cache_lock:
+            cached = self._style_cache.get(fingerprint)
+        if cached and os.path.exists(cached):
+            print(f"Reusing SLD for fingerprint {fingerprint}")
+            return cached
+        if not os.path.exists(output_sld_path):
+            sld_content = self._generate_sld_xml(intervals, colors)
+            tmp_path = f"{output_sld_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(sld_content)
+            os.replace(tmp_path, output_sld_path)
+            print(f"SLD file created: {output_sld_path}")
+        with self._style_cache_lock:
+            self._style_cache[fingerprint] = output_sld_path
+        return output_sld_path
+
+    def _class_breaks(self,raster,num_classes:int,class_scheme:str="equal"):
+        # raster is a path, an already read masked band or its RasterHistogram
+        return raster_histogram(raster).breaks(class_scheme, num_classes, min_upper=self.equal_min_upper)
+
+    def _ramp_colors(self,num_classes:int,color_ramp:str,reverse:bool=False):
         colors = self._generate_colors(num_classes, color_ramp)
         print("reverse ",reverse)
         if reverse:
             colors = colors[::-1]
-        for i in intervals:
-            print("intervals ",intervals)
-        sld_content = self._generate_sld_xml(intervals, colors)
-        unique_name = f"style_{uuid.uuid4().hex}.sld"
-        output_sld_path = os.path.join(self.output_dir, unique_name)        
-        with open(output_sld_path, 'w', encoding='utf-8') as f:
-            f.write(sld_content)
-        print(f"SLD file created: {output_sld_path}")
-        return output_sld_path
+        return colors
+
+    def _generate_dynamic_sld(self,raster_path:str,num_classes:int,color_ramp:str='blue_to_red',reverse:bool=False,
+                              class_scheme:str="equal"):
+        intervals = self._class_breaks(raster_path, num_classes, class_scheme)
+        colors = self._ramp_colors(num_classes, color_ramp, reverse)
+        return self._cached_sld(intervals, colors)
+
+    def _env_sld(self,num_classes:int,color_ramp:str,reverse:bool=False):
+        """One SLD per ramp whose ColorMapEntry quantities are the WMS env variables b0..b<n-1>."""
+        sld_name = f"env_{color_ramp}{'_reversed' if reverse else ''}_{num_classes}"
+        output_sld_path = os.path.join(self.output_dir, f"{sld_name}.sld")
+        if not os.path.exists(output_sld_path):
+            quantities = [f"${{env('b{i}',{i})}}" for i in range(num_classes + 1)]
+            sld_content = self._generate_sld_xml(quantities, self._ramp_colors(num_classes, color_ramp, reverse))
+            tmp_path = f"{output_sld_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(sld_content)
+            os.replace(tmp_path, output_sld_path)
+        return output_sld_path, sld_name
+
+    def class_table(self,raster,reverse:bool=False,num_classes:int=5,color_ramp:str='orange_to_green',
+                    class_scheme:str="equal"):
+        """Breaks and colours of the SLD processRaster builds, for the quantized uint8 output."""
+        intervals = self._class_breaks(raster, num_classes, class_scheme)
+        return [float(i) for i in intervals], self._ramp_colors(num_classes, color_ramp, reverse)
+
+    def env_style(self,file_path:str,reverse:bool=False,num_classes:int=5,color_ramp:str='orange_to_green',
+                  class_scheme:str="equal"):
+        """Class breaks of ``file_path`` plus the shared env SLD and the GetMap params that select them."""
+        intervals = [float(i) for i in self._class_breaks(file_path, num_classes, class_scheme)]
+        sld_path, sld_name = self._env_sld(num_classes, color_ramp, reverse)
+        return {
+            "sld_path": sld_path,
+            "sld_name": sld_name,
+            "breaks": intervals,
+            "wms_params": {
+                "STYLES": sld_name,
+                "env": ";".join(f"b{i}:{value}" for i, value in enumerate(intervals[:num_classes])),
+            },
+        }
     
-    def processRaster(self,file_path:str,reverse:bool=False):
+    def processRaster(self,file_path:str,reverse:bool=False,class_scheme:str="equal"):
         try:
             #sld_path=self._generate_dynamic_sld(raster_path=file_path,num_classes=5,color_ramp='viridis')
             #sld_path=self._generate_dynamic_sld(raster_path=file_path,num_classes=5,color_ramp='blue_to_red')
-            sld_path=self._generate_dynamic_sld(raster_path=file_path,num_classes=5,color_ramp='orange_to_green',reverse=reverse)
+            sld_path=self._generate_dynamic_sld(raster_path=file_path,num_classes=5,color_ramp='orange_to_green',reverse=reverse,class_scheme=class_scheme)
             #sld_path=self._generate_dynamic_sld(raster_path=file_path,num_classes=5,color_ramp='spectral')
             #sld_path=self._generate_dynamic_sld(raster_path=file_path,num_classes=5,color_ramp='terrain') #terrain
             #sld_path=self._generate_dynamic_sld(raster_path=file_path,num_classes=5,color_ramp="greenTOred")
@@ -615,21 +1129,21 @@ class RasterProcess:
             print("exceprion",e)
             return False
 
+def register_env_styles(config: GeoConfig) -> None:
+    """Upload the shared env styles up front so the first STP request finds them in place."""
+    raster_process = RasterProcess(config)
+    for reverse in (True, False):
+        sld_path, sld_name = raster_process._env_sld(5, 'orange_to_green', reverse)
+        if not geo.ensure_style(config.raster_workspace, sld_path, sld_name):
+            print(f"Could not register env style {sld_name}")
+
 class STPPriorityMapper:
     def __init__(self, config: GeoConfig = None):
         self.config = config or GeoConfig()
         self.processor = STPProcessor(self.config)
     
     def cachement_villages(self,drain_no:List[int]):
-        catchment_villages = gpd.read_file(self.config.cachement_shapefile)
-        villages = gpd.read_file(self.config.villages_shapefile) 
-        projected_crs = 'EPSG:32643' 
-        catchment_villages = catchment_villages.to_crs(projected_crs)
-        villages = villages.to_crs(projected_crs)
-        catchment_selected = catchment_villages[catchment_villages["Drain_No"].isin(drain_no)]
-        catchment_polygon = catchment_selected.geometry.unary_union
-        
-        villages_intersect = villages[villages.intersects(catchment_polygon)]
+        villages_intersect = get_catchment_index(self.config).villages_for(drain_no).copy()
         print("villages_intersect",villages_intersect)
 
         # Data cleaning and validation
@@ -661,6 +1175,8 @@ class STPPriorityMapper:
 
         name_only = os.path.splitext(os.path.basename(output_zip_path))[0]
 
+        artifact_reaper.record([{"kind": "feature_type", "workspace": "vector_work", "store": "stp_vector_store",
+                                 "name": name_only, "local_path": str(output_zip_path)}])
         upload_shapefile("vector_work", "stp_vector_store", Path(output_zip_path), layer_name=name_only)
 
         # Update data array to use the new column name
@@ -677,51 +1193,83 @@ class STPPriorityMapper:
         print("name is ",name_only)
         return [data, name_only]
 
-    def create_priority_map(self, raster_paths: List[str], weights: List[float],clip:List[int]=None,place:str=None) -> str:
+    def create_priority_map(self, raster_paths: List[str], weights: List[float],clip:List[int]=None,place:str=None,
+                            class_scheme:str="equal") -> str:
         try:
             if len(raster_paths) != len(weights):
                 raise ValueError(f"Number of rasters ({len(raster_paths)}) must match number of weights ({len(weights)})")
-            self.processor.align_rasters(raster_paths)
-            overlay_name=f"overlay_{uuid.uuid4().hex}_map.tif"
-            weighted_path, weighted_sum = self.processor.create_weighted_overlay(
-                weights, overlay_name
-            )
-            output_name=f"Final_STP_Priority_{uuid.uuid4().hex}_map.tif"
-            constrained_path, _ = self.processor.apply_constraint(
-                weighted_sum, output_name=output_name
-            )
             final_name = f"stp_priority_{uuid.uuid4().hex}_map.tif"
-            final_path = self.processor.clip_to_basin(
-                raster_path=constrained_path,
-                shapefile_path=self.config.basin_shapefile , output_name=final_name
-            )
-            sld_path,sld_name=RasterProcess().processRaster(final_path,reverse=True)
-            final_path=self.processor.clip_to_user(final_path,clip=clip,place=place)
-            csv_path,csv_details=self.processor.clip_details(raster_path=final_path,clip=clip,place=place)
-            status,layer_name=geo.publish_raster(workspace_name=self.config.raster_workspace, store_name=self.config.raster_store, raster_path=final_path)
-            status=geo.apply_sld_to_layer(workspace_name=self.config.raster_workspace, layer_name = layer_name,sld_content=sld_path, sld_name=sld_name)
-            if status:
-                os.remove(final_path)
-                os.remove(weighted_path)
-                os.remove(constrained_path)
-                os.remove(sld_path)
-                return {
-                    "status": "success",
-                    "workspace": self.config.raster_workspace,
-                    "store": self.config.raster_store,
-                    "layer_name": layer_name,
-                    "type": "raster",
-                    "csv_path":csv_path,
-                    "csv_details":csv_details
-                }
-            return False
+            if self.processor.use_tiled_mode(raster_paths):
+                final_path = self.processor.create_tiled_overlay(
+                    raster_paths, weights, shapefile_path=self.config.basin_shapefile, output_name=final_name
+                )
+                return self.publish_priority_map(final_path, clip=clip, place=place, temp_paths=[final_path],
+                                                 class_scheme=class_scheme)
+            # Every stage works on arrays; only the clipped product is written, once
+            self.processor.align_rasters(raster_paths)
+            weighted_sum = self.processor.weighted_sum(weights)
+            constrained = self.processor.constrain(weighted_sum, [self.config.constraint_raster_path])
+            del weighted_sum
+            image, meta = self.processor.clip_array_to_basin(constrained, self.config.basin_shapefile)
+            del constrained
+            return self.publish_priority_array(image, meta, final_name, clip=clip, place=place, class_scheme=class_scheme)
         except Exception as e:
             print(e)
             return False
 
-    def category_priority_map(self,db:db_dependency,clip:List[int]=None,place:str=None) -> str:
+    def publish_priority_map(self, final_path: str, clip: List[int] = None, place: str = None,
+                             temp_paths: List[str] = None, class_scheme: str = "equal"):
+        style=prepare_style(self.config, final_path, reverse=True, class_scheme=class_scheme)
+        final_path=self.processor.clip_to_user(final_path,clip=clip,place=place)
+        csv_path,csv_details=self.processor.clip_details(raster_path=final_path,clip=clip,place=place,class_scheme=class_scheme,
+                                                         breaks=style["breaks"])
+        result=publish_stp_raster(self.config, self.processor, style, final_path=final_path, temp_paths=temp_paths)
+        if result:
+            result.update(csv_path=csv_path, csv_details=csv_details)
+        return result
+
+    def publish_priority_array(self, image: np.ndarray, meta: dict, output_name: str, clip: List[int] = None,
+                               place: str = None, class_scheme: str = "equal", store_name: str = None,
+                               classified_store: str = None, env_style: bool = None):
+        """publish_priority_map for a basin-clipped (image, meta) that was never written to disk.
+
+        ``store_name``/``classified_store`` and ``env_style`` are passed on to publish_stp_raster and prepare_style.
+        """
+        style=prepare_style(self.config, self.processor.as_masked(image, meta), reverse=True, class_scheme=class_scheme,
+                            env_style=env_style)
+        image,meta=self.processor.clip_array_to_user(image, meta, clip=clip, place=place)
+        csv_path,csv_details=self.processor.array_details(image, meta, clip=clip, place=place, class_scheme=class_scheme,
+                                                          breaks=style["breaks"])
+        result=publish_stp_raster(self.config, self.processor, style, image=image, meta=meta, output_name=output_name,
+                                  store_name=store_name, classified_store=classified_store)
+        if result:
+            result.update(csv_path=csv_path, csv_details=csv_details)
+        return result
+
+    def _category_store_name(self) -> str:
+        # Layers are published concurrently, so a millisecond timestamp is no longer unique
+        return geo.new_store_name(self.config.raster_workspace, self.config.raster_store)
+
+    def _mosaic_store_name(self, family: str, file_name: str) -> str:
+        return re.sub(r"[^A-Za-z0-9_]", "_", f"{self.config.mosaic_store_prefix}_{family}_{file_name}")
+
+    async def _publish_categories(self, rasters: List[dict], publish_one) -> List[dict]:
+        results = await asyncio.gather(*(publish_one(i) for i in rasters), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return [
+            {
+                "workspace": self.config.raster_workspace,
+                **published,
+                "file_name": i["file_name"],
+            }
+            for i, published in zip(rasters, results)
+        ]
+
+    async def category_priority_map(self,db:db_dependency,clip:List[int]=None,place:str=None) -> str:
         try:
-            raster_path=spt_service.Stp_service.get_priority_category(db)
+            raster_path=await asyncio.to_thread(spt_service.Stp_service.get_priority_category,db)
 
             raster_path = [{"file_name": i.file_name,
                             "path": os.path.abspath(Settings().BASE_DIR+"/"+i.file_path),
@@ -729,53 +1277,109 @@ class STPPriorityMapper:
                            } for i in raster_path]
            
             print("raster path",raster_path)
-            response=[]
-            for i in raster_path:
-                final_path=self.processor.clip_to_user(i['path'],clip=clip,place=place)
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]  # Include milliseconds
-                unique_store_name = f"{self.config.raster_store}_{timestamp}"
-                status,layer_name=geo.publish_raster(workspace_name=self.config.raster_workspace, store_name=unique_store_name, raster_path=final_path)
-                sld_path= i['sld_path']
-                sld_name = f"{os.path.basename(sld_path).split('.')[0]}_{uuid.uuid4().hex}"
-                status=geo.apply_sld_to_layer(workspace_name=self.config.raster_workspace, layer_name = layer_name,sld_content=sld_path, sld_name=sld_name)   
-                os.remove(final_path)
-                response.append({
-                    "workspace": self.config.raster_workspace,
-                    "layer_name": layer_name,
-                    "file_name":i["file_name"],
-                })
-            return response
+            request_id = uuid.uuid4().hex
+
+            async def publish_one(i):
+                final_path=await asyncio.to_thread(self.processor.clip_to_user,i['path'],clip=clip,place=place)
+                if final_path is None:
+                    # clip_to_user prints and swallows its own errors
+                    raise RuntimeError(f"Failed to clip {i['file_name']} to the selected area")
+                try:
+                    sld_path= i['sld_path']
+                    if self.config.use_mosaic_publish:
+                        # Category SLDs are fixed, so the mosaic's default style serves every granule
+                        store_name = self._mosaic_store_name("priority", i["file_name"])
+                        # Only the granule expires; the mosaic and its default style are shared
+                        await asyncio.to_thread(artifact_reaper.record, [
+                            {"kind": "granule", "workspace": self.config.raster_workspace, "store": store_name, "name": request_id}
+                        ])
+                        layer_name = await async_geo.publish_granule(
+                            self.config.raster_workspace, store_name,
+                            final_path, request_id, sld_path, os.path.basename(sld_path).split('.')[0]
+                        )
+                        return {"layer_name": layer_name, "wms_params": {f"DIM_{geo.mosaic_dimension}": request_id}}
+                    sld_name = fixed_style_name(sld_path)
+                    store_name = self._category_store_name()
+                    await asyncio.to_thread(artifact_reaper.record, raster_artifacts(self.config.raster_workspace, store_name, sld_name))
+                    layer_name = await async_geo.publish_styled_raster(
+                        self.config.raster_workspace, store_name, final_path, sld_path, sld_name, reuse_style=True
+                    )
+                    return {"layer_name": layer_name}
+                finally:
+                    geo.discard_local(final_path)
+
+            return await self._publish_categories(raster_path, publish_one)
         
         except Exception as e:
             print(e)
             return False
     
-    def category_priority_map_villages(self,db:db_dependency,clip:List[int]=None) -> str:
+    async def category_priority_map_villages(self,db:db_dependency,clip:List[int]=None) -> str:
         try:
-            raster_path=spt_service.Stp_service.get_sutability_category(db,all_data=True)
+            raster_path=await asyncio.to_thread(spt_service.Stp_service.get_sutability_category,db,all_data=True)
             raster_path = [{"file_name": i.file_name,
                             "path": os.path.abspath(Settings().BASE_DIR+"/"+i.file_path),
                             "sld_path": os.path.abspath(Settings().BASE_DIR+"/"+i.sld_path,)                                            
                            } for i in raster_path]
-           
-           
-            response=[]
-            for i in raster_path:
-                final_path=self.processor.clip_to_town_buffer(i['path'],clip=clip)
-                print("final pasth",final_path)
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]  # Include milliseconds
-                unique_store_name = f"{self.config.raster_store}_{timestamp}"
-                status,layer_name=geo.publish_raster(workspace_name=self.config.raster_workspace, store_name=unique_store_name, raster_path=final_path)
-                sld_path,sld_name=RasterProcess().processRaster(final_path,reverse=True)
-                status=geo.apply_sld_to_layer(workspace_name=self.config.raster_workspace, layer_name = layer_name,sld_content=sld_path, sld_name=sld_name)   
-                os.remove(final_path)
-                os.remove(sld_path)
-                response.append({
-                    "workspace": self.config.raster_workspace,
-                    "layer_name": layer_name,
-                    "file_name":i["file_name"],
-                })
-            return response
+
+            request_id = uuid.uuid4().hex
+
+            async def publish_one(i):
+                final_path=await asyncio.to_thread(self.processor.clip_to_town_buffer,i['path'],clip=clip)
+                if final_path is None:
+                    # clip_to_town_buffer prints and swallows its own errors
+                    raise RuntimeError(f"Failed to clip {i['file_name']} to the town buffer")
+                try:
+                    if self.config.use_env_styles:
+                        env_style = await asyncio.to_thread(RasterProcess().env_style, final_path, reverse=True)
+                        await async_geo.upload_style(self.config.raster_workspace, env_style["sld_path"],
+                                                     env_style["sld_name"], reuse_style=True)
+                        if self.config.use_mosaic_publish:
+                            store_name = self._mosaic_store_name("sutability", i["file_name"])
+                            await asyncio.to_thread(artifact_reaper.record, [
+                                {"kind": "granule", "workspace": self.config.raster_workspace, "store": store_name, "name": request_id}
+                            ])
+                            layer_name = await async_geo.publish_granule(
+                                self.config.raster_workspace, store_name, final_path, request_id
+                            )
+                            wms_params = {f"DIM_{geo.mosaic_dimension}": request_id, **env_style["wms_params"]}
+                        else:
+                            store_name = self._category_store_name()
+                            await asyncio.to_thread(artifact_reaper.record, raster_artifacts(self.config.raster_workspace, store_name))
+                            published = await async_geo.publish_raster(self.config.raster_workspace, store_name, final_path)
+                            if not published:
+                                raise RuntimeError(f"Failed to publish raster {final_path}")
+                            layer_name = published[1]
+                            wms_params = env_style["wms_params"]
+                        return {"layer_name": layer_name, "breaks": env_style["breaks"], "wms_params": wms_params}
+                    sld_path,sld_name=await asyncio.to_thread(RasterProcess().processRaster,final_path,reverse=True)
+                    if self.config.use_mosaic_publish:
+                        # Breaks depend on this clip, so the style is uploaded on its own and
+                        # selected per request with STYLES instead of becoming the default
+                        store_name = self._mosaic_store_name("sutability", i["file_name"])
+                        await asyncio.to_thread(artifact_reaper.record, [
+                            {"kind": "granule", "workspace": self.config.raster_workspace, "store": store_name, "name": request_id},
+                            # Selected by the granule's STYLES, so it must live as long as the granule
+                            {"kind": "style", "workspace": self.config.raster_workspace, "name": sld_name, "ttl_kind": "granule"},
+                        ])
+                        await async_geo.upload_style(self.config.raster_workspace, sld_path, sld_name, reuse_style=True)
+                        layer_name = await async_geo.publish_granule(
+                            self.config.raster_workspace, store_name, final_path, request_id
+                        )
+                        return {
+                            "layer_name": layer_name,
+                            "wms_params": {f"DIM_{geo.mosaic_dimension}": request_id, "STYLES": sld_name},
+                        }
+                    store_name = self._category_store_name()
+                    await asyncio.to_thread(artifact_reaper.record, raster_artifacts(self.config.raster_workspace, store_name, sld_name))
+                    layer_name = await async_geo.publish_styled_raster(
+                        self.config.raster_workspace, store_name, final_path, sld_path, sld_name, reuse_style=True
+                    )
+                    return {"layer_name": layer_name}
+                finally:
+                    geo.discard_local(final_path)
+
+            return await self._publish_categories(raster_path, publish_one)
         
         except Exception as e:
             print(e)
@@ -809,37 +1413,26 @@ class STPSutabilityMapper:
         for i in condition_raster:
             raster_path.append(i[0])
             raster_weights.append(i[1])
-        self.processor.align_rasters(raster_path)
-        overlay_name=f"overlay_{uuid.uuid4().hex}_map.tif"
-        weighted_path, weighted_sum = self.processor.create_weighted_overlay(
-                raster_weights, overlay_name
-            )
-        constraint_name=f"constraint_{uuid.uuid4().hex}_map.tif"
-        constrained_path, _ = self.processor.apply_constraints_new(
-                weighted_sum, constraint_paths=constraintion_raster, output_name=constraint_name
-            )
         final_name = f"stp_sutability_{uuid.uuid4().hex}_map.tif"
-        final_path = self.processor.clip_to_basin(
-                raster_path=constrained_path,
-                shapefile_path=self.config.basin_shapefile , output_name=final_name
+        if self.processor.use_tiled_mode(raster_path):
+            final_path = self.processor.create_tiled_overlay(
+                raster_path, raster_weights, constraint_paths=constraintion_raster,
+                shapefile_path=self.config.basin_shapefile, output_name=final_name
             )
-        sld_path,sld_name=RasterProcess().processRaster(final_path,reverse=reverse)
-        final_path=self.processor.clip_to_user(final_path,clip=payload.clip)
+            style=prepare_style(self.config, final_path, reverse=reverse, class_scheme=payload.class_scheme)
+            clipped_path=self.processor.clip_to_user(final_path,clip=payload.clip)
+            return publish_stp_raster(self.config, self.processor, style, final_path=clipped_path, temp_paths=[final_path])
 
-        status,layer_name=geo.publish_raster(workspace_name=self.config.raster_workspace, store_name=self.config.raster_store, raster_path=final_path)
-        status=geo.apply_sld_to_layer(workspace_name=self.config.raster_workspace, layer_name = layer_name,sld_content=sld_path, sld_name=sld_name)
-        if status:
-            os.remove(final_path)
-            os.remove(weighted_path)
-            os.remove(constrained_path)
-            os.remove(sld_path)
-            return {
-                "status": "success",
-                "workspace": self.config.raster_workspace,
-                "store": self.config.raster_store,
-                "layer_name": layer_name,
-                "type": "raster"
-            }
-        return False
+        # In memory: only the clipped product is written
+        self.processor.align_rasters(raster_path)
+        weighted_sum = self.processor.weighted_sum(raster_weights)
+        constrained = self.processor.constrain(weighted_sum, constraintion_raster)
+        del weighted_sum
+        image, meta = self.processor.clip_array_to_basin(constrained, self.config.basin_shapefile)
+        del constrained
+        style=prepare_style(self.config, self.processor.as_masked(image, meta), reverse=reverse,
+                            class_scheme=payload.class_scheme)
+        image, meta = self.processor.clip_array_to_user(image, meta, clip=payload.clip)
+        return publish_stp_raster(self.config, self.processor, style, image=image, meta=meta, output_name=final_name)
 
        
\ No newline at end of file
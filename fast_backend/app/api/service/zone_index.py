@@ -0,0 +1,134 @@
+import os
+import json
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+import geopandas as gpd
+from rasterio.crs import CRS
+from rasterio.features import rasterize
+from app.api.service.network.network_conf import GeoConfig
+from app.api.service.layer_registry import layer_registry
+
+
+class VillageZoneIndex:
+    """Village polygons burned into an integer zone raster on a target grid.
+
+    Zone values are dense indices (1..N, 0 = no village) into lookup arrays
+    of village ID, name and subdistrict code, so clipping to villages or
+    subdistricts becomes an ``np.isin`` mask and per-village statistics a
+    single ``np.bincount``. Zone rasters are persisted as ``.npy`` files keyed
+    by the shapefile mtime and the grid, and a grid that is a pixel-aligned
+    window of an already indexed grid is served as a slice of it.
+    """
+
+    max_grids = 4
+
+    def __init__(self, config: GeoConfig):
+        self.villages_path = str(config.villages_shapefile)
+        self.cache_dir = Path(config.zone_index_path)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._villages = None
+        self.village_ids = None
+        self.village_names = None
+        self.subdistrict_codes = None
+        self._grids: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def _load_villages(self) -> gpd.GeoDataFrame:
+        mtime = os.stat(self.villages_path).st_mtime_ns
+        if self._villages is None or mtime != self._mtime:
+            villages = layer_registry.get(self.villages_path)
+            self._villages = villages
+            self.village_ids = villages["ID"].to_numpy()
+            self.village_names = villages["Name"].to_numpy()
+            self.subdistrict_codes = villages["subdis_cod"].to_numpy()
+            self._mtime = mtime
+            self._grids.clear()
+            for stale in self.cache_dir.glob("zones_*.npy"):
+                if not stale.name.startswith(f"zones_{mtime}_"):
+                    stale.unlink(missing_ok=True)
+        return self._villages
+
+    def select(self, clip: List[int], place: str = None) -> np.ndarray:
+        """Dense zone indices of the requested villages/subdistricts, in shapefile order."""
+        with self._lock:
+            self._load_villages()
+            lookup = self.village_ids if place == "village" else self.subdistrict_codes
+            return np.flatnonzero(np.isin(lookup, clip)) + 1
+
+    def _grid_key(self, crs, transform, width: int, height: int) -> str:
+        payload = json.dumps({
+            "villages": os.path.abspath(self.villages_path),
+            "mtime": self._mtime,
+            "crs": CRS.from_user_input(crs).to_string(),
+            "transform": [round(float(v), 6) for v in tuple(transform)[:6]],
+            "shape": [int(height), int(width)],
+        }, sort_keys=True)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def _window_of_cached(self, crs, transform, width: int, height: int) -> Optional[np.ndarray]:
+        for grid_crs, grid_transform, zones in self._grids.values():
+            if CRS.from_user_input(crs) != grid_crs:
+                continue
+            if (transform.a, transform.b, transform.d, transform.e) != \
+                    (grid_transform.a, grid_transform.b, grid_transform.d, grid_transform.e):
+                continue
+            col = (transform.c - grid_transform.c) / grid_transform.a
+            row = (transform.f - grid_transform.f) / grid_transform.e
+            if abs(col - round(col)) > 1e-6 or abs(row - round(row)) > 1e-6:
+                continue
+            col, row = int(round(col)), int(round(row))
+            if col < 0 or row < 0 or col + width > zones.shape[1] or row + height > zones.shape[0]:
+                continue
+            return zones[row:row + height, col:col + width]
+        return None
+
+    def zones_for(self, crs, transform, width: int, height: int) -> np.ndarray:
+        crs = crs or "EPSG:32644"
+        with self._lock:
+            villages = self._load_villages()
+            zones = self._window_of_cached(crs, transform, width, height)
+            if zones is not None:
+                return zones
+
+            key = self._grid_key(crs, transform, width, height)
+            zone_path = self.cache_dir / f"zones_{self._mtime}_{key}.npy"
+            if zone_path.exists():
+                zones = np.load(zone_path, mmap_mode="r")
+            else:
+                projected = layer_registry.get(self.villages_path, CRS.from_user_input(crs).to_string())
+                zones = rasterize(
+                    zip(projected.geometry, range(1, len(projected) + 1)),
+                    out_shape=(height, width),
+                    transform=transform,
+                    fill=0,
+                    dtype="int32",
+                )
+                tmp_path = self.cache_dir / f".zones_{key}_{uuid.uuid4().hex}.tmp"
+                with open(tmp_path, "wb") as f:
+                    np.save(f, zones)
+                os.replace(tmp_path, zone_path)
+                zones = np.load(zone_path, mmap_mode="r")
+
+            self._grids[key] = (CRS.from_user_input(crs), transform, zones)
+            while len(self._grids) > self.max_grids:
+                self._grids.popitem(last=False)
+            return zones
+
+
+_zone_indexes: Dict[str, VillageZoneIndex] = {}
+_zone_indexes_lock = threading.Lock()
+
+
+def get_zone_index(config: GeoConfig) -> VillageZoneIndex:
+    """Process-wide zone index for the configured villages shapefile."""
+    key = str(config.villages_shapefile)
+    with _zone_indexes_lock:
+        if key not in _zone_indexes:
+            _zone_indexes[key] = VillageZoneIndex(config)
+        return _zone_indexes[key]
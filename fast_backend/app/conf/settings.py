@@ -20,6 +20,10 @@ class Settings(BaseSettings):
     GEOSERVER_USERNAME:str
     GEOSERVER_PASSWORD:str
     GEOSERVER_EX_URL:str    
+    # "upload" sends GeoTIFF bytes over REST, "external" registers files from a shared volume
+    GEOSERVER_PUBLISH_MODE:str="upload"
+    GEOSERVER_SHARED_DIR:str="/srv/geoserver_shared"
+    GEOSERVER_SHARED_DIR_REMOTE:str="/opt/geoserver/shared"
     # postgres
     
     POSTGRES_DB:str
@@ -0,0 +1,69 @@
+from app.database.models import GeoserverArtifact
+from app.database.crud.base import CrudBase
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+import sqlalchemy as sq
+
+class Geoserver_artifact_crud(CrudBase):
+    def __init__(self,db:Session,Model=GeoserverArtifact):
+        super().__init__(db,Model)
+        self.obj = None
+
+    def _live(self,kind:str,workspace:str,name:str,store:str=None):
+        return self.db.query(self.Model).filter(
+            self.Model.kind==kind,
+            self.Model.workspace==workspace,
+            self.Model.name==name,
+            self.Model.store==store if store is not None else self.Model.store.is_(None),
+            self.Model.deleted_at.is_(None))
+
+    def record(self,artifacts:list,ttl:dict):
+        # Called before publishing. A republished name (the shared raster store, a reused style)
+        # extends its live row instead of adding one, so an old row can never expire and delete
+        # the newer layer. FOR UPDATE waits for a reaper that has claimed the row; once that pass
+        # has marked it deleted it no longer matches, and a fresh row tracks the new publish.
+        # "ttl_kind" lends an artifact the TTL of the one depending on it (a style selected by a
+        # granule's wms_params).
+        now=datetime.now()
+        for artifact in artifacts:
+            artifact=dict(artifact)
+            expires_at=now+timedelta(seconds=ttl[artifact.pop("ttl_kind",artifact["kind"])])
+            obj=self._live(artifact["kind"],artifact["workspace"],artifact["name"],artifact.get("store")).with_for_update().first()
+            if obj is None:
+                self.db.add(self.Model(**artifact,expires_at=expires_at))
+            else:
+                # Never shorten: another layer recorded with a longer TTL may still use it
+                obj.expires_at=max(obj.expires_at,expires_at)
+                obj.local_path=artifact.get("local_path") or obj.local_path
+        self.db.commit()
+
+    def claim_expired(self,limit:int,max_attempts:int):
+        # Rows stay locked until the caller commits, so concurrent reapers skip each other's batch
+        query=self.db.query(self.Model).filter(
+            self.Model.deleted_at.is_(None),
+            self.Model.expires_at<=datetime.now(),
+            self.Model.attempts<max_attempts
+        ).order_by(self.Model.expires_at).limit(limit).with_for_update(skip_locked=True)
+        return query.all()
+
+    def pending_count(self,max_attempts:int):
+        return self.db.query(sq.func.count(self.Model.id)).filter(
+            self.Model.deleted_at.is_(None),
+            self.Model.expires_at<=datetime.now(),
+            self.Model.attempts<max_attempts
+        ).scalar()
+
+    def abandoned_count(self,max_attempts:int):
+        return self.db.query(sq.func.count(self.Model.id)).filter(
+            self.Model.deleted_at.is_(None),
+            self.Model.attempts>=max_attempts
+        ).scalar()
+
+    def mark_failed(self,artifacts:list):
+        for artifact in artifacts:
+            artifact.attempts=(artifact.attempts or 0)+1
+
+    def mark_deleted(self,artifacts:list):
+        now=datetime.now()
+        for artifact in artifacts:
+            artifact.deleted_at=now
@@ -1,4 +1,4 @@
-from app.database.models import State,District,SubDistrict,Towns,STP_raster,STP_sutability_raster,STP_Priority_Visual_raster,STP_River,STP_Drain,STP_Stretches,STP_Catchment,STP_sutability_visual_raster
+from app.database.models import State,District,SubDistrict,Towns,STP_raster,STP_sutability_raster,STP_Priority_Visual_raster,STP_River,STP_Drain,STP_Stretches,STP_Catchment,STP_sutability_visual_raster,STP_Catchment_Village
 from app.database.crud.base import CrudBase
 from sqlalchemy.orm import Session
 import sqlalchemy as sq
@@ -81,6 +81,31 @@ class Stp_catchment_crud(CrudBase):
         query=self.db.query(self.Model).filter(self.Model.Drain_No.in_(Drain_No))
         return self._pagination(query,all_data)
 
+class Stp_catchment_village_crud(CrudBase):
+    def __init__(self,db:Session,Model=STP_Catchment_Village):
+        super().__init__(db,Model)
+        self.obj = None
+
+    def latest_version(self):
+        return self.db.query(sq.func.max(self.Model.version)).scalar()
+
+    def get_villages(self,Drain_No:list):
+        # one indexed query over the latest build, one row per (village, drain); the rows are
+        # not summed here because overlapping catchments would count a village part twice
+        latest = sq.select(sq.func.max(self.Model.version)).scalar_subquery()
+        query=self.db.query(self.Model).filter(
+            self.Model.version==latest,
+            self.Model.Drain_No.in_(Drain_No)
+        ).order_by(self.Model.village_id,self.Model.Drain_No)
+        return query.all()
+
+    def replace_all(self,rows:list):
+        version=(self.latest_version() or 0)+1
+        self.db.execute(sq.insert(self.Model),[{**row,"version":version} for row in rows])
+        self.db.query(self.Model).filter(self.Model.version<version).delete(synchronize_session=False)
+        self.db.commit()
+        return version
+
 class STP_priority_crud(CrudBase):
     def __init__(self,db:Session,Model=STP_raster):
         super().__init__(db,Model)
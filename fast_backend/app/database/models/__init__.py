@@ -9,7 +9,9 @@ from app.database.models.model_stp import(
     STP_Drain,
     STP_Stretches,
     STP_Catchment,
+    STP_Catchment_Village,
     Towns,
     STP_sutability_visual_raster
 
-)
\ No newline at end of file
+)
+from app.database.models.geoserver_data import GeoserverArtifact
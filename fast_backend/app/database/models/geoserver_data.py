@@ -0,0 +1,25 @@
+import sqlalchemy as sa
+from app.database.models.base import Base
+from sqlalchemy.orm import Mapped,mapped_column
+from sqlalchemy import String, DateTime, Integer
+from datetime import datetime
+from typing import Optional
+
+class GeoserverArtifact(Base):
+    """Catalog object the app published to GeoServer, kept until the reaper removes it.
+
+    kind is one of coverage_store, feature_type, granule or style; store is the
+    datastore of a feature type or the mosaic of a granule.
+    """
+    __tablename__ = "geoserver_artifact"
+    __table_args__ = (sa.Index("ix_geoserver_artifact_live_expiry", "deleted_at", "expires_at"),)
+
+    kind: Mapped[str] = mapped_column(String, nullable=False)
+    workspace: Mapped[str] = mapped_column(String, nullable=False)
+    name: Mapped[str] = mapped_column(String, nullable=False)
+    store: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    local_path: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    deleted_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # Failed deletes; the reaper stops claiming a row after artifact_reaper_max_attempts
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
@@ -72,6 +72,17 @@ class STP_Catchment(Base):
     Drain_No: Mapped[int] = mapped_column(ForeignKey("stp_drain.Drain_No"), nullable=False)
     drains: Mapped[List["STP_Drain"]] = relationship(back_populates="catchment")
     
+class STP_Catchment_Village(Base):
+    __tablename__ = "stp_catchment_village"
+    __table_args__ = (sa.Index("ix_stp_catchment_village_version_drain", "version", "Drain_No"),)
+
+    Drain_No: Mapped[int] = mapped_column(ForeignKey("stp_drain.Drain_No"), nullable=False)
+    village_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    village_name: Mapped[str] = mapped_column(String, nullable=False)
+    intersect_area: Mapped[float] = mapped_column(Float, nullable=False)
+    area_fraction: Mapped[float] = mapped_column(Float, nullable=False)
+    version: Mapped[int] = mapped_column(Integer, nullable=False)
+    
 class STP_raster(Base):
     __tablename__='stp_priority_raster'
     file_name:Mapped[str]=mapped_column(String,nullable=False)
@@ -1,6 +1,13 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import app_router
+from app.api.service.layer_registry import layer_registry
+from app.api.service.network.network_conf import GeoConfig
+from app.api.service.catchment_index import get_catchment_index
+from app.api.service.network.geoserver_client import close_geoserver_sessions
+from app.api.service.artifact_reaper import artifact_reaper
+from app.api.service.stp_operation import register_env_styles
+import asyncio
 
 app = FastAPI(title="Decision support system", version="1.0.0")
 
@@ -17,3 +24,42 @@ app.include_router(
     app_router,
     prefix="/api",
 )
+
+
+@app.on_event("startup")
+def preload_vector_layers():
+    config = GeoConfig()
+    layer_registry.preload([
+        (config.villages_shapefile, "EPSG:32644"),
+        (config.villages_shapefile, "EPSG:32643"),
+        (config.cachement_shapefile, "EPSG:32643"),
+        (config.town_shapefile, "EPSG:32644"),
+        (config.basin_shapefile, "EPSG:32644"),
+    ])
+    try:
+        get_catchment_index(config).refresh()
+    except Exception as e:
+        print(f"Could not build catchment index: {e}")
+    if config.use_env_styles:
+        try:
+            register_env_styles(config)
+        except Exception as e:
+            print(f"Could not register env styles: {e}")
+
+
+@app.on_event("startup")
+async def start_artifact_reaper():
+    if artifact_reaper.config.artifact_reaper_enabled:
+        app.state.artifact_reaper_task = asyncio.create_task(artifact_reaper.run_forever())
+
+
+@app.on_event("shutdown")
+async def stop_artifact_reaper():
+    task = getattr(app.state, "artifact_reaper_task", None)
+    if task is not None:
+        task.cancel()
+
+
+@app.on_event("shutdown")
+def close_geoserver_connections():
+    close_geoserver_sessions()
@@ -0,0 +1,115 @@
+import sys
+import os
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+import argparse
+import functools
+import time
+from collections import defaultdict
+from app.api.service.network.network_conf import GeoConfig
+from tests.fakes.fake_geoserver import FakeGeoserver
+from app.api.service import stp_operation
+from app.api.service.stp_operation import STPPriorityMapper, STPProcessor, RasterProcess
+from app.api.service.geoserver import Geoserver
+
+# End-to-end benchmark of STPPriorityMapper.create_priority_map against the in-process
+# FakeGeoserver, so raster and publishing changes can be timed without a live GeoServer.
+#
+#   python script/bench_priority_map.py --raster a.tif:0.4 --raster b.tif:0.6 --runs 5 --latency 0.02
+#
+# Without --raster every row of stp_priority_raster is used with its stored weight.
+
+stages = [
+    (STPProcessor, "align_rasters"),
+    (STPProcessor, "weighted_sum"),
+    (STPProcessor, "constrain"),
+    (STPProcessor, "create_tiled_overlay"),
+    (STPProcessor, "clip_array_to_basin"),
+    (STPProcessor, "clip_to_user"),
+    (STPProcessor, "clip_array_to_user"),
+    (STPProcessor, "clip_details"),
+    (STPProcessor, "array_details"),
+    (STPProcessor, "classify"),
+    (STPProcessor, "write_raster"),
+    (RasterProcess, "processRaster"),
+    (RasterProcess, "env_style"),
+    (Geoserver, "publish_raster"),
+    (Geoserver, "apply_sld_to_layer"),
+    (Geoserver, "ensure_style"),
+]
+timings = defaultdict(list)
+
+
+def timed(name, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings[name].append(time.perf_counter() - start)
+    return wrapper
+
+
+def instrument():
+    for owner, attr in stages:
+        setattr(owner, attr, timed(f"{owner.__name__}.{attr}", getattr(owner, attr)))
+    # The artifact registry needs the database, which is not what is being measured
+    stp_operation.artifact_reaper.record = lambda artifacts: None
+
+
+def load_rasters(specs):
+    if specs:
+        pairs = [spec.rsplit(":", 1) for spec in specs]
+        return [os.path.abspath(path) for path, _ in pairs], [float(weight) for _, weight in pairs]
+    from app.conf.settings import Settings
+    from app.database.config.session import SessionLocal
+    from app.database.crud.stp_crud import STP_priority_crud
+    db = SessionLocal()
+    try:
+        rows = STP_priority_crud(db).get_all(True)
+        return [os.path.abspath(Settings().BASE_DIR + "/" + i.file_path) for i in rows], [float(i.weight) for i in rows]
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time create_priority_map against an in-process fake GeoServer")
+    parser.add_argument("--raster", action="append", help="raster path and weight as PATH:WEIGHT")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every REST call")
+    parser.add_argument("--bandwidth", type=float, default=None, help="simulated upload bytes per second")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of REST calls answered with 503")
+    parser.add_argument("--clip", type=int, action="append", help="subdistrict code to clip to")
+    parser.add_argument("--place", default=None)
+    parser.add_argument("--class-scheme", default="equal", choices=["equal", "quantile", "jenks"])
+    args = parser.parse_args()
+
+    config = GeoConfig()
+    fake = FakeGeoserver.install(config, latency=args.latency, bandwidth=args.bandwidth,
+                                 failure_rate=args.failure_rate, seed=0)
+    instrument()
+    raster_paths, weights = load_rasters(args.raster)
+
+    totals = []
+    for run in range(args.runs):
+        start = time.perf_counter()
+        result = STPPriorityMapper(config).create_priority_map(raster_paths, weights, clip=args.clip, place=args.place,
+                                                                  class_scheme=args.class_scheme)
+        totals.append(time.perf_counter() - start)
+        print(f"run {run + 1}: {totals[-1]:.3f}s {'ok' if result else 'FAILED'}")
+        if result and result.get("csv_path") and os.path.exists(result["csv_path"]):
+            os.remove(result["csv_path"])
+
+    print(f"\n{'stage':<40}{'calls':>7}{'mean s':>10}{'total s':>10}")
+    for name, values in timings.items():
+        print(f"{name:<40}{len(values):>7}{sum(values) / len(values):>10.3f}{sum(values):>10.3f}")
+    print(f"{'create_priority_map':<40}{len(totals):>7}{sum(totals) / len(totals):>10.3f}{sum(totals):>10.3f}")
+
+    print(f"\n{'REST route':<100}{'calls':>7}{'total s':>10}{'MB sent':>10}")
+    for route, values in fake.report().items():
+        print(f"{route:<100}{values['calls']:>7}{values['seconds']:>10.3f}{values['bytes'] / 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
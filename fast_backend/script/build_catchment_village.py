@@ -0,0 +1,52 @@
+import sys
+import os
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+import geopandas as gpd
+from app.api.service.network.network_conf import GeoConfig
+from app.database.config.session import SessionLocal
+from app.database.crud.stp_crud import Stp_catchment_village_crud
+from app.database.models import STP_Drain
+
+# Offline build of the Drain_No -> village lookup served by /stp/get_cachement_villages_bulk.
+# Rerun whenever Catchment.shp or STP_Village.shp changes; every run writes a new version
+# and drops the older ones in the same transaction.
+projected_crs = "EPSG:32643"
+
+
+def build_rows(config: GeoConfig, known_drains: set):
+    catchments = gpd.read_file(config.cachement_shapefile).to_crs(projected_crs)
+    villages = gpd.read_file(config.villages_shapefile).to_crs(projected_crs)
+    catchments = catchments[catchments["Drain_No"].isin(known_drains)]
+
+    catchment_pos, village_pos = villages.sindex.query(catchments.geometry, predicate="intersects")
+    catchment_geoms = catchments.geometry.iloc[catchment_pos].reset_index(drop=True)
+    village_geoms = villages.geometry.iloc[village_pos].reset_index(drop=True)
+    intersect_area = catchment_geoms.intersection(village_geoms).area.to_numpy()
+    village_area = village_geoms.area.to_numpy()
+
+    rows = []
+    for i in range(len(catchment_pos)):
+        village = villages.iloc[village_pos[i]]
+        rows.append({
+            "Drain_No": int(catchments["Drain_No"].iloc[catchment_pos[i]]),
+            "village_id": int(village["ID"]),
+            "village_name": str(village["Name"]),
+            "intersect_area": float(intersect_area[i]),
+            "area_fraction": float(intersect_area[i] / village_area[i]) if village_area[i] > 0 else 0.0,
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        known_drains = {d for (d,) in db.query(STP_Drain.Drain_No).all()}
+        rows = build_rows(GeoConfig(), known_drains)
+        version = Stp_catchment_village_crud(db).replace_all(rows)
+        print(f"catchment village lookup version {version}: {len(rows)} rows")
+    except Exception as e:
+        db.rollback()
+        print(e)
+    finally:
+        db.close()
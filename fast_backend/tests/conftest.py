@@ -0,0 +1,24 @@
+import os
+import sys
+import tempfile
+
+# Tests import the service modules as the app does, from the fast_backend root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings are read when the app modules are imported; tests never reach a real
+# GeoServer or database, and write their temp files outside the deploy paths
+_scratch = tempfile.mkdtemp(prefix="fast_backend_tests_")
+for key, value in {
+    "GEOSERVER_URL": "http://geoserver.test/geoserver",
+    "GEOSERVER_USERNAME": "admin",
+    "GEOSERVER_PASSWORD": "geoserver",
+    "GEOSERVER_EX_URL": "http://geoserver.test/geoserver",
+    "GEOSERVER_SHARED_DIR": os.path.join(_scratch, "shared"),
+    "POSTGRES_DB": "test",
+    "POSTGRES_HOST": "localhost",
+    "POSTGRES_USER": "test",
+    "POSTGRES_PASSWORD": "test",
+    "POSTGRES_PORT": "5432",
+    "BASE_DIR": _scratch,
+}.items():
+    os.environ.setdefault(key, value)
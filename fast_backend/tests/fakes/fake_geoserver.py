@@ -0,0 +1,345 @@
+import io
+import json
+import posixpath
+import random
+import re
+import threading
+import time
+import zipfile
+from collections import defaultdict
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlsplit
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from app.api.service.network.geoserver_client import get_catalog_cache, get_geoserver_session
+from app.api.service.network.network_conf import GeoConfig
+
+
+class FakeGeoserver(BaseAdapter):
+    """In-process stand-in for the part of the GeoServer REST/WCS API the app calls.
+
+    It is a requests transport adapter, so ``install`` mounts it on the shared
+    GeoServer session and ``Geoserver``, ``AsyncGeoserver`` and
+    ``geoserver_svc`` talk to it unchanged. Workspaces, coverage and data
+    stores, coverages, feature types, styles and mosaic granules are kept in
+    dicts; uploaded rasters are kept as bytes so WCS GetCoverage returns them.
+
+    Every call sleeps ``latency`` seconds plus its body size over
+    ``bandwidth`` bytes/s. ``failure_rate`` makes a random share of calls
+    answer 503, and ``fail_next`` queues specific failures. Per-route call
+    counts and time are kept in ``stats``.
+    """
+
+    def __init__(self, latency: float = 0.0, bandwidth: float = None, failure_rate: float = 0.0, seed: int = None):
+        super().__init__()
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._failures: List[list] = []
+        self.workspaces = set()
+        self.coverage_stores: Dict[Tuple[str, str], dict] = {}
+        self.data_stores: Dict[Tuple[str, str], dict] = {}
+        self.styles: Dict[Tuple[str, str], str] = {}
+        self.layers: Dict[Tuple[str, str], dict] = {}
+        self.stats = defaultdict(lambda: {"calls": 0, "seconds": 0.0, "bytes": 0})
+        self._routes = [
+            ("GET", r"/rest/workspaces/(?P<ws>[^/]+)", self._get_workspace),
+            ("POST", r"/rest/workspaces", self._create_workspace),
+            ("PUT", r"/rest/services/wms/workspaces/(?P<ws>[^/]+)/settings", self._ok),
+            ("GET", r"/rest/workspaces/(?P<ws>[^/]+)/coveragestores/(?P<store>[^/]+)", self._get_coverage_store),
+            ("DELETE", r"/rest/workspaces/(?P<ws>[^/]+)/coveragestores/(?P<store>[^/]+)", self._delete_coverage_store),
+            ("PUT", r"/rest/workspaces/(?P<ws>[^/]+)/coveragestores/(?P<store>[^/]+)/(?P<how>file|external)\.geotiff",
+             self._put_geotiff),
+            ("PUT", r"/rest/workspaces/(?P<ws>[^/]+)/coveragestores/(?P<store>[^/]+)/(?P<how>file|external)\.imagemosaic",
+             self._create_mosaic),
+            ("POST", r"/rest/workspaces/(?P<ws>[^/]+)/coveragestores/(?P<store>[^/]+)/(?P<how>file|external)\.imagemosaic",
+             self._harvest_granule),
+            ("GET", r"/rest/workspaces/(?P<ws>[^/]+)/coveragestores/(?P<store>[^/]+)/coverages", self._list_coverages),
+            ("POST", r"/rest/workspaces/(?P<ws>[^/]+)/coveragestores/(?P<store>[^/]+)/coverages", self._create_coverage),
+            ("PUT", r"/rest/workspaces/(?P<ws>[^/]+)/coveragestores/(?P<store>[^/]+)/coverages/(?P<name>[^/]+)",
+             self._update_coverage),
+            ("DELETE", r"/rest/workspaces/(?P<ws>[^/]+)/coveragestores/(?P<store>[^/]+)/coverages/[^/]+/index/granules",
+             self._delete_granules),
+            ("POST", r"/rest/workspaces/(?P<ws>[^/]+)/styles", self._create_style),
+            ("GET", r"/rest/workspaces/(?P<ws>[^/]+)/styles/(?P<name>[^/]+)", self._get_style),
+            ("PUT", r"/rest/workspaces/(?P<ws>[^/]+)/styles/(?P<name>[^/]+)", self._put_style),
+            ("DELETE", r"/rest/workspaces/(?P<ws>[^/]+)/styles/(?P<name>[^/]+)", self._delete_style),
+            ("PUT", r"/rest/workspaces/(?P<ws>[^/]+)/layers/(?P<name>[^/]+)", self._put_layer),
+            ("GET", r"/rest/workspaces/(?P<ws>[^/]+)/datastores/(?P<store>[^/]+)", self._get_data_store),
+            ("POST", r"/rest/workspaces/(?P<ws>[^/]+)/datastores", self._create_data_store),
+            ("PUT", r"/rest/workspaces/(?P<ws>[^/]+)/datastores/(?P<store>[^/]+)/file\.shp", self._put_shapefile),
+            ("DELETE", r"/rest/workspaces/(?P<ws>[^/]+)/datastores/(?P<store>[^/]+)/featuretypes/(?P<name>[^/]+)",
+             self._delete_feature_type),
+            ("GET", r"/wcs", self._get_coverage),
+        ]
+
+    # Setup and inspection
+
+    @classmethod
+    def install(cls, config: GeoConfig = None, **kwargs) -> "FakeGeoserver":
+        """Mount a new fake on the shared session for ``config.geoserver_url``."""
+        config = config or GeoConfig()
+        fake = cls(**kwargs)
+        get_geoserver_session(config).mount(config.geoserver_url.rstrip("/"), fake)
+        get_catalog_cache(config).clear()
+        return fake
+
+    def fail_next(self, method: str, path_pattern: str, status: int = 503, times: int = 1) -> None:
+        """Answer the next ``times`` calls matching ``method`` and ``path_pattern`` with ``status``."""
+        with self._lock:
+            self._failures.append([method.upper(), re.compile(path_pattern), status, times])
+
+    def report(self) -> Dict[str, dict]:
+        with self._lock:
+            return {route: dict(values) for route, values in sorted(self.stats.items())}
+
+    # Transport
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        start = time.perf_counter()
+        body = self._read_body(request.body)
+        parts = urlsplit(request.url)
+        path = parts.path.rstrip("/")
+        # GeoServer lives under a context path such as /geoserver
+        path = path[path.find("/rest"):] if "/rest" in path else path[path.rfind("/"):]
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+
+        handler, params, route = self._match(request.method, path)
+        delay = self.latency + (len(body) / self.bandwidth if self.bandwidth else 0.0)
+        if delay:
+            time.sleep(delay)
+        status = self._injected_failure(request.method, path)
+        if status is not None:
+            response = self._response(request, status, f"Injected failure {status}")
+        elif handler is None:
+            response = self._response(request, 404, f"No such resource: {request.method} {path}")
+        else:
+            with self._lock:
+                response = self._response(request, *handler(params, query, body))
+
+        with self._lock:
+            entry = self.stats[f"{request.method} {route or path}"]
+            entry["calls"] += 1
+            entry["seconds"] += time.perf_counter() - start
+            entry["bytes"] += len(body)
+        return response
+
+    def close(self):
+        pass
+
+    def _read_body(self, body) -> bytes:
+        if body is None:
+            return b""
+        if isinstance(body, str):
+            return body.encode("utf-8")
+        if isinstance(body, bytes):
+            return body
+        chunks = []
+        while True:
+            chunk = body.read(1024 * 1024)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    def _match(self, method: str, path: str):
+        for route_method, pattern, handler in self._routes:
+            if route_method != method:
+                continue
+            matched = re.fullmatch(pattern, path)
+            if matched:
+                return handler, matched.groupdict(), pattern
+        return None, {}, None
+
+    def _injected_failure(self, method: str, path: str):
+        with self._lock:
+            for failure in self._failures:
+                if failure[0] == method and failure[1].search(path):
+                    failure[3] -= 1
+                    if failure[3] <= 0:
+                        self._failures.remove(failure)
+                    return failure[2]
+            if self.failure_rate and self._random.random() < self.failure_rate:
+                return 503
+        return None
+
+    def _response(self, request, status: int, content=b"", content_type: str = "text/plain"):
+        response = requests.Response()
+        response.status_code = status
+        response.request = request
+        response.url = request.url
+        response.reason = "OK" if status < 400 else "Error"
+        if isinstance(content, (dict, list)):
+            content, content_type = json.dumps(content), "application/json"
+        response._content = content.encode("utf-8") if isinstance(content, str) else content
+        response.headers = CaseInsensitiveDict({"Content-Type": content_type})
+        response.encoding = "utf-8"
+        return response
+
+    # Handlers return (status, content[, content type]) and run under the lock
+
+    def _ok(self, params, query, body):
+        return 200, ""
+
+    def _get_workspace(self, params, query, body):
+        return (200, {"workspace": {"name": params["ws"]}}) if params["ws"] in self.workspaces else (404, "")
+
+    def _create_workspace(self, params, query, body):
+        name = json.loads(body)["workspace"]["name"]
+        if name in self.workspaces:
+            return 409, f"Workspace '{name}' already exists"
+        self.workspaces.add(name)
+        return 201, name
+
+    def _get_coverage_store(self, params, query, body):
+        key = (params["ws"], params["store"])
+        return (200, {"coverageStore": {"name": params["store"]}}) if key in self.coverage_stores else (404, "")
+
+    def _delete_coverage_store(self, params, query, body):
+        store = self.coverage_stores.pop((params["ws"], params["store"]), None)
+        if store is None:
+            return 404, ""
+        for coverage in store["coverages"]:
+            self.layers.pop((params["ws"], coverage), None)
+        return 200, ""
+
+    def _put_geotiff(self, params, query, body):
+        if params["ws"] not in self.workspaces:
+            return 404, f"Workspace '{params['ws']}' not found"
+        self.coverage_stores[(params["ws"], params["store"])] = {
+            "data": body if params["how"] == "file" else None,
+            "url": body.decode("utf-8") if params["how"] == "external" else None,
+            "coverages": [],
+            "granules": {},
+        }
+        return 201, ""
+
+    def _granule_ids(self, how, body) -> List[str]:
+        # Granules are "<request_id>.tif", sent inside a zip or referenced by file URL
+        if how == "external":
+            path = body.decode("utf-8")
+            names = [path] if path.endswith(".tif") else []
+        else:
+            with zipfile.ZipFile(io.BytesIO(body)) as zipf:
+                names = [name for name in zipf.namelist() if name.endswith(".tif")]
+        return [posixpath.basename(name)[:-len(".tif")] for name in names]
+
+    def _create_mosaic(self, params, query, body):
+        if params["ws"] not in self.workspaces:
+            return 404, f"Workspace '{params['ws']}' not found"
+        self.coverage_stores[(params["ws"], params["store"])] = {
+            "data": None, "url": None, "coverages": [params["store"]],
+            "granules": {request_id: len(body) for request_id in self._granule_ids(params["how"], body)},
+        }
+        self.layers[(params["ws"], params["store"])] = {"store": params["store"], "style": None}
+        return 201, ""
+
+    def _harvest_granule(self, params, query, body):
+        store = self.coverage_stores.get((params["ws"], params["store"]))
+        if store is None:
+            return 404, ""
+        for request_id in self._granule_ids(params["how"], body):
+            store["granules"][request_id] = len(body)
+        return 202, ""
+
+    def _delete_granules(self, params, query, body):
+        store = self.coverage_stores.get((params["ws"], params["store"]))
+        if store is None:
+            return 404, ""
+        request_id = re.search(r"request='([^']*)'", query.get("filter", ""))
+        if request_id:
+            store["granules"].pop(request_id.group(1), None)
+        return 200, ""
+
+    def _list_coverages(self, params, query, body):
+        store = self.coverage_stores.get((params["ws"], params["store"]))
+        if store is None:
+            return 404, ""
+        return 200, {"coverages": {"coverage": [{"name": name} for name in store["coverages"]]}}
+
+    def _create_coverage(self, params, query, body):
+        store = self.coverage_stores.get((params["ws"], params["store"]))
+        if store is None:
+            return 404, ""
+        name = json.loads(body)["coverage"]["name"]
+        store["coverages"].append(name)
+        self.layers[(params["ws"], name)] = {"store": params["store"], "style": None}
+        return 201, name
+
+    def _update_coverage(self, params, query, body):
+        return (200, "") if (params["ws"], params["store"]) in self.coverage_stores else (404, "")
+
+    def _create_style(self, params, query, body):
+        name = json.loads(body)["style"]["name"]
+        if (params["ws"], name) in self.styles:
+            return 403, f"Style '{name}' already exists"
+        self.styles[(params["ws"], name)] = ""
+        return 201, name
+
+    def _get_style(self, params, query, body):
+        key = (params["ws"], params["name"])
+        return (200, {"style": {"name": params["name"]}}) if key in self.styles else (404, "")
+
+    def _put_style(self, params, query, body):
+        key = (params["ws"], params["name"])
+        if key not in self.styles:
+            return 404, ""
+        self.styles[key] = body.decode("utf-8")
+        return 200, ""
+
+    def _delete_style(self, params, query, body):
+        key = (params["ws"], params["name"])
+        if key not in self.styles:
+            return 404, ""
+        if query.get("recurse") != "true" and any(
+            layer["style"] == params["name"] for (ws, _), layer in self.layers.items() if ws == params["ws"]
+        ):
+            return 403, f"Style '{params['name']}' is in use"
+        del self.styles[key]
+        return 200, ""
+
+    def _put_layer(self, params, query, body):
+        layer = self.layers.get((params["ws"], params["name"]))
+        if layer is None:
+            return 404, ""
+        style = json.loads(body)["layer"]["defaultStyle"]["name"]
+        if (params["ws"], style) not in self.styles:
+            return 400, f"No such style: {style}"
+        layer["style"] = style
+        return 200, ""
+
+    def _get_data_store(self, params, query, body):
+        key = (params["ws"], params["store"])
+        return (200, {"dataStore": {"name": params["store"]}}) if key in self.data_stores else (404, "")
+
+    def _create_data_store(self, params, query, body):
+        if params["ws"] not in self.workspaces:
+            return 404, ""
+        name = json.loads(body)["dataStore"]["name"]
+        self.data_stores[(params["ws"], name)] = {"feature_types": {}}
+        return 201, name
+
+    def _put_shapefile(self, params, query, body):
+        store = self.data_stores.get((params["ws"], params["store"]))
+        if store is None:
+            return 404, ""
+        store["feature_types"][query.get("name", params["store"])] = len(body)
+        return 201, ""
+
+    def _delete_feature_type(self, params, query, body):
+        store = self.data_stores.get((params["ws"], params["store"]))
+        if store is None or store["feature_types"].pop(params["name"], None) is None:
+            return 404, ""
+        return 200, ""
+
+    def _get_coverage(self, params, query, body):
+        coverage_id = query.get("coverageId", "")
+        workspace, _, name = coverage_id.rpartition(":")
+        for (ws, layer_name), layer in self.layers.items():
+            if layer_name == name and (not workspace or ws == workspace):
+                data = self.coverage_stores[(ws, layer["store"])]["data"]
+                if data is not None:
+                    return 200, data, "image/tiff"
+        return 404, f"Could not find coverage {coverage_id}"
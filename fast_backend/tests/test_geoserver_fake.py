@@ -0,0 +1,209 @@
+import uuid
+from types import SimpleNamespace
+import pytest
+from app.api.service.network.network_conf import GeoConfig
+from app.api.service.geoserver import Geoserver
+from app.api.service.artifact_reaper import ArtifactReaper
+from tests.fakes.fake_geoserver import FakeGeoserver
+
+WS = "raster_work"
+
+
+@pytest.fixture
+def config():
+    return GeoConfig()
+
+
+@pytest.fixture
+def fake(config):
+    return FakeGeoserver.install(config)
+
+
+@pytest.fixture
+def geo(config, fake):
+    return Geoserver(config)
+
+
+@pytest.fixture
+def raster(tmp_path):
+    path = tmp_path / "priority_layer.tif"
+    path.write_bytes(b"II*\x00fake tiff")
+    return path
+
+
+def sld(tmp_path, name="style.sld", body="<StyledLayerDescriptor/>"):
+    path = tmp_path / name
+    path.write_text(body)
+    return str(path)
+
+
+# publish_raster
+
+def test_publish_raster_creates_workspace_store_and_layer(geo, fake, raster):
+    assert geo.publish_raster(WS, "store_a", str(raster)) == (True, "priority_layer")
+    assert WS in fake.workspaces
+    assert fake.coverage_stores[(WS, "store_a")]["data"] == raster.read_bytes()
+    assert fake.layers[(WS, "priority_layer")]["store"] == "store_a"
+
+
+def test_publish_raster_replaces_reused_store(geo, fake, raster, tmp_path):
+    geo.publish_raster(WS, "store_a", str(raster))
+    other = tmp_path / "other_layer.tif"
+    other.write_bytes(b"II*\x00other")
+    assert geo.publish_raster(WS, "store_a", str(other)) == (True, "other_layer")
+    assert fake.coverage_stores[(WS, "store_a")]["coverages"] == ["other_layer"]
+    assert (WS, "priority_layer") not in fake.layers
+
+
+def test_publish_raster_recreates_workspace_removed_behind_cache(geo, fake, raster, tmp_path):
+    geo.publish_raster(WS, "store_a", str(raster))
+    # Deleted by hand while the catalog cache still lists it: the upload 404s once
+    fake.workspaces.discard(WS)
+    assert geo.publish_raster(WS, "store_b", str(raster)) == (True, "priority_layer")
+    assert WS in fake.workspaces
+
+
+def test_publish_raster_failed_upload_returns_false_and_forgets_store(geo, fake, raster):
+    fake.fail_next("PUT", r"/coveragestores/store_a/file\.geotiff", status=500)
+    assert geo.publish_raster(WS, "store_a", str(raster)) is False
+    assert (WS, "store_a") not in fake.coverage_stores
+    assert geo.catalog.get(("store", WS, "store_a")) is None
+    assert geo.publish_raster(WS, "store_a", str(raster)) == (True, "priority_layer")
+
+
+# apply_sld_to_layer
+
+def test_apply_sld_uploads_style_and_sets_default(geo, fake, raster, tmp_path):
+    geo.publish_raster(WS, "store_a", str(raster))
+    assert geo.apply_sld_to_layer(WS, "priority_layer", sld(tmp_path, body="<a/>"), "style_a")
+    assert fake.styles[(WS, "style_a")] == "<a/>"
+    assert fake.layers[(WS, "priority_layer")]["style"] == "style_a"
+
+
+def test_apply_sld_recreates_style_when_upload_404s(geo, fake, raster, tmp_path):
+    geo.publish_raster(WS, "store_a", str(raster))
+    fake.fail_next("PUT", r"/styles/style_a$", status=404)
+    assert geo.apply_sld_to_layer(WS, "priority_layer", sld(tmp_path, body="<a/>"), "style_a")
+    assert fake.styles[(WS, "style_a")] == "<a/>"
+    assert fake.layers[(WS, "priority_layer")]["style"] == "style_a"
+
+
+def test_apply_sld_style_upload_failure_returns_false(geo, fake, raster, tmp_path):
+    geo.publish_raster(WS, "store_a", str(raster))
+    fake.fail_next("PUT", r"/styles/style_a$", status=500)
+    assert geo.apply_sld_to_layer(WS, "priority_layer", sld(tmp_path), "style_a") is False
+    assert fake.layers[(WS, "priority_layer")]["style"] is None
+
+
+def test_apply_sld_reuse_skips_upload_of_known_style(geo, fake, raster, tmp_path):
+    geo.publish_raster(WS, "store_a", str(raster))
+    path = sld(tmp_path)
+    assert geo.apply_sld_to_layer(WS, "priority_layer", path, "shared_style", reuse_style=True)
+    uploads = fake.report()["PUT /rest/workspaces/(?P<ws>[^/]+)/styles/(?P<name>[^/]+)"]["calls"]
+    assert geo.apply_sld_to_layer(WS, "priority_layer", path, "shared_style", reuse_style=True)
+    assert fake.report()["PUT /rest/workspaces/(?P<ws>[^/]+)/styles/(?P<name>[^/]+)"]["calls"] == uploads
+
+
+def test_apply_sld_reuse_reuploads_style_reaped_behind_cache(geo, fake, raster, tmp_path):
+    geo.publish_raster(WS, "store_a", str(raster))
+    path = sld(tmp_path, body="<shared/>")
+    assert geo.apply_sld_to_layer(WS, "priority_layer", path, "shared_style", reuse_style=True)
+    # Another worker's reaper deletes the style; this worker's catalog cache still lists it
+    del fake.styles[(WS, "shared_style")]
+    assert geo.apply_sld_to_layer(WS, "priority_layer", path, "shared_style", reuse_style=True)
+    assert fake.styles[(WS, "shared_style")] == "<shared/>"
+    assert fake.layers[(WS, "priority_layer")]["style"] == "shared_style"
+
+
+def test_apply_sld_reuse_gives_up_after_one_retry(geo, fake, raster, tmp_path):
+    geo.publish_raster(WS, "store_a", str(raster))
+    fake.fail_next("PUT", r"/layers/priority_layer$", status=500, times=2)
+    assert geo.apply_sld_to_layer(WS, "priority_layer", sld(tmp_path), "shared_style", reuse_style=True) is False
+
+
+# publish_granule
+
+def test_publish_granule_creates_mosaic_then_harvests(geo, fake, raster, tmp_path):
+    first, second = uuid.uuid4().hex, uuid.uuid4().hex
+    path = sld(tmp_path, body="<mosaic/>")
+    assert geo.publish_granule(WS, "stp_mosaic_a", str(raster), first, path, "mosaic_style") == (True, "stp_mosaic_a")
+    assert fake.layers[(WS, "stp_mosaic_a")]["style"] == "mosaic_style"
+    assert geo.publish_granule(WS, "stp_mosaic_a", str(raster), second) == (True, "stp_mosaic_a")
+    assert set(fake.coverage_stores[(WS, "stp_mosaic_a")]["granules"]) == {first, second}
+
+
+def test_publish_granule_failed_harvest_returns_false_and_recovers(geo, fake, raster):
+    first, second = uuid.uuid4().hex, uuid.uuid4().hex
+    geo.publish_granule(WS, "stp_mosaic_a", str(raster), first)
+    fake.fail_next("POST", r"/coveragestores/stp_mosaic_a/file\.imagemosaic", status=500)
+    assert geo.publish_granule(WS, "stp_mosaic_a", str(raster), second) is False
+    assert geo.catalog.get(("mosaic", WS, "stp_mosaic_a")) is None
+    assert geo.publish_granule(WS, "stp_mosaic_a", str(raster), second) == (True, "stp_mosaic_a")
+    assert set(fake.coverage_stores[(WS, "stp_mosaic_a")]["granules"]) == {first, second}
+
+
+def test_publish_granule_failed_mosaic_creation_returns_false(geo, fake, raster):
+    fake.fail_next("PUT", r"/coveragestores/stp_mosaic_a/file\.imagemosaic", status=500)
+    assert geo.publish_granule(WS, "stp_mosaic_a", str(raster), uuid.uuid4().hex) is False
+    assert (WS, "stp_mosaic_a") not in fake.coverage_stores
+
+
+# ArtifactReaper._delete
+
+def artifact(kind, name, store=None, local_path=None):
+    return SimpleNamespace(kind=kind, workspace=WS, name=name, store=store, local_path=local_path)
+
+
+@pytest.fixture
+def reaper(config, geo):
+    return ArtifactReaper(config, geo)
+
+
+def test_reaper_deletes_store_and_local_file(reaper, geo, fake, raster, tmp_path):
+    geo.publish_raster(WS, "store_a", str(raster))
+    local = tmp_path / "published.tif"
+    local.write_bytes(b"x")
+    assert reaper._delete(artifact("coverage_store", "store_a", local_path=str(local)))
+    assert (WS, "store_a") not in fake.coverage_stores
+    assert (WS, "priority_layer") not in fake.layers
+    assert not local.exists()
+
+
+def test_reaper_counts_missing_artifact_as_gone(reaper):
+    assert reaper._delete(artifact("coverage_store", "never_published"))
+    assert reaper._delete(artifact("style", "never_published"))
+
+
+def test_reaper_failed_delete_keeps_local_file(reaper, geo, fake, raster, tmp_path):
+    geo.publish_raster(WS, "store_a", str(raster))
+    local = tmp_path / "published.tif"
+    local.write_bytes(b"x")
+    fake.fail_next("DELETE", r"/coveragestores/store_a$", status=500)
+    assert reaper._delete(artifact("coverage_store", "store_a", local_path=str(local))) is False
+    assert (WS, "store_a") in fake.coverage_stores
+    assert local.exists()
+
+
+def test_reaper_deletes_style_still_set_on_a_layer(reaper, geo, fake, raster, tmp_path):
+    geo.publish_raster(WS, "store_a", str(raster))
+    geo.apply_sld_to_layer(WS, "priority_layer", sld(tmp_path), "style_a")
+    assert reaper._delete(artifact("style", "style_a"))
+    assert (WS, "style_a") not in fake.styles
+    assert geo.catalog.get(("style", WS, "style_a")) is None
+
+
+def test_reaper_deletes_only_its_granule(reaper, geo, fake, raster):
+    first, second = uuid.uuid4().hex, uuid.uuid4().hex
+    geo.publish_granule(WS, "stp_mosaic_a", str(raster), first)
+    geo.publish_granule(WS, "stp_mosaic_a", str(raster), second)
+    assert reaper._delete(artifact("granule", first, store="stp_mosaic_a"))
+    assert set(fake.coverage_stores[(WS, "stp_mosaic_a")]["granules"]) == {second}
+
+
+def test_reaper_deletes_feature_type(reaper, fake):
+    fake.workspaces.add("vector_work")
+    fake.data_stores[("vector_work", "stp_vector_store")] = {"feature_types": {"villages": 1}}
+    shapefile = SimpleNamespace(kind="feature_type", workspace="vector_work", name="villages",
+                                store="stp_vector_store", local_path=None)
+    assert reaper._delete(shapefile)
+    assert fake.data_stores[("vector_work", "stp_vector_store")]["feature_types"] == {}
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from app.api.service.raster_stats import RasterHistogram
+
+
+def histogram(values, bins=1024):
+    return RasterHistogram.from_array(np.ma.masked_invalid(np.asarray(values, dtype=np.float64)), bins)
+
+
+def classes(values, breaks):
+    return list(np.digitize(values, breaks[1:-1]) + 1)
+
+
+@pytest.mark.parametrize("scheme", ["equal", "quantile", "jenks"])
+def test_flat_band_gives_equal_edges(scheme):
+    assert histogram([3.0] * 10).breaks(scheme, 5) == [3.0] * 6
+
+
+def test_nodata_is_ignored():
+    h = histogram([1.0, np.nan, 2.0, np.nan])
+    assert (h.min, h.max, h.count) == (1.0, 2.0, 2)
+
+
+def test_empty_band_raises():
+    with pytest.raises(ValueError):
+        histogram([np.nan, np.nan])
+
+
+def test_unknown_scheme_raises():
+    with pytest.raises(ValueError):
+        histogram([0.0, 1.0]).breaks("natural", 5)
+
+
+def test_equal_breaks_clamp_only_the_equal_scheme():
+    h = histogram([0.0, 0.25, 0.5])
+    assert h.breaks("equal", 5) == pytest.approx([0.0, 0.1, 0.2, 0.3, 0.4, 0.5])
+    assert h.breaks("equal", 5, min_upper=1.0) == pytest.approx([0.0, 0.2, 0.4, 0.6, 0.8, 1.0])
+    assert h.breaks("quantile", 2, min_upper=1.0)[-1] == 0.5
+    assert h.breaks("jenks", 2, min_upper=1.0)[-1] == 0.5
+
+
+def test_equal_breaks_of_a_flat_band_below_the_clamp_span_to_it():
+    assert histogram([0.5] * 4).breaks("equal", 5, min_upper=1.0) == pytest.approx(np.linspace(0.5, 1.0, 6))
+
+
+def test_quantile_breaks_match_numpy_within_one_bin():
+    values = np.arange(1000, dtype=np.float64)
+    breaks = histogram(values).breaks("quantile", 5)
+    bin_width = 999 / 1024
+    assert breaks == pytest.approx(list(np.quantile(values, np.linspace(0, 1, 6))), abs=bin_width)
+
+
+def test_quantile_breaks_split_skewed_data_evenly():
+    values = np.concatenate([np.zeros(800), np.linspace(1, 100, 200)])
+    breaks = histogram(values).breaks("quantile", 5)
+    counts = np.bincount(classes(values, breaks), minlength=6)[1:]
+    # Ties at 0 cannot be split, so the first 4 quantiles land in the zero bin
+    assert breaks[0] == 0.0 and breaks[-1] == 100.0
+    assert counts[-1] == 200
+
+
+def test_jenks_separates_known_clusters():
+    values = [1, 2, 3, 10, 11, 12, 20, 21, 22]
+    breaks = histogram(values).breaks("jenks", 3)
+    assert len(breaks) == 4
+    assert breaks[0] == 1 and breaks[-1] == 22
+    assert 3 < breaks[1] <= 10 and 12 < breaks[2] <= 20
+    assert classes(values, breaks) == [1, 1, 1, 2, 2, 2, 3, 3, 3]
+
+
+def test_jenks_puts_an_outlier_in_its_own_class():
+    values = [0.0] * 50 + [0.1] * 50 + [1.0]
+    breaks = histogram(values).breaks("jenks", 2)
+    assert classes(values, breaks) == [1] * 100 + [2]
+
+
+@pytest.mark.parametrize("scheme", ["quantile", "jenks"])
+def test_fewer_occupied_bins_than_classes(scheme):
+    values = [0.0, 0.0, 0.0, 1.0, 1.0, 1.0]
+    breaks = histogram(values).breaks(scheme, 5)
+    assert len(breaks) == 6
+    assert breaks[0] == 0.0 and breaks[-1] == 1.0
+    assert all(a <= b for a, b in zip(breaks, breaks[1:]))
+    low, high = classes([0.0, 1.0], breaks)
+    assert low < high